@@ -1,25 +1,46 @@
 import os
+import uuid
 from typing import Annotated
-from typing import List
+from typing import List, Optional
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph, START
-from langgraph.graph.message import add_messages, RemoveMessage
+from langgraph.graph.message import add_messages
 from langgraph.pregel.retry import RetryPolicy
 from langgraph.types import interrupt
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
+from src.assistant.planning.category_classifier import (
+    CATEGORY_CLASSIFIER,
+    CategoryClassifier,
+    load_model,
+    record_trace,
+)
+from src.assistant.planning.checkpointer import create_checkpointer
 from src.assistant.planning.joiner import joiner
 from src.assistant.planning.prompts import TOOL_CATEGORY_PROMPT
-from src.assistant.planning.task_fetching_unit import plan_and_schedule
-from src.assistant.tools.tool_categories import get_all_tool_summaries
+from src.assistant.planning.speculative import SPECULATIVE_PLANNING
+from src.assistant.planning.summarizer import (
+    SUMMARIZE_AFTER_TOKENS,
+    background_summarizer,
+    messages_tokens,
+    split_for_summary,
+    summary_update,
+    transcript,
+)
+from src.assistant.planning.task_fetching_unit import (
+    CATEGORY_SELECTION,
+    judge_plan,
+    plan_and_schedule,
+    speculative_plan_and_schedule,
+)
+from src.assistant.tools.tool_categories import get_all_tool_summaries, tool_categories
 
-# db_path = "state_db/example.db"
-#
-# conn = sqlite3.connect(db_path, check_same_thread=False)
-# memory = SqliteSaver(conn)
+# Conversation state per thread_id, kept across turns and restarts
+memory = create_checkpointer()
 
 
 class ToolCategoryResponse(TypedDict):
@@ -35,7 +56,10 @@ class State(TypedDict):
 
 
 llm = ChatOpenAI(model=os.getenv("OPENAI_PLANNING_MODEL"))
+# Summaries run in the background; a cheaper model does fine
+summary_llm = ChatOpenAI(model=os.getenv("OPENAI_SUMMARY_MODEL", "gpt-4o-mini"))
 tool_category_selector = llm.with_structured_output(schema=ToolCategoryResponse)
+category_classifier = CategoryClassifier([category.name for category in tool_categories], load_model())
 
 
 class QueryForTools(BaseModel):
@@ -48,6 +72,17 @@ def select_tool_categories(state: State):
     # Get the last user message
     last_user_message = state["messages"][-1]
 
+    # Most questions can be routed locally. Replans (the last message is then
+    # the joiner's feedback) and anything the classifier isn't sure of go to the LLM.
+    first_turn = isinstance(last_user_message, HumanMessage) and isinstance(last_user_message.content, str)
+    if CATEGORY_CLASSIFIER and first_turn:
+        categories = category_classifier.classify(last_user_message.content)
+        if categories is not None:
+            state["selected_tool_categories"] = ToolCategoryResponse(
+                required_categories=categories, explanation="Selected by the local category classifier"
+            )
+            return state
+
     # Step 1: Convert tool categories to a JSON-compatible format
     tool_categories_json = get_all_tool_summaries()
 
@@ -74,12 +109,16 @@ def select_tool_categories(state: State):
 
     # Step 5: Update the state with the selected categories and response
     state["selected_tool_categories"] = tool_category_response
+    if first_turn:
+        # Training data for the local classifier
+        record_trace(last_user_message.content, tool_category_response["required_categories"])
 
     return state
 
 
 def summarize_conversation(state: State):
     summary = state.get("summary", "")
+    folded, _ = split_for_summary(state["messages"])
 
     if summary:
         summary_message = (
@@ -90,11 +129,8 @@ def summarize_conversation(state: State):
     else:
         summary_message = "Create a summary of the conversation above:"
 
-    messages = state["messages"] + [HumanMessage(content=summary_message)]
-    response = llm.invoke(messages)
-
-    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]]
-    return {"summary": response.content, "messages": delete_messages}
+    response = summary_llm.invoke([HumanMessage(content=f"{transcript(folded)}\n\n{summary_message}")])
+    return summary_update(folded, response.content)
 
 
 def should_summarize(state: State):
@@ -102,17 +138,44 @@ def should_summarize(state: State):
 
     messages = state["messages"]
 
-    if len(messages) > 6:
+    if SUMMARIZE_AFTER_TOKENS and messages_tokens(messages) > SUMMARIZE_AFTER_TOKENS and split_for_summary(messages)[0]:
         return "summarize_conversation"
 
     return END
 
 
+def join(state: State, config: RunnableConfig):
+    result = joiner.invoke(state, config)
+    # Plan templates are only learned from plans the joiner could answer with
+    judge_plan(state, config, result["messages"])
+    return result
+
+
+async def ajoin(state: State, config: RunnableConfig):
+    result = await joiner.ainvoke(state, config)
+    judge_plan(state, config, result["messages"])
+    return result
+
+
+def should_join(state):
+    # With incremental join, plan_and_schedule may already have answered
+    if isinstance(state["messages"][-1], AIMessage):
+        return END
+    return "join"
+
+
 def should_continue(state):
     messages = state["messages"]
     if isinstance(messages[-1], AIMessage):
         return END
-    return "select_tool_categories"
+    return _entry_node()
+
+
+def _entry_node() -> str:
+    # With CATEGORY_SELECTION=planner the planner chooses the categories itself
+    if CATEGORY_SELECTION == "planner":
+        return "plan_and_schedule"
+    return "select_and_plan" if SPECULATIVE_PLANNING else "select_tool_categories"
 
 
 def human_node(state: State):
@@ -121,29 +184,80 @@ def human_node(state: State):
 
 
 graph_builder = StateGraph(State)
-graph_builder.add_node("select_tool_categories", select_tool_categories, retry=RetryPolicy(max_attempts=3))
 # Assign each node to a state variable to update
-graph_builder.add_node("plan_and_schedule", plan_and_schedule)
-graph_builder.add_node("join", joiner)
+graph_builder.add_node("join", RunnableLambda(join, afunc=ajoin, name="join"))
 
 ## Define edges
-graph_builder.add_edge(START, "select_tool_categories")
-graph_builder.add_edge("select_tool_categories", "plan_and_schedule")
-graph_builder.add_edge("plan_and_schedule", "join")
+graph_builder.add_edge(START, _entry_node())
+if _entry_node() == "select_and_plan":
+    # Categories and a speculative plan over every tool at the same time
+    graph_builder.add_node(
+        "select_and_plan", speculative_plan_and_schedule(select_tool_categories), retry=RetryPolicy(max_attempts=3)
+    )
+    graph_builder.add_conditional_edges("select_and_plan", should_join, ["join", END])
+else:
+    if CATEGORY_SELECTION != "planner":
+        graph_builder.add_node("select_tool_categories", select_tool_categories, retry=RetryPolicy(max_attempts=3))
+        graph_builder.add_edge("select_tool_categories", "plan_and_schedule")
+    graph_builder.add_node("plan_and_schedule", plan_and_schedule)
+    graph_builder.add_conditional_edges("plan_and_schedule", should_join, ["join", END])
 graph_builder.add_conditional_edges(
     "join",
     # Next, we pass in the function that will determine which node is called next.
     should_continue,
 )
-chain = graph_builder.compile()
+# Not reached from START: summaries are written to the thread in the
+# background, as updates from this node, once the answer is out
+graph_builder.add_node("summarize_conversation", summarize_conversation)
+graph_builder.add_edge("summarize_conversation", END)
+chain = graph_builder.compile(checkpointer=memory)
+
+
+def _thread_config(thread_id: Optional[str]) -> dict:
+    # Without a thread_id the question starts a conversation of its own
+    return {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+
+
+def _summarize_thread(config: dict) -> bool:
+    state = chain.get_state(config).values
+    if should_summarize(state) == END:
+        return False
+    update = summarize_conversation(state)
+    # Between turns, so the next turn starts from the summarized thread
+    with background_summarizer.holding(config["configurable"]["thread_id"]):
+        chain.update_state(config, update, as_node="summarize_conversation")
+    return True
+
+
+def _summarize_later(config: dict):
+    # Nothing to summarize into without a checkpointer; the thread ends with the call
+    if memory is not None and SUMMARIZE_AFTER_TOKENS:
+        background_summarizer.submit(config["configurable"]["thread_id"], lambda: _summarize_thread(config))
+
+
+def query_agent(query: str, thread_id: Optional[str] = None):
+    config = _thread_config(thread_id)
+    last_msg = ""
+    with background_summarizer.holding(config["configurable"]["thread_id"]):
+        for msg in chain.stream(
+                {"messages": [HumanMessage(content=query)]}, config, stream_mode="messages"
+        ):
+            last_msg = msg[0] if isinstance(msg, tuple) else msg
+    _summarize_later(config)
+    return last_msg.content
 
 
-def query_agent(query: str):
+async def aquery_agent(query: str, thread_id: Optional[str] = None):
+    # Runs plan_and_schedule on the asyncio path, so concurrent sessions
+    # share the event loop instead of each pinning threads.
+    config = _thread_config(thread_id)
     last_msg = ""
-    for msg in chain.stream(
-            {"messages": [HumanMessage(content=query)]}, stream_mode="messages"
-    ):
-        last_msg = msg[0] if isinstance(msg, tuple) else msg
+    async with background_summarizer.aholding(config["configurable"]["thread_id"]):
+        async for msg in chain.astream(
+                {"messages": [HumanMessage(content=query)]}, config, stream_mode="messages"
+        ):
+            last_msg = msg[0] if isinstance(msg, tuple) else msg
+    _summarize_later(config)
     return last_msg.content
 
 
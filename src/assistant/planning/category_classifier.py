@@ -0,0 +1,264 @@
+"""
+Local first stage for select_tool_categories, so most turns don't wait on a
+structured-output LLM call before planning can start.
+
+Two parts:
+- a TF-IDF + one-vs-rest logistic regression model trained on the decisions
+  the LLM made (logged to CATEGORY_TRACES by select_tool_categories). Train it
+  with
+
+    python -m src.assistant.planning.category_classifier
+
+- keyword rules for categories whose wording is unambiguous. They only add
+  to what the model picked: a keyword says a category is needed, never that
+  the others aren't ("the temperature in SF raised to the 3rd power" needs
+  Computation as well as Weather).
+
+The classifier only answers when the model is trusted and confident about
+every category; otherwise (and until a model is trained) select_tool_categories
+asks the LLM as before, which also keeps logging training data.
+"""
+import json
+import math
+import os
+import random
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.logger import configured_logger
+from src.utils import get_resource_path
+
+CATEGORY_CLASSIFIER = os.getenv("CATEGORY_CLASSIFIER", "true").lower() == "true"
+# A category is picked at this probability and ruled out below 1 - this;
+# anything in between goes to the LLM
+CATEGORY_CLASSIFIER_CONFIDENCE = float(os.getenv("CATEGORY_CLASSIFIER_CONFIDENCE", "0.85"))
+# The model is only trusted once it has seen this many logged decisions
+MIN_TRAINING_EXAMPLES = int(os.getenv("CATEGORY_CLASSIFIER_MIN_EXAMPLES", "200"))
+EPOCHS = 40
+LEARNING_RATE = 0.5
+L2 = 1e-4
+
+# Categories implied by unambiguous wording. Weather lookups need coordinates,
+# so they bring Location Information along.
+KEYWORD_RULES: Tuple[Tuple[re.Pattern, Tuple[str, ...]], ...] = tuple(
+    (re.compile(pattern, re.IGNORECASE), categories)
+    for pattern, categories in (
+        (r"\b(weather|forecast|temperature|rain(ing|y)?|snow(ing)?|humid(ity)?|sunny)\b",
+         ("Weather Information", "Location Information")),
+        (r"\b(where am i|my (current )?location|coordinates|latitude|longitude|address of|geocode)\b",
+         ("Location Information",)),
+        (r"\b(remember|my (name|birthday|favou?rite|preferences?)|what do you know about me)\b",
+         ("User Personal Info Management",)),
+        (r"https?://\S+", ("Content Extraction", "Web browsing")),
+        (r"\d\s*[-+*/^%]\s*\d|\b(calculate|compute|square root|percent(age)? of)\b", ("Computation",)),
+    )
+)
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _traces_path() -> Path:
+    path = os.getenv("CATEGORY_TRACES")
+    return Path(path) if path else get_resource_path("category_traces.jsonl")
+
+
+def _model_path() -> Path:
+    path = os.getenv("CATEGORY_CLASSIFIER_MODEL")
+    return Path(path) if path else get_resource_path("category_classifier.json")
+
+
+def _features(text: str) -> Counter:
+    words = [word.lower() for word in _TOKEN.findall(text)]
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def keyword_categories(text: str) -> List[str]:
+    found = []
+    for pattern, categories in KEYWORD_RULES:
+        if pattern.search(text):
+            found.extend(category for category in categories if category not in found)
+    return found
+
+
+class CategoryModel:
+    """TF-IDF features with one logistic regression per category."""
+
+    def __init__(self, categories: Sequence[str], idf: Dict[str, float],
+                 weights: Dict[str, Dict[str, float]], bias: Dict[str, float], examples: int):
+        self.categories = list(categories)
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.examples = examples
+
+    def _vector(self, text: str) -> Dict[str, float]:
+        vector = {term: count * self.idf[term] for term, count in _features(text).items() if term in self.idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        vector = self._vector(text)
+        return {
+            category: _sigmoid(
+                self.bias[category] + sum(value * self.weights[category].get(term, 0.0) for term, value in vector.items())
+            )
+            for category in self.categories
+        }
+
+    @classmethod
+    def fit(cls, examples: Sequence[Tuple[str, Sequence[str]]], categories: Sequence[str], seed: int = 0) -> "CategoryModel":
+        document_frequency = Counter()
+        for text, _ in examples:
+            document_frequency.update(_features(text).keys())
+        n = len(examples)
+        idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        model = cls(categories, idf, {c: {} for c in categories}, {c: 0.0 for c in categories}, n)
+        data = [(model._vector(text), set(labels)) for text, labels in examples]
+        rng = random.Random(seed)
+        for epoch in range(EPOCHS):
+            rng.shuffle(data)
+            rate = LEARNING_RATE / (1 + epoch * 0.1)
+            for vector, labels in data:
+                for category in categories:
+                    weights = model.weights[category]
+                    z = model.bias[category] + sum(value * weights.get(term, 0.0) for term, value in vector.items())
+                    error = _sigmoid(z) - (category in labels)
+                    model.bias[category] -= rate * error
+                    for term, value in vector.items():
+                        weight = weights.get(term, 0.0)
+                        weights[term] = weight - rate * (error * value + L2 * weight)
+        return model
+
+    def to_json(self) -> dict:
+        return {
+            "categories": self.categories,
+            "idf": self.idf,
+            "weights": self.weights,
+            "bias": self.bias,
+            "examples": self.examples,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "CategoryModel":
+        return cls(data["categories"], data["idf"], data["weights"], data["bias"], data["examples"])
+
+
+def record_trace(message: str, categories: Iterable[str]) -> None:
+    """Log a decision the LLM made, as training data for the model."""
+    path = _traces_path()
+    try:
+        with path.open("a") as f:
+            f.write(json.dumps({"message": message, "categories": list(categories)}) + "\n")
+    except OSError as e:
+        configured_logger.warning(f"Could not log category decision to {path}: {e}")
+
+
+def load_traces(path: Optional[Path] = None) -> List[Tuple[str, List[str]]]:
+    path = path or _traces_path()
+    if not path.exists():
+        return []
+    examples = []
+    for line in path.read_text().splitlines():
+        try:
+            trace = json.loads(line)
+            examples.append((trace["message"], list(trace["categories"])))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return examples
+
+
+class CategoryClassifier:
+    def __init__(self, categories: Sequence[str], model: Optional[CategoryModel] = None,
+                 confidence: float = CATEGORY_CLASSIFIER_CONFIDENCE, min_examples: int = MIN_TRAINING_EXAMPLES,
+                 keywords: bool = True):
+        self.categories = list(categories)
+        if model is not None and set(model.categories) != set(self.categories):
+            configured_logger.warning("The category model was trained on other categories; retrain it. Deferring to the LLM")
+            model = None
+        self.model = model
+        self.confidence = confidence
+        self.min_examples = min_examples
+        self.keywords = keywords
+        self._lock = threading.Lock()
+        self.local = 0
+        self.deferred = 0
+
+    def classify(self, text: str) -> Optional[List[str]]:
+        """The categories for a message, or None if the LLM should decide."""
+        selected = self._classify(text)
+        with self._lock:
+            if selected is None:
+                self.deferred += 1
+            else:
+                self.local += 1
+        return selected
+
+    def _classify(self, text: str) -> Optional[List[str]]:
+        if self.model is None or self.model.examples < self.min_examples:
+            # Keywords alone can't tell which other categories a question needs
+            return None
+        keywords = keyword_categories(text) if self.keywords else []
+        selected = []
+        for category, p in self.model.predict_proba(text).items():
+            if category in keywords or p >= self.confidence:
+                selected.append(category)
+            elif p > 1 - self.confidence:
+                # Not sure either way
+                return None
+        if not selected:
+            return None
+        # Keep the registry order, as the LLM would list them
+        return [category for category in self.categories if category in selected]
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            total = self.local + self.deferred
+            return {
+                "enabled": CATEGORY_CLASSIFIER,
+                "model_examples": self.model.examples if self.model else 0,
+                "local": self.local,
+                "deferred_to_llm": self.deferred,
+                "local_rate": self.local / total if total else 0.0,
+            }
+
+
+def load_model(path: Optional[Path] = None) -> Optional[CategoryModel]:
+    path = path or _model_path()
+    if not path.exists():
+        return None
+    try:
+        return CategoryModel.from_json(json.loads(path.read_text()))
+    except (ValueError, KeyError, TypeError) as e:
+        configured_logger.warning(f"Ignoring unreadable category model {path}: {e}")
+        return None
+
+
+def train(categories: Sequence[str], traces: Optional[Path] = None, path: Optional[Path] = None) -> CategoryModel:
+    """Train on the logged decisions and store the model where the server loads it from."""
+    examples = [
+        (message, [c for c in labels if c in categories]) for message, labels in load_traces(traces)
+    ]
+    model = CategoryModel.fit(examples, categories)
+    path = path or _model_path()
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(model.to_json()))
+    tmp.replace(path)
+    return model
+
+
+if __name__ == "__main__":
+    from src.assistant.tools.tool_categories import tool_categories
+
+    trained = train([category.name for category in tool_categories])
+    print(f"Trained on {trained.examples} logged decisions; saved to {_model_path()}")
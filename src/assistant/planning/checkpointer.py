@@ -0,0 +1,554 @@
+"""
+Conversation state per thread_id, in SQLite.
+
+Unlike langgraph's SqliteSaver (one connection behind one lock, and the whole
+state copied into every checkpoint), this saver:
+
+- runs SQLite in WAL mode behind a small connection pool, so readers on many
+  threads don't queue behind each other or behind the writer;
+- stores channel values apart from the checkpoints, one row per channel
+  version, and only for the channels a step changed;
+- stores a message list that only grew as a delta: the new messages plus the
+  version they extend. Every CHECKPOINT_SNAPSHOT_EVERY deltas, or when
+  messages were removed, the full list is written instead, so a read never
+  walks a long chain;
+- compacts each thread every CHECKPOINT_KEEP checkpoints, dropping all but the
+  latest CHECKPOINT_KEEP together with their writes and the values only they
+  used.
+
+`python -m src.evals.checkpointer_latency` measures write and read latency per
+step against SqliteSaver.
+"""
+import asyncio
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+from src.logger import configured_logger
+from src.utils import get_resource_path
+
+# Empty disables persistence
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", str(get_resource_path("checkpoints.sqlite")))
+CHECKPOINT_POOL_SIZE = int(os.getenv("CHECKPOINT_POOL_SIZE", "8"))
+# Checkpoints kept per thread; 0 keeps them all
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", "50"))
+CHECKPOINT_SNAPSHOT_EVERY = int(os.getenv("CHECKPOINT_SNAPSHOT_EVERY", "16"))
+# Threads whose last message list is remembered for computing deltas
+DELTA_CACHE_SIZE = int(os.getenv("CHECKPOINT_DELTA_CACHE_SIZE", "1024"))
+BUSY_TIMEOUT_MS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    channel_versions TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    -- full, delta (messages appended to base_version) or empty
+    kind TEXT NOT NULL,
+    base_version TEXT,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# The value of each channel version, following deltas back to their full snapshot
+_CHAIN_QUERY = """
+WITH RECURSIVE chain(channel, kind, base_version, type, value, depth) AS (
+    SELECT channel, kind, base_version, type, value, 0 FROM blobs
+    WHERE thread_id = ? AND checkpoint_ns = ? AND (channel, version) IN (VALUES {pairs})
+    UNION ALL
+    SELECT b.channel, b.kind, b.base_version, b.type, b.value, c.depth + 1
+    FROM chain c JOIN blobs b
+        ON b.thread_id = ? AND b.checkpoint_ns = ? AND b.channel = c.channel AND b.version = c.base_version
+    WHERE c.kind = 'delta'
+)
+SELECT channel, kind, type, value FROM chain ORDER BY channel, depth DESC
+"""
+
+
+class ConnectionPool:
+    """Up to `size` connections to one database, handed out one thread at a time."""
+
+    def __init__(self, path: Union[str, Path], size: int = CHECKPOINT_POOL_SIZE):
+        self.path = str(path)
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        # Autocommit; writers open their transactions explicitly
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent at NORMAL; a power cut can only lose the last commits
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                opening = self._opened < self.size
+                if opening:
+                    self._opened += 1
+            conn = self._open() if opening else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class _Seen:
+    """A message as it was when its list was last written, to tell whether a later list only appended to it."""
+
+    __slots__ = ("message", "content", "kwargs")
+
+    def __init__(self, message: BaseMessage):
+        self.message = message
+        self.content = message.content
+        self.kwargs = dict(message.additional_kwargs)
+
+    def same(self, message: Any) -> bool:
+        # Nodes sometimes edit messages in place, so identity alone isn't enough
+        return (
+                message is self.message
+                and message.content is self.content
+                and message.additional_kwargs == self.kwargs
+        )
+
+
+class _LastList:
+    __slots__ = ("version", "seen", "depth")
+
+    def __init__(self, version: str, messages: Sequence[BaseMessage], depth: int):
+        self.version = version
+        self.seen = [_Seen(message) for message in messages]
+        self.depth = depth
+
+    def appended(self, value: List[Any]) -> Optional[List[Any]]:
+        """The messages added since, if value only grew by them."""
+        if len(value) < len(self.seen):
+            return None
+        for seen, message in zip(self.seen, value):
+            if not seen.same(message):
+                return None
+        return value[len(self.seen):]
+
+
+def _is_message_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, BaseMessage) for item in value)
+
+
+class DeltaSqliteSaver(BaseCheckpointSaver[str]):
+    def __init__(
+            self,
+            path: Union[str, Path],
+            *,
+            pool_size: int = CHECKPOINT_POOL_SIZE,
+            keep: int = CHECKPOINT_KEEP,
+            snapshot_every: int = CHECKPOINT_SNAPSHOT_EVERY,
+            serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.pool = ConnectionPool(path, pool_size)
+        self.keep = keep
+        self.snapshot_every = max(1, snapshot_every)
+        # SQLite has one writer at a time anyway; waiting here is cheaper than its busy handler
+        self._write_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._last_lists: "OrderedDict[Tuple[str, str, str], _LastList]" = OrderedDict()
+        self._puts_since_compaction: Dict[str, int] = defaultdict(int)
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock, self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # --- writing ---
+
+    def _blob_row(self, thread_id: str, ns: str, channel: str, version: str, values: Dict[str, Any]) -> tuple:
+        key = (thread_id, ns, channel)
+        if channel not in values:
+            with self._cache_lock:
+                self._last_lists.pop(key, None)
+            return thread_id, ns, channel, version, "empty", None, None, None
+        value = values[channel]
+        kind, base_version, stored, depth = "full", None, value, 0
+        if _is_message_list(value):
+            with self._cache_lock:
+                last = self._last_lists.get(key)
+            appended = last.appended(value) if last is not None else None
+            if appended is not None and last.depth + 1 < self.snapshot_every:
+                kind, base_version, stored, depth = "delta", last.version, appended, last.depth + 1
+            with self._cache_lock:
+                self._last_lists[key] = _LastList(version, value, depth)
+                self._last_lists.move_to_end(key)
+                while len(self._last_lists) > DELTA_CACHE_SIZE:
+                    self._last_lists.popitem(last=False)
+        return (thread_id, ns, channel, version, kind, base_version, *self.serde.dumps_typed(stored))
+
+    def put(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        ns = configurable.get("checkpoint_ns", "")
+        values = checkpoint["channel_values"]
+        # Serialized before taking the write lock, so other threads can write meanwhile
+        blobs = [
+            self._blob_row(thread_id, ns, channel, str(version), values)
+            for channel, version in new_versions.items()
+        ]
+        checkpoint_row = (
+            thread_id,
+            ns,
+            checkpoint["id"],
+            configurable.get("checkpoint_id"),
+            *self.serde.dumps_typed({**checkpoint, "channel_values": {}}),
+            *self.serde.dumps_typed(metadata),
+            json.dumps({channel: str(version) for channel, version in checkpoint["channel_versions"].items()}),
+        )
+        try:
+            with self._transaction() as conn:
+                conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", blobs)
+                conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", checkpoint_row)
+        except BaseException:
+            # The remembered lists were never stored; later deltas can't build on them
+            self._forget(thread_id)
+            raise
+        self._maybe_compact(thread_id)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+            self,
+            config: RunnableConfig,
+            writes: Sequence[Tuple[str, Any]],
+            task_id: str,
+            task_path: str = "",
+    ) -> None:
+        configurable = config["configurable"]
+        # Special channels (errors, interrupts) replace earlier writes; the rest keep the first
+        verb = "REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "IGNORE"
+        rows = [
+            (
+                str(configurable["thread_id"]),
+                configurable.get("checkpoint_ns", ""),
+                str(configurable["checkpoint_id"]),
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._transaction() as conn:
+            conn.executemany(f"INSERT OR {verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        # Same format as SqliteSaver: sortable, with a random part so forks don't collide
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- reading ---
+
+    def _channel_values(self, conn: sqlite3.Connection, thread_id: str, ns: str,
+                        versions: Dict[str, str]) -> Dict[str, Any]:
+        if not versions:
+            return {}
+        query = _CHAIN_QUERY.format(pairs=", ".join("(?, ?)" for _ in versions))
+        params = [thread_id, ns, *(item for pair in versions.items() for item in pair), thread_id, ns]
+        chains = defaultdict(list)
+        for channel, kind, type_, value in conn.execute(query, params):
+            chains[channel].append((kind, type_, value))
+        values = {}
+        for channel, chain in chains.items():
+            kind, type_, value = chain[0]
+            if kind == "empty":
+                continue
+            if kind != "full":
+                configured_logger.warning(f"Checkpoint of thread {thread_id} is missing the base of {channel}")
+                continue
+            value = self.serde.loads_typed((type_, value))
+            if len(chain) > 1:
+                value = list(value)
+                for _, delta_type, delta in chain[1:]:
+                    value.extend(self.serde.loads_typed((delta_type, delta)))
+            values[channel] = value
+        return values
+
+    def _tuple(self, conn: sqlite3.Connection, row: tuple) -> CheckpointTuple:
+        thread_id, ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata, versions = row
+        checkpoint = self.serde.loads_typed((type_, checkpoint))
+        checkpoint["channel_values"] = self._channel_values(conn, thread_id, ns, json.loads(versions))
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint,
+            self.serde.loads_typed((metadata_type, metadata)),
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+            if parent_id else None,
+            [(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        ns = configurable.get("checkpoint_ns", "")
+        with self.pool.connection() as conn:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, ns),
+                ).fetchone()
+            return self._tuple(conn, row) if row else None
+
+    def list(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config is not None:
+            configurable = config["configurable"]
+            clauses.append("thread_id = ?")
+            params.append(str(configurable["thread_id"]))
+            if "checkpoint_ns" in configurable:
+                clauses.append("checkpoint_ns = ?")
+                params.append(configurable["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None:
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"SELECT * FROM checkpoints{where} ORDER BY checkpoint_id DESC", params).fetchall()
+            yielded = 0
+            for row in rows:
+                if limit is not None and yielded >= limit:
+                    return
+                if filter:
+                    # Metadata is serialized, so filter after loading it
+                    metadata = self.serde.loads_typed((row[6], row[7]))
+                    if any(metadata.get(key) != value for key, value in filter.items()):
+                        continue
+                yielded += 1
+                yield self._tuple(conn, row)
+
+    # --- housekeeping ---
+
+    def _maybe_compact(self, thread_id: str) -> None:
+        if self.keep <= 0:
+            return
+        with self._cache_lock:
+            self._puts_since_compaction[thread_id] += 1
+            due = self._puts_since_compaction[thread_id] >= self.keep
+            if due:
+                del self._puts_since_compaction[thread_id]
+        if due:
+            try:
+                self.compact(thread_id)
+            except sqlite3.Error as e:
+                configured_logger.warning(f"Could not compact the checkpoints of thread {thread_id}: {e}")
+
+    def compact(self, thread_id: str, keep: Optional[int] = None) -> int:
+        """
+        Drop all but the latest `keep` checkpoints of a thread, their writes, and
+        the channel values nothing kept refers to. Returns the checkpoints dropped.
+        """
+        keep = self.keep if keep is None else keep
+        thread_id = str(thread_id)
+        dropped = 0
+        with self._transaction() as conn:
+            namespaces = [ns for ns, in conn.execute(
+                "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            )]
+            for ns in namespaces:
+                dropped += conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN"
+                    " (SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    "  ORDER BY checkpoint_id DESC LIMIT ?)",
+                    (thread_id, ns, thread_id, ns, keep),
+                ).rowcount
+                if dropped:
+                    self._drop_unreferenced(conn, thread_id, ns)
+        if dropped:
+            configured_logger.debug(f"Compacted thread {thread_id}: dropped {dropped} checkpoints")
+        return dropped
+
+    @staticmethod
+    def _drop_unreferenced(conn: sqlite3.Connection, thread_id: str, ns: str) -> None:
+        conn.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN"
+            " (SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+            (thread_id, ns, thread_id, ns),
+        )
+        needed = set()
+        for versions, in conn.execute(
+                "SELECT channel_versions FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, ns)
+        ):
+            needed.update(json.loads(versions).items())
+        bases = {
+            (channel, version): base
+            for channel, version, base in conn.execute(
+                "SELECT channel, version, base_version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, ns),
+            )
+        }
+        # Deltas need every version down to their snapshot
+        for channel, version in list(needed):
+            while (base := bases.get((channel, version))) and (channel, base) not in needed:
+                needed.add((channel, base))
+                version = base
+        conn.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(thread_id, ns, *key) for key in bases if key not in needed],
+        )
+
+    def delete_thread(self, thread_id: str) -> None:
+        thread_id = str(thread_id)
+        with self._transaction() as conn:
+            for table in ("checkpoints", "blobs", "writes"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        self._forget(thread_id)
+
+    def _forget(self, thread_id: str) -> None:
+        with self._cache_lock:
+            for key in [key for key in self._last_lists if key[0] == thread_id]:
+                del self._last_lists[key]
+            self._puts_since_compaction.pop(thread_id, None)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    # --- asyncio: the same calls on worker threads; the pool lets them overlap ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+            self,
+            config: RunnableConfig,
+            writes: Sequence[Tuple[str, Any]],
+            task_id: str,
+            task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def create_checkpointer(path: str = CHECKPOINT_DB) -> Optional[DeltaSqliteSaver]:
+    """The saver the agent compiles with, or None when CHECKPOINT_DB is empty."""
+    if not path:
+        return None
+    configured_logger.info(f"Persisting conversation state to {path}")
+    return DeltaSqliteSaver(path)
@@ -0,0 +1,110 @@
+"""
+Keeps the messages sent to the planner and the joiner within a token budget.
+A single Tavily extraction or One Call response can be tens of thousands of
+tokens, and the thread keeps every one of them.
+
+build_context, in order:
+- repeats of an observation seen earlier in the context are replaced by a
+  pointer to the first one;
+- observations are cut to a per-observation cap (the planner gets one; the
+  joiner, which answers from them, only when over budget), keeping the head
+  and the tail;
+- whole turns are dropped, oldest first, while the context is over budget.
+  The conversation summary and the current turn are always kept;
+- if the current turn alone is over budget, its observations are cut harder.
+
+Cut messages are copies with the same name, idx and args, so the planner can
+still reference and count tasks; the thread's messages are never changed.
+"""
+import os
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, FunctionMessage, HumanMessage
+
+from src.assistant.planning.summarizer import is_summary
+from src.assistant.planning.token_count import message_tokens
+from src.logger import configured_logger
+
+# Budgets for the messages part of the prompt; 0 sends everything
+PLANNER_MESSAGE_TOKENS = int(os.getenv("PLANNER_MESSAGE_TOKENS", "6000"))
+JOINER_MESSAGE_TOKENS = int(os.getenv("JOINER_MESSAGE_TOKENS", "12000"))
+# The planner only needs the gist of earlier results
+PLANNER_OBSERVATION_TOKENS = int(os.getenv("PLANNER_OBSERVATION_TOKENS", "600"))
+MIN_OBSERVATION_TOKENS = 64
+# Shorter observations are cheaper to repeat than to point at
+DEDUPLICATE_MIN_CHARS = 200
+
+
+def _copy(message: BaseMessage, content: str) -> BaseMessage:
+    # A fresh response_metadata, so the copy caches its own token count
+    return message.model_copy(update={"content": content, "response_metadata": {}})
+
+
+def cut_observation(message: FunctionMessage, max_tokens: int) -> FunctionMessage:
+    """The observation cut to about max_tokens, keeping its start and end."""
+    tokens = message_tokens(message)
+    if tokens <= max_tokens or not isinstance(message.content, str):
+        return message
+    text = message.content
+    keep = len(text) * max_tokens // tokens
+    head = keep * 3 // 4
+    tail = text[len(text) - (keep - head):] if keep > head else ""
+    return _copy(message, f"{text[:head]}\n... [{tokens - max_tokens} of {tokens} tokens cut] ...\n{tail}")
+
+
+def _compact(messages: Sequence[BaseMessage], observation_tokens: Optional[int]) -> List[BaseMessage]:
+    first_seen: Dict[str, FunctionMessage] = {}
+    compacted = []
+    for message in messages:
+        if isinstance(message, FunctionMessage) and isinstance(message.content, str):
+            if len(message.content) >= DEDUPLICATE_MIN_CHARS:
+                first = first_seen.setdefault(message.content, message)
+                if first is not message:
+                    compacted.append(_copy(
+                        message, f"Same result as {first.name} (task {first.additional_kwargs.get('idx')}) above."
+                    ))
+                    continue
+            if observation_tokens is not None:
+                message = cut_observation(message, observation_tokens)
+        compacted.append(message)
+    return compacted
+
+
+def _tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+def build_context(
+        messages: Sequence[BaseMessage], budget: int, observation_tokens: Optional[int] = None
+) -> List[BaseMessage]:
+    """The messages to send, within budget tokens where the current turn allows it."""
+    if budget <= 0:
+        return list(messages)
+    pinned = [message for message in messages[:1] if is_summary(message)]
+    rest = messages[len(pinned):]
+    # Turns start at a question; anything before the first one goes with it
+    starts = sorted({0, *(i for i, message in enumerate(rest) if isinstance(message, HumanMessage))})
+    for start in starts:
+        context = pinned + _compact(rest[start:], observation_tokens)
+        if _tokens(context) <= budget:
+            if start:
+                configured_logger.debug(f"Context over budget; dropped {start} older messages")
+            return context
+    # The current turn alone doesn't fit: cut its observations until it does
+    observations = [message_tokens(m) for m in context if isinstance(m, FunctionMessage)]
+    cap = max(observations, default=0) // 2
+    while cap >= MIN_OBSERVATION_TOKENS:
+        context = pinned + _compact(rest[starts[-1]:], cap)
+        if _tokens(context) <= budget:
+            break
+        cap //= 2
+    configured_logger.debug(f"Current turn over budget; observations cut to {max(cap, MIN_OBSERVATION_TOKENS)} tokens")
+    return context
+
+
+def planner_context(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    return build_context(messages, PLANNER_MESSAGE_TOKENS, PLANNER_OBSERVATION_TOKENS)
+
+
+def joiner_context(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    return build_context(messages, JOINER_MESSAGE_TOKENS)
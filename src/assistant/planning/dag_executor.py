@@ -0,0 +1,381 @@
+import asyncio
+import threading
+from collections import defaultdict
+from concurrent.futures import Executor
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.assistant.planning.output_parser import Task
+from src.logger import configured_logger
+
+
+class TaskRequeued(Exception):
+    """
+    Raised by run_task when the task should be dispatched again later (e.g. the
+    provider rate-limited it) rather than treated as completed.
+    """
+
+
+class TaskFailed(Exception):
+    """
+    Raised by run_task when the task failed or timed out (after recording its
+    error observation). Its dependents are cancelled instead of being run
+    with an error as input.
+    """
+
+
+# (cancelled task, index of the failed dependency that caused it)
+Cancellation = Tuple[Task, int]
+
+
+def critical_path_length(
+        task: Task,
+        dependents_of: Callable[[Task], Iterable[Task]],
+        estimate: Callable[[Task], float],
+        memo: Optional[Dict[int, float]] = None,
+) -> float:
+    """Longest estimated duration of any chain starting at task (task included)."""
+    memo = {} if memo is None else memo
+    if task["idx"] not in memo:
+        memo[task["idx"]] = estimate(task) + max(
+            (critical_path_length(dependent, dependents_of, estimate, memo) for dependent in dependents_of(task)),
+            default=0.0,
+        )
+    return memo[task["idx"]]
+
+
+class _DependencyGraph:
+    """
+    Bookkeeping shared by the thread and asyncio executors: which indices have
+    completed, and which tasks are parked waiting on which dependencies.
+    Not thread-safe on its own.
+    """
+
+    def __init__(self, completed: Iterable[int] = (), on_cancelled: Optional[Callable[[Task, int], None]] = None):
+        # Called for each task cancelled because a dependency failed
+        self._on_cancelled = on_cancelled
+        # Indices whose observation is available (includes previous plans).
+        self._completed: Set[int] = set(completed)
+        # idx -> number of dependencies not yet completed
+        self._unresolved: Dict[int, int] = {}
+        # dependency idx -> tasks parked on it
+        self._dependents: Dict[int, List[Task]] = defaultdict(list)
+        self._parked: Dict[int, Task] = {}
+        # Indices that failed or were cancelled; anything depending on them is cancelled.
+        self._failed: Set[int] = set()
+
+    def _cancel_if_dependency_failed(self, task: Task) -> List[Cancellation]:
+        failed_dep = next((dep for dep in task["dependencies"] if dep in self._failed), None)
+        if failed_dep is None:
+            return []
+        self._completed.add(task["idx"])
+        return [(task, failed_dep)] + self._cancel_dependents(task["idx"])
+
+    def _park_if_blocked(self, task: Task) -> bool:
+        pending = {dep for dep in task["dependencies"] if dep not in self._completed}
+        if not pending:
+            return False
+        self._unresolved[task["idx"]] = len(pending)
+        self._parked[task["idx"]] = task
+        for dep in pending:
+            self._dependents[dep].append(task)
+        return True
+
+    def _release(self, idx: int, failed: bool = False) -> Tuple[List[Task], List[Cancellation]]:
+        """
+        Mark idx as completed and return the dependents it unblocked. If it
+        failed, every task waiting on it (transitively) is cancelled instead.
+        """
+        self._completed.add(idx)
+        if failed:
+            return [], self._cancel_dependents(idx)
+        ready = []
+        for dependent in self._dependents.pop(idx, []):
+            dep_idx = dependent["idx"]
+            if dep_idx not in self._unresolved:
+                # Already cancelled through another dependency
+                continue
+            self._unresolved[dep_idx] -= 1
+            if self._unresolved[dep_idx] == 0:
+                del self._unresolved[dep_idx]
+                del self._parked[dep_idx]
+                ready.append(dependent)
+        return ready, []
+
+    def _cancel_dependents(self, idx: int) -> List[Cancellation]:
+        self._failed.add(idx)
+        cancelled = []
+        for dependent in self._dependents.pop(idx, []):
+            dep_idx = dependent["idx"]
+            if self._parked.pop(dep_idx, None) is None:
+                continue
+            del self._unresolved[dep_idx]
+            self._completed.add(dep_idx)
+            cancelled.append((dependent, idx))
+            cancelled.extend(self._cancel_dependents(dep_idx))
+        return cancelled
+
+    def _critical_path(self, task: Task, estimate: Callable[[Task], float]) -> float:
+        """
+        Estimated time from starting task to finishing the longest chain of
+        known (parked) dependents hanging off it.
+        """
+        return critical_path_length(task, lambda t: self._dependents.get(t["idx"], ()), estimate)
+
+    def _report_cancelled(self, cancelled: List[Cancellation]) -> None:
+        if self._on_cancelled is not None:
+            for task, failed_dep in cancelled:
+                self._on_cancelled(task, failed_dep)
+
+    def _take_unresolvable(self) -> List[Task]:
+        unresolvable = sorted(self._parked.values(), key=lambda t: t["idx"])
+        self._parked.clear()
+        self._unresolved.clear()
+        self._dependents.clear()
+        return unresolvable
+
+
+class DAGExecutor(_DependencyGraph):
+    """
+    Runs planner tasks on an executor, releasing each task the moment its last
+    dependency resolves.
+
+    Blocked tasks are parked in memory (keyed by the dependencies they still
+    wait on) instead of occupying a pool thread, and the thread that completes
+    a dependency is the one that releases its dependents.
+
+    With an estimate function, ready tasks are submitted with their critical
+    path length as priority, so when the pool is contended the task that
+    heads the longest remaining chain starts first.
+    """
+
+    def __init__(
+            self,
+            executor: Executor,
+            run_task: Callable[[Task], None],
+            completed: Iterable[int] = (),
+            on_rejected: Optional[Callable[[Task, Exception], None]] = None,
+            admit: Optional[Callable[[Task, Callable[[], None]], bool]] = None,
+            estimate: Optional[Callable[[Task], float]] = None,
+            on_cancelled: Optional[Callable[[Task, int], None]] = None,
+    ):
+        super().__init__(completed, on_cancelled)
+        self._executor = executor
+        self._run_task = run_task
+        # Called when the executor refuses a task (saturated or shut down) or an
+        # admitted task is dropped because the plan was cancelled; the task
+        # then counts as completed so its dependents are not stranded.
+        self._on_rejected = on_rejected
+        # Gate consulted before a ready task is dispatched. Returns True if the
+        # task may start now; otherwise it calls the given callback once it may.
+        self._admit = admit
+        # Expected duration of a task in seconds, used for critical-path ranking
+        self._estimate = estimate
+        self._lock = threading.Lock()
+        # Notified whenever a task finishes and when the plan is cancelled
+        self._changed = threading.Condition(self._lock)
+        self._running = 0
+        self._finished = 0
+        self._cancelled = False
+
+    def submit(self, task: Task, run_inline_if_ready: bool = False) -> None:
+        """
+        Schedule a task. If all its dependencies are already satisfied it runs
+        right away, either on the calling thread or on the executor; otherwise
+        it is parked until its last dependency completes.
+        """
+        with self._lock:
+            cancelled = self._cancel_if_dependency_failed(task)
+            if not cancelled:
+                if self._park_if_blocked(task):
+                    return
+                self._running += 1
+        if cancelled:
+            self._report_cancelled(cancelled)
+            return
+
+        if run_inline_if_ready:
+            if self._admit is None or self._admit(task, lambda: self._submit(task)):
+                self._run(task, follow_dependents=False)
+        else:
+            self._dispatch(task)
+
+    def join(self) -> List[Task]:
+        """
+        Block until no task is running. Returns the tasks that can never be
+        released because they depend on an index that was never scheduled.
+        """
+        with self._changed:
+            while self._running and not self._cancelled:
+                self._changed.wait()
+            return self._take_unresolvable()
+
+    def wait_for_progress(self, finished: int) -> Optional[int]:
+        """
+        Block until more than `finished` tasks have finished. Returns the new
+        count, or None once nothing is running (or the plan was cancelled).
+        """
+        with self._changed:
+            while self._finished <= finished and self._running and not self._cancelled:
+                self._changed.wait()
+            if not self._running or self._cancelled:
+                return None
+            return self._finished
+
+    def cancel(self) -> None:
+        """
+        Stop the plan early: parked and queued tasks are dropped and join()
+        returns without waiting for tasks that are still running.
+        """
+        with self._changed:
+            self._cancelled = True
+            self._take_unresolvable()
+            self._changed.notify_all()
+
+    def _run(self, task: Task, follow_dependents: bool = True) -> None:
+        # Keep the worker busy with the first released dependent rather than
+        # bouncing it through the executor queue; the rest fan out to the pool.
+        # Gated tasks always go back through _dispatch so the gate sees them.
+        follow_dependents = follow_dependents and self._admit is None
+        if self._cancelled:
+            self._drop(task)
+            return
+        while task is not None and not self._cancelled:
+            failed = False
+            try:
+                self._run_task(task)
+            except TaskRequeued:
+                self._dispatch(task)
+                return
+            except TaskFailed:
+                failed = True
+            except BaseException:
+                self._complete(task["idx"], failed=True)
+                raise
+            ready = self._complete(task["idx"], failed)
+            task = ready.pop(0) if follow_dependents and ready else None
+            for dependent in ready:
+                self._dispatch(dependent)
+
+    def _dispatch(self, task: Task) -> None:
+        if self._cancelled:
+            return
+        if self._admit is None or self._admit(task, lambda: self._submit(task)):
+            self._submit(task)
+
+    def _submit(self, task: Task) -> None:
+        if self._cancelled:
+            self._drop(task)
+            return
+        try:
+            if self._estimate is not None and hasattr(self._executor, "submit_with_priority"):
+                with self._lock:
+                    rank = self._critical_path(task, self._estimate)
+                self._executor.submit_with_priority(rank, self._run, task)
+            else:
+                self._executor.submit(self._run, task)
+        except RuntimeError as e:
+            if self._on_rejected is not None:
+                self._on_rejected(task, e)
+            self._complete(task["idx"], failed=True)
+
+    def _drop(self, task: Task) -> None:
+        # The task was admitted (e.g. holds a throttle slot) but will never run
+        if self._on_rejected is not None:
+            self._on_rejected(task, RuntimeError("the plan was cancelled"))
+
+    def _complete(self, idx: int, failed: bool = False) -> List[Task]:
+        with self._lock:
+            if self._cancelled:
+                return []
+            ready, cancelled = self._release(idx, failed)
+            # Released dependents count as running before this task stops
+            # counting, so join() never observes a false idle state.
+            self._running += len(ready) - 1
+            self._finished += 1
+            self._changed.notify_all()
+        self._report_cancelled(cancelled)
+        return ready
+
+
+class AsyncDAGExecutor(_DependencyGraph):
+    """
+    Event-loop counterpart of DAGExecutor: every ready task becomes an asyncio
+    task, and completing a task starts its unblocked dependents. Must be used
+    from a single event loop.
+    """
+
+    def __init__(
+            self,
+            run_task: Callable[[Task], Awaitable[None]],
+            completed: Iterable[int] = (),
+            on_cancelled: Optional[Callable[[Task, int], None]] = None,
+    ):
+        super().__init__(completed, on_cancelled)
+        self._run_task = run_task
+        self._tasks: Set[asyncio.Task] = set()
+        self._running = 0
+        self._finished = 0
+        self._cancelled = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._progress = asyncio.Event()
+
+    def submit(self, task: Task) -> None:
+        cancelled = self._cancel_if_dependency_failed(task)
+        if cancelled:
+            self._report_cancelled(cancelled)
+        elif not self._park_if_blocked(task):
+            self._start(task)
+
+    async def join(self) -> List[Task]:
+        """Wait until no task is running; returns the unresolvable tasks."""
+        await self._idle.wait()
+        return self._take_unresolvable()
+
+    async def wait_for_progress(self, finished: int) -> Optional[int]:
+        """See DAGExecutor.wait_for_progress."""
+        while self._finished <= finished and self._running and not self._cancelled:
+            self._progress.clear()
+            await self._progress.wait()
+        if not self._running or self._cancelled:
+            return None
+        return self._finished
+
+    def cancel(self) -> None:
+        """Stop the plan early, cancelling every task that is still running."""
+        self._cancelled = True
+        self._take_unresolvable()
+        for running in list(self._tasks):
+            running.cancel()
+        self._idle.set()
+        self._progress.set()
+
+    def _start(self, task: Task) -> None:
+        self._running += 1
+        self._idle.clear()
+        running = asyncio.create_task(self._run(task))
+        # Hold a reference so the task is not garbage collected mid-flight
+        self._tasks.add(running)
+        running.add_done_callback(self._tasks.discard)
+
+    async def _run(self, task: Task) -> None:
+        failed = True
+        try:
+            await self._run_task(task)
+            failed = False
+        except TaskFailed:
+            pass
+        except Exception:
+            # Nothing awaits this asyncio task; the node fails and its dependents are cancelled
+            configured_logger.exception(f"Task {task['idx']} raised outside run_task's error handling")
+        finally:
+            if not self._cancelled:
+                ready, cancelled = self._release(task["idx"], failed)
+                for dependent in ready:
+                    self._start(dependent)
+                self._report_cancelled(cancelled)
+            self._running -= 1
+            self._finished += 1
+            self._progress.set()
+            if not self._running:
+                self._idle.set()
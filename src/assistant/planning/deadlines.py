@@ -0,0 +1,137 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, List, Optional
+
+from src.assistant.planning.tool_executor import get_tool_executor
+
+
+class ToolTimeout(TimeoutError):
+    """Raised when a tool call (and any hedge) misses its deadline."""
+
+
+class ToolCancelled(Exception):
+    """Raised when the plan a tool call belongs to was stopped while it ran."""
+
+
+# Tool calls run here while a tool executor worker waits on them with a
+# deadline. They can't go back to the tool executor itself: with every worker
+# waiting on a call queued behind them, nothing would run until the deadlines
+# passed. Each worker waits on at most a call and its hedge, so the pool is
+# twice the tool executor's max_workers (TOOL_EXECUTOR_MAX_WORKERS), and tools
+# use at most three times that many threads in total. A call that misses its
+# deadline is abandoned, not killed, and keeps its thread until the underlying
+# request gives up; calls beyond the pool queue for a thread meanwhile.
+_call_pool: Optional[ThreadPoolExecutor] = None
+_call_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _call_pool
+    with _call_pool_lock:
+        if _call_pool is None:
+            workers = 2 * get_tool_executor().max_workers
+            _call_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool-call")
+        return _call_pool
+
+
+def _start(fn: Callable[[], Any]) -> Future:
+    # Carry the caller's context (LangChain run tree, config) into the call thread
+    return _pool().submit(contextvars.copy_context().run, fn)
+
+
+def _wait_timeout(deadline: Optional[float], hedge_at: Optional[float]) -> Optional[float]:
+    wake_at = [t for t in (deadline, hedge_at) if t is not None]
+    return max(0.0, min(wake_at) - time.monotonic()) if wake_at else None
+
+
+def _first_result(calls: List[Future]):
+    # Prefer a successful call; only fail once every call has failed.
+    for future in calls:
+        if future.done() and future.exception() is None:
+            return True, future.result()
+    if all(future.done() for future in calls):
+        raise calls[0].exception()
+    return False, None
+
+
+def call_with_deadline(
+        fn: Callable[[], Any],
+        timeout: Optional[float],
+        hedge_after: Optional[float] = None,
+        hedge: Optional[Callable[[], Optional[Callable[[], Any]]]] = None,
+        cancel: Optional[Future] = None,
+) -> Any:
+    """
+    Run fn, giving up with ToolTimeout after `timeout` seconds. If hedge_after
+    is set and fn is still running by then, hedge() is asked for a duplicate
+    call (it may return None to skip hedging, e.g. when throttled) and the
+    first call to succeed wins. Resolving the `cancel` future abandons the
+    call with ToolCancelled.
+    """
+    started = time.monotonic()
+    deadline = started + timeout if timeout is not None else None
+    calls = [_start(fn)]
+    hedge_at = started + hedge_after if hedge_after is not None and hedge is not None else None
+    while True:
+        pending = [future for future in calls if not future.done()]
+        if pending:
+            wait(pending + ([cancel] if cancel else []), timeout=_wait_timeout(deadline, hedge_at),
+                 return_when=FIRST_COMPLETED)
+        finished, result = _first_result(calls)
+        if finished:
+            for future in calls:
+                future.cancel()
+            return result
+        if cancel is not None and cancel.done():
+            for future in calls:
+                future.cancel()
+            raise ToolCancelled()
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            for future in calls:
+                future.cancel()
+            raise ToolTimeout(f"no result after {timeout:.1f}s")
+        if hedge_at is not None and now >= hedge_at:
+            hedge_at = None
+            duplicate = hedge()
+            if duplicate is not None:
+                calls.append(_start(duplicate))
+
+
+async def acall_with_deadline(
+        make_call: Callable[[], Awaitable[Any]],
+        timeout: Optional[float],
+        hedge_after: Optional[float] = None,
+        hedge: Optional[Callable[[], Optional[Callable[[], Awaitable[Any]]]]] = None,
+) -> Any:
+    """Async counterpart of call_with_deadline; losing calls are cancelled."""
+    started = time.monotonic()
+    deadline = started + timeout if timeout is not None else None
+    calls = [asyncio.ensure_future(make_call())]
+    hedge_at = started + hedge_after if hedge_after is not None and hedge is not None else None
+    try:
+        while True:
+            pending = [call for call in calls if not call.done()]
+            if pending:
+                await asyncio.wait(
+                    pending, timeout=_wait_timeout(deadline, hedge_at), return_when=asyncio.FIRST_COMPLETED
+                )
+            for call in calls:
+                if call.done() and not call.cancelled() and call.exception() is None:
+                    return call.result()
+            if all(call.done() for call in calls):
+                return calls[0].result()
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise ToolTimeout(f"no result after {timeout:.1f}s")
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                duplicate = hedge()
+                if duplicate is not None:
+                    calls.append(asyncio.ensure_future(duplicate()))
+    finally:
+        for call in calls:
+            call.cancel()
@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.assistant.planning.observation_store import render_observation
+from src.logger import configured_logger
+
+# Finished plan timelines kept in memory for /traces, newest last
+MAX_RECENT_TRACES = int(os.getenv("PLAN_TRACE_HISTORY", "100"))
+# When set, every plan's Chrome trace is also written to this directory
+TRACE_DIR = os.getenv("PLAN_TRACE_DIR")
+
+
+def _merge_intervals(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class TaskSpan:
+    """
+    One task's way through the scheduler (perf_counter seconds): parsed from
+    the planner stream, dependencies satisfied, tool call started, finished.
+    """
+
+    def __init__(self, idx: int, tool: str, arg_size: int, dependencies: List[int], queued: float):
+        self.idx = idx
+        self.tool = tool
+        self.arg_size = arg_size
+        self.dependencies = dependencies
+        self.queued = queued
+        self.ready: Optional[float] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result_size: Optional[int] = None
+        self.attempts = 0
+
+
+def _result_size(result: Any) -> Optional[int]:
+    if result is None:
+        return None
+    return len(result) if isinstance(result, str) else len(render_observation(result))
+
+
+class PlanExecutionTimeline:
+    """
+    Records when the planner was streaming and when tasks were executing, so we
+    can see how much tool execution actually overlapped with planning, plus a
+    span per task that can be exported as a Chrome / Perfetto trace.
+    """
+
+    def __init__(self, planning_started: Optional[float] = None):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.created_at = time.time()
+        self.planning_started = planning_started or time.perf_counter()
+        self.planning_finished: Optional[float] = None
+        self._lock = threading.Lock()
+        self._running: Dict[int, float] = {}
+        self._executions: List[Tuple[float, float]] = []
+        self.spans: Dict[int, TaskSpan] = {}
+
+    def planning_done(self) -> None:
+        self.planning_finished = time.perf_counter()
+
+    def task_queued(self, idx: int, tool: str, args: Any, dependencies: Iterable[int]) -> None:
+        arg_size = len(args) if isinstance(args, str) else len(render_observation(args))
+        with self._lock:
+            self.spans[idx] = TaskSpan(idx, tool, arg_size, sorted(dependencies), time.perf_counter())
+
+    def task_ready(self, idx: int) -> None:
+        with self._lock:
+            span = self.spans.get(idx)
+            if span is not None and span.ready is None:
+                span.ready = time.perf_counter()
+
+    def task_started(self, idx: int) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            self._running[idx] = now
+            span = self.spans.get(idx)
+            if span is not None:
+                span.started = now
+                span.attempts += 1
+
+    def task_finished(self, idx: int, result: Any = None) -> None:
+        now = time.perf_counter()
+        result_size = _result_size(result)
+        with self._lock:
+            started = self._running.pop(idx, None)
+            if started is not None:
+                self._executions.append((started, now))
+            span = self.spans.get(idx)
+            if span is not None:
+                span.finished = now
+                span.result_size = result_size
+
+    def critical_chain(self) -> List[TaskSpan]:
+        """
+        The chain of tasks that determined when the plan finished: start from
+        the task that finished last and repeatedly step to the dependency that
+        finished last.
+        """
+        with self._lock:
+            spans = {idx: span for idx, span in self.spans.items() if span.finished is not None}
+        chain = []
+        span = max(spans.values(), key=lambda s: s.finished, default=None)
+        while span is not None:
+            chain.append(span)
+            deps = [spans[dep] for dep in span.dependencies if dep in spans]
+            span = max(deps, key=lambda s: s.finished, default=None)
+        return chain[::-1]
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Returns (in seconds): planning time, wall-clock time with at least one
+        task executing, the part of that execution time that happened while the
+        planner was still streaming, and the delay before the first task ran.
+        """
+        planning_finished = self.planning_finished or time.perf_counter()
+        with self._lock:
+            executions = _merge_intervals(self._executions)
+        execution = sum(end - start for start, end in executions)
+        overlap = sum(
+            max(0.0, min(end, planning_finished) - max(start, self.planning_started))
+            for start, end in executions
+        )
+        first_task = executions[0][0] - self.planning_started if executions else 0.0
+        return {
+            "planning": planning_finished - self.planning_started,
+            "execution": execution,
+            "overlap": overlap,
+            "overlap_ratio": overlap / execution if execution else 0.0,
+            "first_task_delay": first_task,
+            "total": max([planning_finished] + [end for _, end in executions]) - self.planning_started,
+        }
+
+    def format_summary(self) -> str:
+        s = self.summary()
+        chain = " -> ".join(
+            f"{span.idx} {span.tool} ({span.finished - (span.started or span.finished):.2f}s)"
+            for span in self.critical_chain()
+        )
+        return (
+            f"[{self.request_id}] planning {s['planning']:.3f}s, execution {s['execution']:.3f}s, "
+            f"overlap {s['overlap']:.3f}s ({s['overlap_ratio']:.0%} of execution ran while planning), "
+            f"first task after {s['first_task_delay']:.3f}s, total {s['total']:.3f}s, "
+            f"critical chain: {chain or 'none'}"
+        )
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        The plan in Chrome trace event format (open in chrome://tracing or
+        ui.perfetto.dev): the planner on one row, one row per task, with
+        separate slices for waiting on dependencies, waiting for a worker or
+        throttle slot, and running the tool.
+        """
+
+        def us(t: float) -> float:
+            return round((t - self.planning_started) * 1e6, 1)
+
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": "planner"}},
+            {
+                "name": "planning", "cat": "planner", "ph": "X", "pid": 1, "tid": 0, "ts": 0,
+                "dur": us(self.planning_finished or time.perf_counter()),
+            },
+        ]
+        with self._lock:
+            spans = sorted(self.spans.values(), key=lambda s: s.idx)
+        for span in spans:
+            events.append(
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": span.idx,
+                 "args": {"name": f"{span.idx} {span.tool}"}}
+            )
+            slices = [
+                ("waiting for dependencies", "dependencies", span.queued, span.ready),
+                ("queued", "queue", span.ready, span.started),
+                (span.tool, "tool", span.started, span.finished),
+            ]
+            for name, category, start, end in slices:
+                if start is None or end is None:
+                    continue
+                events.append({
+                    "name": name, "cat": category, "ph": "X", "pid": 1, "tid": span.idx,
+                    "ts": us(start), "dur": round(us(end) - us(start), 1),
+                    "args": {
+                        "idx": span.idx,
+                        "tool": span.tool,
+                        "dependencies": span.dependencies,
+                        "arg_size": span.arg_size,
+                        "result_size": span.result_size,
+                        "attempts": span.attempts,
+                    },
+                })
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"request_id": self.request_id, "created_at": self.created_at, **self.summary()},
+        }
+
+    def close(self) -> None:
+        """Keep the finished plan's trace for /traces and write it out if PLAN_TRACE_DIR is set."""
+        with recent_timelines_lock:
+            recent_timelines[self.request_id] = self
+            while len(recent_timelines) > MAX_RECENT_TRACES:
+                recent_timelines.popitem(last=False)
+        if TRACE_DIR:
+            try:
+                path = Path(TRACE_DIR)
+                path.mkdir(parents=True, exist_ok=True)
+                (path / f"{self.request_id}.json").write_text(json.dumps(self.chrome_trace()))
+            except OSError as e:
+                configured_logger.warning(f"Could not write plan trace {self.request_id}: {e}")
+
+
+recent_timelines: "OrderedDict[str, PlanExecutionTimeline]" = OrderedDict()
+# Plans close on pool threads while /traces reads the history
+recent_timelines_lock = threading.Lock()
+
+
+def recent_traces() -> List[Tuple[str, PlanExecutionTimeline]]:
+    """A copy of the kept timelines, oldest first."""
+    with recent_timelines_lock:
+        return list(recent_timelines.items())
@@ -1,9 +1,10 @@
-from typing import Union, List
+from typing import Optional, Union, List
 
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
 from pydantic import BaseModel, Field
 
+from src.assistant.planning.context_window import joiner_context
 from src.assistant.planning.prompts import joiner_prompt
 
 load_dotenv()
@@ -57,11 +58,39 @@ def select_recent_messages(state) -> dict:
         selected.append(msg)
         if isinstance(msg, HumanMessage):
             break
-    return {"messages": selected[::-1]}
+    return {"messages": joiner_context(selected[::-1])}
 
 
 joiner = select_recent_messages | runnable | _parse_joiner_output
 
+
+def _early_join_input(messages: List[BaseMessage], pending: List[str]) -> dict:
+    note = SystemMessage(
+        content=f"These tasks are still running: {', '.join(pending)}. Only give a final response if the"
+                " results above already answer the question without them; otherwise choose to replan"
+                " and their results will be waited for."
+    )
+    return select_recent_messages({"messages": messages + [note]})
+
+
+def join_early(messages: List[BaseMessage], pending: List[str]) -> Optional[dict]:
+    """
+    Ask the joiner whether the results so far already answer the question
+    while some tasks are still running. Returns the joiner output if it
+    finished, None if it would rather wait.
+    """
+    decision = runnable.invoke(_early_join_input(messages, pending))
+    if isinstance(decision.action, FinalResponse):
+        return _parse_joiner_output(decision)
+    return None
+
+
+async def ajoin_early(messages: List[BaseMessage], pending: List[str]) -> Optional[dict]:
+    decision = await runnable.ainvoke(_early_join_input(messages, pending))
+    if isinstance(decision.action, FinalResponse):
+        return _parse_joiner_output(decision)
+    return None
+
 # Test
 example_question = "What's the temperature in SF raised to the 3rd power?"
 
@@ -0,0 +1,213 @@
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers.transform import BaseTransformOutputParser
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+
+from src.assistant.planning.output_parser import Task, _get_dependencies_from_graph
+from src.assistant.planning.tool_index import ToolIndex, ToolSpec, tool_index
+from src.logger import configured_logger
+
+PLAN_FUNCTION_NAME = "submit_plan"
+
+# Non-string args may also take the output of an earlier task
+_REFERENCE_SCHEMA = {
+    "type": "string",
+    "pattern": r"^\$\{?\d+\}?$",
+    "description": "The output of an earlier task, as $idx",
+}
+
+_JSON_SPECIAL = re.compile(r'[{}\[\]"]')
+_JSON_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+def _arg_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    if schema.get("type") == "string":
+        return dict(schema)
+    return {"anyOf": [dict(schema), _REFERENCE_SCHEMA]}
+
+
+def _task_schema(tool_name: str, args_schema: Dict[str, Any], description: str) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "description": description,
+        "properties": {
+            "idx": {"type": "integer", "description": "Unique, strictly increasing task id"},
+            "tool": {"type": "string", "enum": [tool_name]},
+            "args": args_schema,
+            "thought": {"type": "string", "description": "Optional reasoning behind this task"},
+        },
+        "required": ["idx", "tool", "args"],
+    }
+
+
+def _tool_task_schema(spec: ToolSpec) -> Dict[str, Any]:
+    args_schema = {
+        "type": "object",
+        "properties": {name: _arg_schema(schema) for name, schema in spec.arg_schemas.items()},
+        "required": sorted(spec.required),
+    }
+    return _task_schema(spec.name, args_schema, spec.tool.description)
+
+
+def plan_schema(tools: Union[Sequence[BaseTool], ToolIndex]) -> Dict[str, Any]:
+    """JSON schema of a whole plan: the tasks, in order, each calling one of the tools or join."""
+    index = tool_index(tools)
+    variants = [_tool_task_schema(spec) for spec in index.values()]
+    variants.append(
+        _task_schema("join", {"type": "object", "properties": {}}, "Collects and combines results from prior tasks.")
+    )
+    return {
+        "type": "object",
+        "properties": {"tasks": {"type": "array", "items": {"anyOf": variants}}},
+        "required": ["tasks"],
+    }
+
+
+def bind_plan_function(llm: BaseChatModel, tools: Sequence[BaseTool]) -> Runnable:
+    """The planner LLM, made to answer with a single submit_plan call whose arguments are the plan."""
+    plan_function = {
+        "type": "function",
+        "function": {
+            "name": PLAN_FUNCTION_NAME,
+            "description": "Submit the plan: the tasks to run, in order, ending with join.",
+            "parameters": plan_schema(tools),
+        },
+    }
+    return llm.bind_tools([plan_function], tool_choice=PLAN_FUNCTION_NAME)
+
+
+class JSONPlanScanner:
+    """
+    Incremental scanner over a streamed {"tasks": [...]} document. Returns the
+    text of each element of the tasks array as soon as its closing brace
+    arrives; everything else (and any text outside the tasks) is skipped.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Text of the task object being read, if one is open
+        self._pieces: List[str] = []
+        self._capturing = False
+
+    def feed(self, text: str) -> List[str]:
+        items = []
+        start = 0 if self._capturing else None
+        pos = 0
+        n = len(text)
+        while pos < n:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    pos += 1
+                    continue
+                match = _JSON_STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    if pos < n:
+                        pos += 1
+                    else:
+                        self._escaped = True
+                else:
+                    self._in_string = False
+                continue
+            match = _JSON_SPECIAL.search(text, pos)
+            if match is None:
+                break
+            c = match.group()
+            pos = match.end()
+            if c == '"':
+                self._in_string = True
+            elif c in "{[":
+                if c == "{" and len(self._stack) == 2 and self._stack[1] == "[":
+                    start = match.start()
+                self._stack.append(c)
+            elif self._stack:
+                self._stack.pop()
+                if c == "}" and start is not None and len(self._stack) == 2:
+                    self._pieces.append(text[start:pos])
+                    items.append("".join(self._pieces))
+                    self._pieces = []
+                    start = None
+        if start is not None:
+            self._pieces.append(text[start:])
+        self._capturing = start is not None
+        return items
+
+
+def _plan_text(chunk: Union[str, BaseMessage]) -> str:
+    if isinstance(chunk, str):
+        return chunk
+    tool_call_chunks = getattr(chunk, "tool_call_chunks", None)
+    if tool_call_chunks:
+        return "".join(call.get("args") or "" for call in tool_call_chunks if call.get("index") in (None, 0))
+    tool_calls = getattr(chunk, "tool_calls", None)
+    if tool_calls:
+        # A complete, non-streamed message
+        return json.dumps(tool_calls[0]["args"])
+    # JSON mode providers put the document in the content
+    return str(chunk.content)
+
+
+def _to_task(index: ToolIndex, text: str) -> Optional[Task]:
+    try:
+        item = json.loads(text)
+    except ValueError as e:
+        configured_logger.warning(f"Dropping malformed plan task {text!r}: {e}")
+        return None
+    idx, tool_name, args = item.get("idx"), item.get("tool"), item.get("args") or {}
+    if not isinstance(idx, int) or not isinstance(tool_name, str) or not isinstance(args, dict):
+        configured_logger.warning(f"Dropping plan task without a valid idx, tool and args: {text!r}")
+        return None
+    if tool_name == "join":
+        tool, args = "join", ()
+    else:
+        spec = index.get(tool_name)
+        if spec is None:
+            configured_logger.warning(f"Dropping plan task {idx}: tool {tool_name} not found")
+            return None
+        tool = spec.tool
+    return Task(
+        idx=idx,
+        tool=tool,
+        args=args,
+        dependencies=_get_dependencies_from_graph(idx, tool_name, args),
+        thought=item.get("thought"),
+    )
+
+
+class JSONPlanParser(BaseTransformOutputParser[dict], extra="allow"):
+    """
+    Parses a plan submitted as a submit_plan function call (or a JSON mode
+    document), yielding each Task while the rest of the plan is still
+    streaming. Args arrive as typed JSON, so there is no literal_eval step.
+    """
+
+    tools: List[BaseTool]
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Task]:
+        scanner = JSONPlanScanner()
+        index = tool_index(self.tools)
+        for chunk in input:
+            for item in scanner.feed(_plan_text(chunk)):
+                if task := _to_task(index, item):
+                    yield task
+
+    async def _atransform(self, input: AsyncIterator[Union[str, BaseMessage]]) -> AsyncIterator[Task]:
+        scanner = JSONPlanScanner()
+        index = tool_index(self.tools)
+        async for chunk in input:
+            for item in scanner.feed(_plan_text(chunk)):
+                if task := _to_task(index, item):
+                    yield task
+
+    def parse(self, text: str) -> List[Task]:
+        return list(self._transform([text]))
@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Optional
+
+from src.logger import configured_logger
+from src.utils import get_resource_path
+
+# Used until a tool has been observed at least once.
+DEFAULT_LATENCY = 1.0
+
+
+class ToolLatencyModel:
+    """
+    Rolling per-tool latency samples (seconds), used to estimate how long a
+    task will take when ranking ready tasks and choosing hedging deadlines.
+    Samples are persisted so estimates survive restarts: every save_every
+    samples on a background thread, and with save() at shutdown.
+    """
+
+    def __init__(self, window: int = 200, path: Optional[Path] = None, save_every: int = 50):
+        self.window = window
+        self.path = path
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._unsaved = 0
+        self._saving = False
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self._unsaved += 1
+            should_save = self.path is not None and self._unsaved >= self.save_every and not self._saving
+            if should_save:
+                self._saving = True
+        if should_save:
+            # Not on the caller's thread: tasks record here, some on the event loop
+            threading.Thread(target=self._save_in_background, daemon=True, name="tool-latency-save").start()
+
+    def _save_in_background(self) -> None:
+        try:
+            self.save()
+        finally:
+            with self._lock:
+                self._saving = False
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return len(self._samples.get(name) or ())
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """The q-th quantile (0-1) of the recent samples for a tool, or None if never seen."""
+        with self._lock:
+            samples = sorted(self._samples.get(name) or ())
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def estimate(self, name: str) -> float:
+        """Expected duration of a call: the median of recent samples."""
+        median = self.percentile(name, 0.5)
+        return DEFAULT_LATENCY if median is None else median
+
+    def histogram(self, name: str, buckets: Iterable[float] = (0.01, 0.1, 0.5, 1, 2, 5, 10, 30)) -> Dict[str, int]:
+        with self._lock:
+            samples = list(self._samples.get(name) or ())
+        counts = {}
+        lower = 0.0
+        for upper in buckets:
+            counts[f"<={upper}s"] = sum(1 for s in samples if lower < s <= upper)
+            lower = upper
+        counts[f">{lower}s"] = sum(1 for s in samples if s > lower)
+        return counts
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            names = list(self._samples)
+        return {
+            name: {
+                "samples": len(self._samples[name]),
+                "p50": self.percentile(name, 0.5),
+                "p95": self.percentile(name, 0.95),
+                "histogram": self.histogram(name),
+            }
+            for name in names
+        }
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        # One save at a time, so an older snapshot never replaces a newer one
+        with self._save_lock:
+            with self._lock:
+                data = {name: list(samples) for name, samples in self._samples.items()}
+                self._unsaved = 0
+            tmp_path = None
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # A temp file of its own, in case another process saves to the same path
+                with tempfile.NamedTemporaryFile(
+                        "w", dir=self.path.parent, prefix=f"{self.path.stem}.", suffix=".tmp", delete=False
+                ) as tmp:
+                    tmp_path = Path(tmp.name)
+                    tmp.write(json.dumps(data))
+                tmp_path.replace(self.path)
+            except OSError as e:
+                configured_logger.warning(f"Could not save tool latencies to {self.path}: {e}")
+                if tmp_path is not None:
+                    tmp_path.unlink(missing_ok=True)
+
+    def load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            configured_logger.warning(f"Ignoring unreadable tool latency file {self.path}: {e}")
+            return
+        with self._lock:
+            for name, samples in data.items():
+                self._samples[name] = deque(samples, maxlen=self.window)
+
+
+def _latency_path() -> Path:
+    path = os.getenv("TOOL_LATENCY_PATH")
+    return Path(path) if path else get_resource_path("tool_latency.json")
+
+
+tool_latency_model = ToolLatencyModel(path=_latency_path())
+tool_latency_model.load()
@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from src.assistant.planning.tool_policies import ToolPolicy, get_tool_policy
+
+_MISSING = object()
+
+
+def canonical_args(args: Any) -> str:
+    """Stable key for resolved tool args: key order and container types do not matter."""
+    return json.dumps(args, sort_keys=True, default=str, separators=(",", ":"))
+
+
+class ObservationMemo:
+    """
+    Per-conversation table of tool results keyed by tool name and canonical
+    resolved args, so a replan that repeats a call reuses the earlier result.
+
+    Only tools whose policy sets memoize_ttl are memoized (they must be free
+    of side effects), only successful results are (see ToolPolicy.is_failure,
+    so a replan can retry a flaky upstream), and entries expire after that
+    many seconds. The number
+    of conversations and entries per conversation are bounded (LRU).
+    """
+
+    def __init__(
+            self,
+            policy_for: Callable[[str], ToolPolicy] = get_tool_policy,
+            max_conversations: int = 1024,
+            max_entries: int = 256,
+    ):
+        self._policy_for = policy_for
+        self.max_conversations = max_conversations
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._tables: "OrderedDict[Hashable, OrderedDict[Tuple[str, str], Tuple[float, Any]]]" = OrderedDict()
+        self._hits: Dict[str, int] = defaultdict(int)
+        self._misses: Dict[str, int] = defaultdict(int)
+
+    def memoizes(self, name: str) -> bool:
+        return self._policy_for(name).memoize_ttl is not None
+
+    def _lookup(self, conversation: Hashable, name: str, args: Any) -> Any:
+        key = (name, canonical_args(args))
+        with self._lock:
+            table = self._tables.get(conversation)
+            entry = table.get(key) if table is not None else None
+            if entry is not None and entry[0] > time.monotonic():
+                table.move_to_end(key)
+                self._hits[name] += 1
+                return entry[1]
+            if entry is not None:
+                del table[key]
+            self._misses[name] += 1
+            return _MISSING
+
+    def recall(self, conversation: Hashable, name: str, args: Any) -> Tuple[bool, Any]:
+        """(True, result) if an identical call was memoized in this conversation, else (False, None)."""
+        if conversation is None or not self.memoizes(name):
+            return False, None
+        result = self._lookup(conversation, name, args)
+        return (False, None) if result is _MISSING else (True, result)
+
+    def remember(self, conversation: Hashable, name: str, args: Any, result: Any) -> None:
+        if conversation is None:
+            return
+        policy = self._policy_for(name)
+        ttl = policy.memoize_ttl
+        if ttl is None or policy.is_failure(result):
+            return
+        key = (name, canonical_args(args))
+        with self._lock:
+            table = self._tables.get(conversation)
+            if table is None:
+                table = self._tables[conversation] = OrderedDict()
+                if len(self._tables) > self.max_conversations:
+                    self._tables.popitem(last=False)
+            self._tables.move_to_end(conversation)
+            table[key] = (time.monotonic() + ttl, result)
+            table.move_to_end(key)
+            if len(table) > self.max_entries:
+                table.popitem(last=False)
+
+    def forget(self, conversation: Hashable) -> None:
+        with self._lock:
+            self._tables.pop(conversation, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = {
+                name: {
+                    "hits": self._hits[name],
+                    "misses": self._misses[name],
+                    "hit_rate": self._hits[name] / (self._hits[name] + self._misses[name]),
+                }
+                for name in set(self._hits) | set(self._misses)
+            }
+            hits, misses = sum(self._hits.values()), sum(self._misses.values())
+            return {
+                "conversations": len(self._tables),
+                "entries": sum(len(table) for table in self._tables.values()),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "tools": tools,
+            }
+
+
+observation_memo = ObservationMemo()
@@ -0,0 +1,54 @@
+import json
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+
+def render_observation(value: Any) -> str:
+    """
+    Text shown to the LLM for a tool result. Strings pass through untouched;
+    structured results become compact JSON rather than Python reprs.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list, tuple)):
+        try:
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+        except ValueError:
+            # e.g. circular references
+            return str(value)
+    return str(value)
+
+
+class ObservationStore(Mapping):
+    """
+    Results of the tasks of one plan (plus earlier plans), keyed by task idx
+    and kept as the native objects the tools returned.
+
+    Written from several pool threads; reads go straight to the underlying
+    dict without taking the lock.
+    """
+
+    def __init__(self, initial: Optional[Dict[int, Any]] = None):
+        self._values: Dict[int, Any] = dict(initial or {})
+        self._lock = threading.Lock()
+
+    def __getitem__(self, idx: int) -> Any:
+        return self._values[idx]
+
+    def __contains__(self, idx: object) -> bool:
+        return idx in self._values
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._values))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __setitem__(self, idx: int, value: Any) -> None:
+        with self._lock:
+            self._values[idx] = value
+
+    def snapshot(self) -> Dict[int, Any]:
+        with self._lock:
+            return dict(self._values)
@@ -2,11 +2,13 @@ import ast
 import re
 from typing import (
     Any,
+    AsyncIterator,
     Dict,
     Iterator,
     List,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Union,
 )
@@ -18,12 +20,28 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool
 from typing_extensions import TypedDict
 
-THOUGHT_PATTERN = r"Thought: ([^\n]*)"
-ACTION_PATTERN = r"\n*(\d+)\. (\w+)\((.*)\)(\s*#\w+\n)?"
+from src.assistant.planning.tool_index import ToolIndex, ToolSpec, tool_index
+
+THOUGHT_PREFIX = "Thought: "
+# "3. tool_name(" at the start of a line; the args follow up to the matching ")"
+ACTION_HEAD = re.compile(r"(\d+)\. (\w+)\(")
+# A line start that could still turn into an action head once more text arrives
+PARTIAL_ACTION_HEAD = re.compile(r"\d*|\d+\.|\d+\. \w*")
 # $1 or ${1} -> 1
 ID_PATTERN = r"\$\{?(\d+)\}?"
+_ID_REFERENCE = re.compile(ID_PATTERN)
 END_OF_PLAN = "<END_OF_PLAN>"
 
+# Characters that matter while scanning tool-call args outside a string literal:
+# finding the closing ")" of a call only needs parentheses, splitting the args
+# on top-level commas needs every kind of bracket
+_CLOSE_SPECIAL = re.compile(r"[()'\"\n]")
+_SPLIT_SPECIAL = re.compile(r"[()\[\]{}'\",]")
+_STRING_SPECIAL = {'"': re.compile(r'["\\\n]'), "'": re.compile(r"['\\\n]")}
+# A quote only opens a string literal where a value can start, so the
+# apostrophe in an unquoted `query=what's new` is just text
+_VALUE_START = "=([{,:"
+
 
 ### Helper functions
 
@@ -35,58 +53,167 @@ def _ast_parse(arg: str) -> Any:
         return arg
 
 
-def _parse_llm_compiler_action_args(args: str, tool: Union[str, BaseTool]) -> list[Any]:
-    """Parse arguments from a string."""
+class _ArgScanner:
+    """
+    Tracks string literals and bracket nesting through tool-call args, which
+    may arrive split across any number of chunks. Plain text between the
+    characters that matter is skipped with a regex search, so each character
+    is looked at once.
+    """
+
+    __slots__ = ("stops", "special", "depth", "quote", "escaped", "last")
+
+    def __init__(self, stops: str):
+        self.stops = stops
+        self.special = _SPLIT_SPECIAL if "," in stops else _CLOSE_SPECIAL
+        self.depth = 0
+        self.quote: Optional[str] = None
+        self.escaped = False
+        # Last non-blank character of the previous chunk
+        self.last = "("
+
+    def _opens_string(self, text: str, i: int) -> bool:
+        j = i - 1
+        while j >= 0 and text[j].isspace():
+            j -= 1
+        return (text[j] if j >= 0 else self.last) in _VALUE_START
+
+    def _ran_out(self, text: str) -> int:
+        stripped = text.rstrip()
+        if stripped:
+            self.last = stripped[-1]
+        return -1
+
+    def scan(self, text: str, pos: int) -> int:
+        """
+        Advance through text from pos and return the index of the first
+        character in `stops` that is outside any string literal (")" and ","
+        only count at the top level), or -1 once the text has run out.
+        """
+        stops = self.stops
+        n = len(text)
+        while pos < n:
+            if self.quote is not None:
+                if self.escaped:
+                    self.escaped = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL[self.quote].search(text, pos)
+                if match is None:
+                    return self._ran_out(text)
+                i = match.start()
+                c = text[i]
+                pos = i + 1
+                if c == "\\":
+                    if pos < n:
+                        pos += 1
+                    else:
+                        self.escaped = True
+                elif c == "\n":
+                    if c in stops:
+                        self.quote = None
+                        return i
+                else:
+                    self.quote = None
+                continue
+            match = self.special.search(text, pos)
+            if match is None:
+                return self._ran_out(text)
+            i = match.start()
+            c = text[i]
+            if c in "'\"":
+                if self._opens_string(text, i):
+                    self.quote = c
+            elif c in "([{":
+                self.depth += 1
+            elif c in ")]}":
+                if self.depth == 0:
+                    if c in stops:
+                        return i
+                else:
+                    self.depth -= 1
+            elif c in stops and (c == "\n" or self.depth == 0):
+                return i
+            pos = i + 1
+        return self._ran_out(text)
+
+
+def _split_top_level(args: str) -> List[str]:
+    """Split args on the commas that are not inside a string literal or brackets."""
+    scanner = _ArgScanner(",")
+    parts = []
+    start = 0
+    while True:
+        comma = scanner.scan(args, start)
+        if comma < 0:
+            parts.append(args[start:])
+            return parts
+        parts.append(args[start:comma])
+        start = comma + 1
+
+
+def _parse_llm_compiler_action_args(args: str, spec: Optional[ToolSpec]) -> list[Any]:
+    """
+    Parse `key=value, ...` arguments from a string. Text before the first
+    keyword goes to the tool's first argument; a part that does not start
+    with one of the tool's argument names belongs to the value before it
+    (e.g. an unquoted `location=Paris, France`).
+    """
     if args == "":
         return ()
-    if isinstance(tool, str):
+    if spec is None:
         return ()
-    extracted_args = {}
-    tool_key = None
-    prev_idx = None
-    for key in tool.args.keys():
-        # Split if present
-        if f"{key}=" in args:
-            idx = args.index(f"{key}=")
-            if prev_idx is not None:
-                extracted_args[tool_key] = _ast_parse(
-                    args[prev_idx:idx].strip().rstrip(",")
-                )
-            args = args.split(f"{key}=", 1)[1]
-            tool_key = key
-            prev_idx = 0
-    if prev_idx is not None:
-        extracted_args[tool_key] = _ast_parse(
-            args[prev_idx:].strip().rstrip(",").rstrip(")")
-        )
-    return extracted_args
-
-
-def default_dependency_rule(idx, args: str):
-    matches = re.findall(ID_PATTERN, args)
-    numbers = [int(match) for match in matches]
-    return idx in numbers
-
-
-def _get_dependencies_from_graph(
-        idx: int, tool_name: str, args: Dict[str, Any]
-) -> dict[str, list[str]]:
-    """Get dependencies from a graph."""
+    values: Dict[str, List[str]] = {}
+    key = None
+    for part in _split_top_level(args):
+        name, sep, value = part.partition("=")
+        name = name.strip()
+        if sep and spec.has_arg(name):
+            key = name
+            values[key] = [value]
+        elif key is not None:
+            values[key].append(part)
+        elif part.strip():
+            if not spec.arg_names:
+                break
+            key = spec.arg_names[0]
+            values[key] = [part]
+    return {key: _ast_parse(",".join(parts).strip().rstrip(",")) for key, parts in values.items()}
+
+
+def _collect_references(value: Any, found: Set[int]) -> None:
+    # Walk the parsed args once; only string values can hold $id references
+    if isinstance(value, str):
+        if "$" in value:
+            found.update(int(match) for match in _ID_REFERENCE.findall(value))
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect_references(item, found)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            _collect_references(item, found)
+
+
+def _get_dependencies_from_graph(idx: int, tool_name: str, args: Any) -> Set[int]:
+    """The earlier tasks whose outputs the task's args reference; join depends on everything before it."""
     if tool_name == "join":
-        return list(range(1, idx))
-    return [i for i in range(1, idx) if default_dependency_rule(i, str(args))]
+        return set(range(1, idx))
+    found = set()
+    _collect_references(args, found)
+    # A reference to this task or a later one could never be satisfied
+    return {dep for dep in found if 0 < dep < idx}
 
 
 class Task(TypedDict):
     idx: int
     tool: BaseTool
     args: list
-    dependencies: Dict[str, list]
+    dependencies: Set[int]
     thought: Optional[str]
 
 
 def instantiate_task(
-        tools: Sequence[BaseTool],
+        tools: Union[Sequence[BaseTool], ToolIndex],
         idx: int,
         tool_name: str,
         args: Union[str, Any],
@@ -94,12 +221,13 @@ def instantiate_task(
 ) -> Task:
     if tool_name == "join":
         tool = "join"
+        spec = None
     else:
-        try:
-            tool = tools[[tool.name for tool in tools].index(tool_name)]
-        except ValueError as e:
-            raise OutputParserException(f"Tool {tool_name} not found.") from e
-    tool_args = _parse_llm_compiler_action_args(args, tool)
+        spec = tool_index(tools).get(tool_name)
+        if spec is None:
+            raise OutputParserException(f"Tool {tool_name} not found.")
+        tool = spec.tool
+    tool_args = _parse_llm_compiler_action_args(args, spec)
     dependencies = _get_dependencies_from_graph(idx, tool_name, tool_args)
 
     return Task(
@@ -111,25 +239,170 @@ def instantiate_task(
     )
 
 
+_LINE_START, _THOUGHT, _ACTION, _SKIP = range(4)
+
+
+class PlanScanner:
+    """
+    Single pass, incremental scanner over the planner's text. Feed it chunks
+    as they stream in; it yields (idx, tool_name, args, thought) for each
+    action the moment the action's closing parenthesis arrives, instead of
+    waiting for the end of the line. Work is linear in the length of the
+    plan however it is chunked.
+
+    An action whose parentheses never balance (e.g. an unquoted ")" in the
+    args) falls back to everything up to the last ")" on its line.
+    """
+
+    def __init__(self):
+        self._mode = _LINE_START
+        # Start of the current line, until we know what kind of line it is
+        self._head = ""
+        self._pieces: List[str] = []
+        # Chunks of the current action not scanned yet: none of them can close it
+        self._unscanned: List[str] = []
+        self._action: Optional[Tuple[int, str]] = None
+        self._args: Optional[_ArgScanner] = None
+        self.thought: Optional[str] = None
+
+    def feed(self, text: str) -> Sequence[Tuple[int, str, str, Optional[str]]]:
+        """Consume the next chunk and return the actions it completed."""
+        if "\n" not in text:
+            # Fast path for the typical few-character token that can neither
+            # end the line nor close the action: just keep it
+            mode = self._mode
+            if mode == _ACTION:
+                if ")" not in text:
+                    self._unscanned.append(text)
+                    return ()
+            elif mode == _SKIP:
+                return ()
+            elif mode == _THOUGHT:
+                self._pieces.append(text)
+                return ()
+            elif "(" not in text and len(self._head) < 16:
+                # Too early to tell what the line is
+                self._head += text
+                return ()
+        if self._unscanned:
+            self._unscanned.append(text)
+            text = "".join(self._unscanned)
+            self._unscanned = []
+        actions = []
+        pos = 0
+        n = len(text)
+        while pos < n:
+            if self._mode == _LINE_START:
+                pos = self._read_head(text, pos)
+            elif self._mode == _ACTION:
+                end = self._args.scan(text, pos)
+                if end < 0:
+                    self._pieces.append(text[pos:])
+                    break
+                self._pieces.append(text[pos:end])
+                if text[end] == ")":
+                    actions.append(self._emit("".join(self._pieces)))
+                    self._mode = _SKIP
+                else:
+                    actions.extend(self._end_of_line())
+                    self._mode = _LINE_START
+                pos = end + 1
+            else:
+                newline = text.find("\n", pos)
+                if newline < 0:
+                    if self._mode == _THOUGHT:
+                        self._pieces.append(text[pos:])
+                    break
+                if self._mode == _THOUGHT:
+                    self._pieces.append(text[pos:newline])
+                    self.thought = "".join(self._pieces)
+                self._mode = _LINE_START
+                pos = newline + 1
+        return actions
+
+    def finish(self) -> List[Tuple[int, str, str, Optional[str]]]:
+        """Flush an action left open when the stream ended."""
+        actions = []
+        if self._mode == _ACTION:
+            self._pieces.extend(self._unscanned)
+            self._unscanned = []
+            actions = self._end_of_line()
+        self._mode = _LINE_START
+        self._head = ""
+        return actions
+
+    def _read_head(self, text: str, pos: int) -> int:
+        newline = text.find("\n", pos)
+        end = newline if newline >= 0 else len(text)
+        seen = len(self._head)
+        head = self._head + text[pos:end]
+        if match := ACTION_HEAD.match(head):
+            self._action = (int(match.group(1)), match.group(2))
+            self._args = _ArgScanner(")\n")
+            self._pieces = []
+            self._mode = _ACTION
+            self._head = ""
+            return pos + match.end() - seen
+        if head.startswith(THOUGHT_PREFIX):
+            # Optionally, an action can be preceded by a thought
+            self._pieces = [head[len(THOUGHT_PREFIX):]]
+            self._mode = _THOUGHT
+            self._head = ""
+            return end
+        if PARTIAL_ACTION_HEAD.fullmatch(head) or THOUGHT_PREFIX.startswith(head):
+            if newline < 0:
+                # Undecided; wait for more text
+                self._head = head
+                return end
+            self._head = ""
+            return newline + 1
+        # Anything else is just dropped
+        self._head = ""
+        self._mode = _SKIP
+        return end
+
+    def _end_of_line(self) -> List[Tuple[int, str, str, Optional[str]]]:
+        line = "".join(self._pieces)
+        close = line.rfind(")")
+        return [self._emit(line[:close])] if close >= 0 else []
+
+    def _emit(self, args: str) -> Tuple[int, str, str, Optional[str]]:
+        idx, tool_name = self._action
+        thought, self.thought = self.thought, None
+        self._pieces = []
+        return idx, tool_name, args, thought
+
+
 class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
     """Planning output parser."""
 
     tools: List[BaseTool]
 
     def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Task]:
-        texts = []
-        # TODO: Cleanup tuple state tracking here.
-        thought = None
+        scanner = PlanScanner()
+        index = tool_index(self.tools)
         for chunk in input:
             # Assume input is str. TODO: support vision/other formats
             text = chunk if isinstance(chunk, str) else str(chunk.content)
-            for task, thought in self.ingest_token(text, texts, thought):
-                yield task
+            for action in scanner.feed(text):
+                yield instantiate_task(index, *action)
         # Final possible task
-        if texts:
-            task, _ = self._parse_task("".join(texts), thought)
-            if task:
-                yield task
+        for action in scanner.finish():
+            yield instantiate_task(index, *action)
+
+    async def _atransform(
+            self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[Task]:
+        # Mirrors _transform; the base class would otherwise parse every chunk
+        # in isolation when the planner is consumed with astream.
+        scanner = PlanScanner()
+        index = tool_index(self.tools)
+        async for chunk in input:
+            text = chunk if isinstance(chunk, str) else str(chunk.content)
+            for action in scanner.feed(text):
+                yield instantiate_task(index, *action)
+        for action in scanner.finish():
+            yield instantiate_task(index, *action)
 
     def parse(self, text: str) -> List[Task]:
         return list(self._transform([text]))
@@ -141,37 +414,3 @@ class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
             **kwargs: Any | None,
     ) -> Iterator[Task]:
         yield from self.transform([input], config, **kwargs)
-
-    def ingest_token(
-            self, token: str, buffer: List[str], thought: Optional[str]
-    ) -> Iterator[Tuple[Optional[Task], str]]:
-        buffer.append(token)
-        if "\n" in token:
-            buffer_ = "".join(buffer).split("\n")
-            suffix = buffer_[-1]
-            for line in buffer_[:-1]:
-                task, thought = self._parse_task(line, thought)
-                if task:
-                    yield task, thought
-            buffer.clear()
-            buffer.append(suffix)
-
-    def _parse_task(self, line: str, thought: Optional[str] = None):
-        task = None
-        if match := re.match(THOUGHT_PATTERN, line):
-            # Optionally, action can be preceded by a thought
-            thought = match.group(1)
-        elif match := re.match(ACTION_PATTERN, line):
-            # if action is parsed, return the task, and clear the buffer
-            idx, tool_name, args, _ = match.groups()
-            idx = int(idx)
-            task = instantiate_task(
-                tools=self.tools,
-                idx=idx,
-                tool_name=tool_name,
-                args=args,
-                thought=thought,
-            )
-            thought = None
-        # Else it is just dropped
-        return task, thought
@@ -0,0 +1,461 @@
+"""
+Plan-template cache: skips the planner LLM for questions that come back with
+different entities ("what's the weather in Paris" / "... in Lyon").
+
+A first plan that ran without errors is stored as a template. The spans of
+the question that the plan copied into its args become slots; the rest of the
+question becomes a literal pattern. An incoming question is compared with the
+stored ones by TF-IDF cosine similarity, and the nearest template that is
+similar enough *and* whose pattern matches the question is instantiated into
+Tasks with the new slot values. Anything less certain goes to the planner.
+
+A template only gets slots if every arg of the plan can be traced back to the
+question (or is a $reference, or the tool's default); a plan with e.g.
+coordinates the planner knew for "Paris" is only reused for the exact same
+question.
+
+Plans are learned from only once the joiner has answered with them: a fresh
+plan is held per conversation until then, and a reused template that led to a
+replan is dropped.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from langchain_core.messages import BaseMessage, FunctionMessage
+from langchain_core.tools import BaseTool
+
+from src.assistant.planning.output_parser import Task, _get_dependencies_from_graph
+from src.assistant.planning.tool_index import ToolIndex, tool_spec
+from src.assistant.planning.tool_policies import get_tool_policy
+from src.logger import configured_logger
+
+PLAN_CACHE = os.getenv("PLAN_CACHE", "false").lower() == "true"
+# Cosine similarity below which the planner is asked instead
+PLAN_CACHE_MIN_SIMILARITY = float(os.getenv("PLAN_CACHE_MIN_SIMILARITY", "0.3"))
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "512"))
+# Conversations whose plan can wait for the joiner's verdict at once
+MAX_UNJUDGED_PLANS = 1024
+# Templates tried, most similar first, before giving up on a question
+MAX_CANDIDATES = 5
+# A slot value may be at most this many times longer (in words) than the one it was learned from
+MAX_SLOT_GROWTH = 3
+
+_WORD = re.compile(r"\w+")
+_REFERENCE = re.compile(r"\$\{?\d+\}?")
+_SLOT = "\x00{}\x00"
+_SLOT_MARKER = re.compile("\x00(\\d+)\x00")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can could do does for from get give how i in is it me my of on or please "
+    "show tell that the this to was what whats what's when where which who will with would you your".split()
+)
+
+
+class _NumberSlot(NamedTuple):
+    """A numeric arg taken from a slot of the question."""
+    slot: int
+
+
+def _words(text: str) -> List[str]:
+    return [word.lower() for word in _WORD.findall(text)]
+
+
+def _terms(text: str) -> Counter:
+    return Counter(word for word in _words(text) if word not in _STOPWORDS)
+
+
+def _leaves(value: Any) -> Iterable[Any]:
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _leaves(item)
+    elif isinstance(value, (list, tuple)) and not isinstance(value, _NumberSlot):
+        for item in value:
+            yield from _leaves(item)
+    else:
+        yield value
+
+
+def _map_leaves(value: Any, fn) -> Any:
+    if isinstance(value, dict):
+        return {key: _map_leaves(item, fn) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_map_leaves(item, fn) for item in value]
+    if isinstance(value, tuple) and not isinstance(value, _NumberSlot):
+        return tuple(_map_leaves(item, fn) for item in value)
+    return fn(value)
+
+
+def _span_pattern(text: str) -> re.Pattern:
+    # Not inside a word, nor the number of a $reference
+    return re.compile(rf"(?<![\w${{]){re.escape(text)}(?!\w)", re.IGNORECASE)
+
+
+@dataclass
+class PlanTemplate:
+    question: str
+    pattern: re.Pattern
+    # Words in each slot value the template was learned from, and whether it had digits
+    slot_shapes: Tuple[Tuple[int, bool], ...]
+    # (idx, tool name, args with slot markers, thought)
+    steps: Tuple[Tuple[int, str, Any, Optional[str]], ...]
+    tools: FrozenSet[str]
+    # Non-stopword words of the question outside the slots
+    terms: Counter = field(repr=False)
+    hits: int = 0
+
+    def slot_values(self, question: str) -> Optional[List[str]]:
+        match = self.pattern.fullmatch(_normalize(question))
+        if match is None:
+            return None
+        values = [value.strip() for value in match.groups()]
+        for value, (words, has_digits) in zip(values, self.slot_shapes):
+            count = len(_words(value))
+            if not count or count > words * MAX_SLOT_GROWTH or any(c.isdigit() for c in value) != has_digits:
+                return None
+        return values
+
+    def instantiate(self, values: List[str], index: ToolIndex) -> Optional[List[Task]]:
+        def fill(leaf):
+            if isinstance(leaf, _NumberSlot):
+                value = values[leaf.slot]
+                return int(value) if value.lstrip("-").isdigit() else float(value)
+            if isinstance(leaf, str) and "\x00" in leaf:
+                return _SLOT_MARKER.sub(lambda m: values[int(m.group(1))], leaf)
+            return leaf
+
+        tasks = []
+        for idx, name, args, thought in self.steps:
+            if name == "join":
+                tool = "join"
+            elif name in index:
+                tool = index[name].tool
+            else:
+                return None
+            try:
+                filled = _map_leaves(args, fill)
+            except ValueError:
+                # A numeric slot got a value that isn't a number
+                return None
+            tasks.append(
+                Task(
+                    idx=idx,
+                    tool=tool,
+                    args=filled,
+                    dependencies=_get_dependencies_from_graph(idx, name, filled),
+                    thought=thought,
+                )
+            )
+        return tasks
+
+
+def _grounded(leaf: Any, question_words: Set[str], default: Any) -> bool:
+    """Whether an arg value can be explained by the question alone."""
+    if leaf is None or isinstance(leaf, (bool, _NumberSlot)) or leaf == default:
+        return True
+    text = _SLOT_MARKER.sub(" ", _REFERENCE.sub(" ", str(leaf)))
+    return all(word in question_words or word in _STOPWORDS for word in _words(text))
+
+
+def build_template(question: str, tasks: List[Task]) -> Optional[PlanTemplate]:
+    question = _normalize(question)
+    steps = []
+    for task in tasks:
+        name = task["tool"] if isinstance(task["tool"], str) else task["tool"].name
+        steps.append((task["idx"], name, task["args"], task.get("thought")))
+    if not steps:
+        return None
+    leaves = [leaf for _, _, args, _ in steps for leaf in _leaves(args)]
+    strings = [leaf for leaf in leaves if isinstance(leaf, str)]
+    numbers = {str(leaf) for leaf in leaves if isinstance(leaf, (int, float)) and not isinstance(leaf, bool)}
+
+    # Longest spans of the question that the plan copied into its args become slots
+    matches = list(_WORD.finditer(question))
+    covered = [False] * len(matches)
+    spans = []
+    for length in range(len(matches), 0, -1):
+        for i in range(len(matches) - length + 1):
+            j = i + length - 1
+            if any(covered[i:j + 1]) or all(m.group().lower() in _STOPWORDS for m in matches[i:j + 1]):
+                continue
+            text = question[matches[i].start():matches[j].end()]
+            pattern = _span_pattern(text)
+            if any(pattern.search(leaf) for leaf in strings) or (length == 1 and text in numbers):
+                spans.append((matches[i].start(), matches[j].end(), text))
+                covered[i:j + 1] = [True] * length
+    spans.sort()
+
+    def abstract(leaf):
+        if isinstance(leaf, str):
+            for slot, (_, _, text) in enumerate(spans):
+                leaf = _span_pattern(text).sub(_SLOT.format(slot), leaf)
+            return leaf
+        if isinstance(leaf, (int, float)) and not isinstance(leaf, bool):
+            for slot, (_, _, text) in enumerate(spans):
+                if text == str(leaf):
+                    return _NumberSlot(slot)
+        return leaf
+
+    templated = [(idx, name, _map_leaves(args, abstract), thought) for idx, name, args, thought in steps]
+    question_words = set(_words(question))
+    grounded = all(
+        _grounded(value, question_words, _default(task, key))
+        for task, (_, _, args, _) in zip(tasks, templated)
+        if isinstance(args, dict)
+        for key, arg in args.items()
+        for value in _leaves(arg)
+    )
+    if not spans or not grounded:
+        # Reusable for this exact question only
+        spans, templated = [], steps
+
+    pattern, last = [], 0
+    for start, end, _ in spans:
+        pattern.append(_literal(question[last:start]))
+        pattern.append("(.+?)")
+        last = end
+    pattern.append(_literal(question[last:]))
+    return PlanTemplate(
+        question=question,
+        pattern=re.compile("".join(pattern), re.IGNORECASE),
+        slot_shapes=tuple((len(_words(text)), any(c.isdigit() for c in text)) for _, _, text in spans),
+        steps=tuple(templated),
+        tools=frozenset(name for _, name, _, _ in steps if name != "join"),
+        # Slot values say nothing about which plan fits; only the literal words are indexed
+        terms=_terms(_literal_text(question, spans)),
+    )
+
+
+def _literal_text(question: str, spans) -> str:
+    parts, last = [], 0
+    for start, end, _ in spans:
+        parts.append(question[last:start])
+        last = end
+    parts.append(question[last:])
+    return " ".join(parts)
+
+
+def _literal(text: str) -> str:
+    return r"\s+".join(re.escape(part) for part in re.split(r"\s+", text))
+
+
+def _normalize(question: str) -> str:
+    # "weather in Paris?" and "weather in Paris" are the same question
+    return question.strip().rstrip("?!. ")
+
+
+def _default(task: Task, key: str) -> Any:
+    if isinstance(task["tool"], BaseTool):
+        return tool_spec(task["tool"]).defaults.get(key, _NO_DEFAULT)
+    return _NO_DEFAULT
+
+
+_NO_DEFAULT = object()
+
+
+class PlanTemplateCache:
+    """
+    LRU of plan templates with a small TF-IDF index over their questions.
+    Keeps hit/miss counts and the planner time the hits saved.
+    """
+
+    def __init__(self, max_size: int = PLAN_CACHE_SIZE, min_similarity: float = PLAN_CACHE_MIN_SIMILARITY):
+        self.max_size = max_size
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._templates: "OrderedDict[str, PlanTemplate]" = OrderedDict()
+        # term -> number of stored questions containing it
+        self._document_frequency: Counter = Counter()
+        self.hits = 0
+        self.misses = 0
+        self.low_confidence = 0
+        self.stored = 0
+        self.invalidated = 0
+        self.planner_seconds = 0.0
+        self.planner_runs = 0
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return " ".join(_words(question))
+
+    def _idf(self, term: str) -> float:
+        # Smoothed, so terms no stored question has get the highest weight
+        return math.log((1 + len(self._templates)) / (1 + self._document_frequency[term])) + 1
+
+    def _vector(self, terms: Counter) -> Dict[str, float]:
+        vector = {term: count * self._idf(term) for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def _nearest(self, question: str) -> List[Tuple[float, PlanTemplate]]:
+        query = self._vector(_terms(question))
+        scored = []
+        for template in self._templates.values():
+            if not query.keys() & template.terms.keys():
+                continue
+            vector = self._vector(template.terms)
+            scored.append((sum(weight * vector.get(term, 0.0) for term, weight in query.items()), template))
+        scored.sort(key=lambda item: -item[0])
+        return scored[:MAX_CANDIDATES]
+
+    def lookup(self, question: str, index: ToolIndex) -> Optional[Tuple[PlanTemplate, List[Task]]]:
+        """A plan for the question from a stored template, or None if the planner should make one."""
+        with self._lock:
+            candidates = self._nearest(question)
+            for similarity, template in candidates:
+                if similarity < self.min_similarity:
+                    break
+                if not template.tools <= index.keys():
+                    continue
+                values = template.slot_values(question)
+                if values is None:
+                    continue
+                tasks = template.instantiate(values, index)
+                if tasks is None:
+                    continue
+                template.hits += 1
+                self.hits += 1
+                self._templates.move_to_end(self._key(template.question))
+                configured_logger.info(
+                    f"Plan cache hit ({similarity:.2f}) for {question!r}: template {template.question!r}"
+                )
+                return template, tasks
+            if candidates and candidates[0][0] < self.min_similarity:
+                self.low_confidence += 1
+            self.misses += 1
+            return None
+
+    def record(self, question: str, tasks: List[Task], planning_seconds: float) -> None:
+        """Store the plan the planner made for the question, which ran without errors."""
+        template = build_template(question, tasks)
+        with self._lock:
+            self.planner_seconds += planning_seconds
+            self.planner_runs += 1
+            # Without literal words it could never be matched (and would match anything)
+            if template is None or not template.terms:
+                return
+            key = self._key(question)
+            if key in self._templates:
+                self._forget(key)
+            self._templates[key] = template
+            self._document_frequency.update(template.terms.keys())
+            self.stored += 1
+            while len(self._templates) > self.max_size:
+                self._forget(next(iter(self._templates)))
+
+    def _forget(self, key: str) -> None:
+        template = self._templates.pop(key)
+        self._document_frequency.subtract(template.terms.keys())
+        self._document_frequency += Counter()
+
+    def invalidate(self, template: PlanTemplate) -> None:
+        """Drop a template whose plan failed when reused."""
+        key = self._key(template.question)
+        with self._lock:
+            if self._templates.get(key) is template:
+                self._forget(key)
+                self.invalidated += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+            self._document_frequency.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            planner_avg = self.planner_seconds / self.planner_runs if self.planner_runs else 0.0
+            return {
+                "enabled": PLAN_CACHE,
+                "size": len(self._templates),
+                "max_size": self.max_size,
+                "templates_with_slots": sum(1 for t in self._templates.values() if t.slot_shapes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "low_confidence": self.low_confidence,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stored": self.stored,
+                "invalidated": self.invalidated,
+                "planner_seconds_avg": planner_avg,
+                # Each hit skipped one planner call of about the average duration
+                "planner_seconds_saved": self.hits * planner_avg,
+            }
+
+
+plan_template_cache = PlanTemplateCache()
+
+
+def observation_failed(message: FunctionMessage) -> bool:
+    """Whether the task raised, or its tool returned an error payload instead of raising."""
+    content = message.content
+    if not isinstance(content, str):
+        return False
+    if content.startswith("ERROR("):
+        return True
+    # dict results are rendered as JSON
+    if content.startswith("{"):
+        try:
+            content = json.loads(content)
+        except ValueError:
+            pass
+    return get_tool_policy(message.name).is_failure(content)
+
+
+def plan_failed(messages: List[BaseMessage]) -> bool:
+    """Whether any task of the plan ended in an error (or was stopped before it ran)."""
+    return any(isinstance(message, FunctionMessage) and observation_failed(message) for message in messages)
+
+
+class _UnjudgedPlan(NamedTuple):
+    question: str
+    template: Optional[PlanTemplate]
+    tasks: List[Task]
+    planning_seconds: float
+
+
+class UnjudgedPlans:
+    """
+    Plans that ran without errors, per conversation, until the joiner says
+    whether they answered the question. Only then is a fresh plan stored, or a
+    reused template that didn't answer it dropped.
+    """
+
+    def __init__(self, cache: PlanTemplateCache, max_size: int = MAX_UNJUDGED_PLANS):
+        self.cache = cache
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._plans: "OrderedDict[Hashable, _UnjudgedPlan]" = OrderedDict()
+
+    def hold(
+            self, conversation: Hashable, question: str, template: Optional[PlanTemplate], tasks: List[Task],
+            planning_seconds: float,
+    ) -> None:
+        with self._lock:
+            self._plans.pop(conversation, None)
+            self._plans[conversation] = _UnjudgedPlan(question, template, tasks, planning_seconds)
+            # Conversations that never reached the joiner
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def judge(self, conversation: Hashable, answered: bool) -> None:
+        with self._lock:
+            plan = self._plans.pop(conversation, None)
+        if plan is not None:
+            self.apply(plan.question, plan.template, plan.tasks, plan.planning_seconds, answered)
+
+    def apply(
+            self, question: str, template: Optional[PlanTemplate], tasks: List[Task], planning_seconds: float,
+            answered: bool,
+    ) -> None:
+        if template is not None:
+            if not answered:
+                self.cache.invalidate(template)
+        elif answered and tasks:
+            self.cache.record(question, tasks, planning_seconds)
+
+
+unjudged_plans = UnjudgedPlans(plan_template_cache)
@@ -1,43 +1,59 @@
 import getpass
 import os
-from typing import Sequence
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Optional, Sequence
 
 from dotenv import load_dotenv
-from langchain import hub
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import (
     FunctionMessage,
     SystemMessage,
 )
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableBranch
+from langchain_core.runnables import Runnable, RunnableBranch
 from langchain_core.tools import BaseTool
 
+from src.assistant.planning.context_window import planner_context
+from src.assistant.planning.json_plan import JSONPlanParser, bind_plan_function
 from src.assistant.planning.output_parser import LLMCompilerPlanParser
+from src.assistant.planning.tool_descriptions import render_tool_descriptions
+from src.logger import configured_logger
 
 load_dotenv()
 
-prompt = hub.pull("wfh/llm-compiler")
+# "text": the planner writes `idx. tool(arg=...)` lines (LLMCompilerPlanParser).
+# "json": the planner submits the plan as a function call whose schema is
+# generated from the tools (JSONPlanParser); use json_planner_prompt with it.
+PLAN_FORMAT = os.getenv("PLAN_FORMAT", "text").lower()
 
 
 def _get_pass(var: str):
-    if var not in os.environ:
-        os.environ[var] = getpass.getpass(f"{var}: ")
+    if var in os.environ:
+        return
+    if sys.stdin is None or not sys.stdin.isatty():
+        # Servers, workers and test runs have nobody to answer a prompt
+        configured_logger.warning(f"{var} is not set")
+        return
+    os.environ[var] = getpass.getpass(f"{var}: ")
 
 
+# Whatever LLM_PROVIDER plans with, agent.py selects tool categories and
+# writes summaries with OpenAI models
 _get_pass("OPENAI_API_KEY")
 
 
 # TODO: convert to planner agent; make planner use tool functions instead of BaseTool
 def create_planner(
-        llm: BaseChatModel, tools: Sequence[BaseTool], base_prompt: ChatPromptTemplate
+        llm: BaseChatModel,
+        tools: Sequence[BaseTool],
+        base_prompt: ChatPromptTemplate,
+        tool_descriptions: Optional[str] = None,
 ):
-    tool_descriptions = "\n".join(
-        f"{i + 1}. {tool.description}\n"
-        for i, tool in enumerate(
-            tools
-        )  # +1 to offset the 0 starting index, we want it count normally from 1.
-    )
+    # Callers may pass their own rendering of the tools, e.g. grouped by category
+    tool_descriptions = tool_descriptions or render_tool_descriptions(tools)
     planner_prompt = base_prompt.partial(
         replan="",
         num_tools=len(tools)
@@ -71,16 +87,78 @@ def create_planner(
         state[-1].content = state[-1].content + f" - Begin counting at : {next_task}"
         return {"messages": state}
 
+    if PLAN_FORMAT == "json":
+        planner_llm, plan_parser = bind_plan_function(llm, tools), JSONPlanParser(tools=tools)
+    else:
+        planner_llm, plan_parser = llm, LLMCompilerPlanParser(tools=tools)
+
     return (
-            RunnableBranch(
+            # Within PLANNER_MESSAGE_TOKENS, however long the thread and its observations
+            planner_context
+            | RunnableBranch(
                 (should_re_plan, wrap_and_get_last_index | re_planner_prompt),
                 wrap_messages | planner_prompt,
             )
-            | llm
-            | LLMCompilerPlanParser(tools=tools)
+            | planner_llm
+            | plan_parser
     )
 
 
 os.getenv("TAVILY_API_KEY")
 
 # planner = create_planner(llm, tools_registry, base_planner_prompt)
+
+
+class PlannerCache:
+    """
+    LRU of compiled planners keyed by the set of tool names they plan over,
+    so a request whose category selection was seen before skips rebuilding
+    the tool descriptions, prompts, branch and parser.
+    """
+
+    def __init__(self, build: Callable[[Sequence[BaseTool]], Runnable], max_size: int = 32):
+        self._build = build
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._planners: "OrderedDict[FrozenSet[str], Runnable]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+
+    def get(self, tools: Sequence[BaseTool]) -> Runnable:
+        key = frozenset(tool.name for tool in tools)
+        with self._lock:
+            planner = self._planners.get(key)
+            if planner is not None:
+                self._planners.move_to_end(key)
+                self.hits += 1
+                return planner
+            self.misses += 1
+        started = time.perf_counter()
+        planner = self._build(tools)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.build_seconds += elapsed
+            # Another request may have built the same planner meanwhile; keep one
+            planner = self._planners.setdefault(key, planner)
+            self._planners.move_to_end(key)
+            if len(self._planners) > self.max_size:
+                self._planners.popitem(last=False)
+        return planner
+
+    def clear(self) -> None:
+        with self._lock:
+            self._planners.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._planners),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "build_seconds_total": self.build_seconds,
+                "build_seconds_avg": self.build_seconds / self.misses if self.misses else 0.0,
+            }
@@ -0,0 +1,72 @@
+"""
+Planner prompt selection. The prompts are versioned in-tree (prompts.py) and
+nothing is fetched at import time. The LangChain Hub prompt can still be used:
+refresh the local copy with
+
+    python -m src.assistant.planning.prompt_cache
+
+and set PLANNER_PROMPT_SOURCE=hub to plan with it.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.load import dumpd, load
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.assistant.planning.prompts import base_planner_prompt
+from src.logger import configured_logger
+from src.utils import get_resource_path
+
+HUB_PROMPT = os.getenv("PLANNER_HUB_PROMPT", "wfh/llm-compiler")
+# "bundled" (default) or "hub", i.e. the locally cached copy of HUB_PROMPT
+PROMPT_SOURCE = os.getenv("PLANNER_PROMPT_SOURCE", "bundled").lower()
+
+
+def _cache_path() -> Path:
+    path = os.getenv("PLANNER_PROMPT_CACHE")
+    return Path(path) if path else get_resource_path("planner_prompt.json")
+
+
+def refresh_hub_prompt(name: str = HUB_PROMPT, path: Optional[Path] = None) -> ChatPromptTemplate:
+    """Pull the prompt from LangChain Hub (needs network) and store it in the local cache file."""
+    # Only a refresh needs the hub client
+    from langchain import hub
+
+    path = path or _cache_path()
+    prompt = hub.pull(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"name": name, "prompt": dumpd(prompt)}))
+    tmp.replace(path)
+    return prompt
+
+
+def load_cached_hub_prompt(path: Optional[Path] = None) -> Optional[ChatPromptTemplate]:
+    path = path or _cache_path()
+    if not path.exists():
+        return None
+    try:
+        return load(json.loads(path.read_text())["prompt"])
+    except (ValueError, KeyError, TypeError) as e:
+        configured_logger.warning(f"Ignoring unreadable planner prompt cache {path}: {e}")
+        return None
+
+
+def planner_base_prompt() -> ChatPromptTemplate:
+    """The text-mode planner prompt: bundled, or the cached hub copy if PLANNER_PROMPT_SOURCE=hub."""
+    if PROMPT_SOURCE == "hub":
+        prompt = load_cached_hub_prompt()
+        if prompt is not None:
+            return prompt
+        configured_logger.warning(
+            f"PLANNER_PROMPT_SOURCE=hub but {_cache_path()} does not exist; using the bundled prompt. "
+            f"Run `python -m src.assistant.planning.prompt_cache` to fetch it."
+        )
+    return base_planner_prompt
+
+
+if __name__ == "__main__":
+    refresh_hub_prompt()
+    print(f"Cached {HUB_PROMPT} in {_cache_path()}")
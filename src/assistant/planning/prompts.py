@@ -1,9 +1,6 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
-base_planner_prompt = ChatPromptTemplate.from_messages([
-    (
-        "system",
-        """
+PLANNER_INSTRUCTIONS = """
      Given a user query, create a plan to solve it with the utmost parallelizability. Each plan should comprise an action from the following {num_tools} types:
 {tool_descriptions}
 {num_tools}. join(): Collects and combines results from prior actions.
@@ -23,6 +20,11 @@ base_planner_prompt = ChatPromptTemplate.from_messages([
  - Only use the provided action types. If a query cannot be addressed using these, invoke the join action for the next steps.
  - Never introduce new actions other than the ones provided.
         """
+
+base_planner_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        PLANNER_INSTRUCTIONS
     ),  # Initial system message
     MessagesPlaceholder(variable_name="messages"),  # Message history
     (
@@ -36,6 +38,25 @@ base_planner_prompt = ChatPromptTemplate.from_messages([
     ),  # Final system message
 ])
 
+# Same instructions, but the plan is submitted as a submit_plan function call
+# (see json_plan) instead of free text
+json_planner_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        PLANNER_INSTRUCTIONS
+    ),  # Initial system message
+    MessagesPlaceholder(variable_name="messages"),  # Message history
+    (
+        "system",
+        """
+        Remember, ONLY respond by calling submit_plan with the task list, in order, ending with a join task. E.g.:
+        {{"tasks": [{{"idx": 1, "tool": "tool_name", "args": {{"arg_name": "value"}}}}, {{"idx": 2, "tool": "join", "args": {{}}}}]}}
+
+        Use the argument names of the tool's signature. To pass the output of an earlier task, use "$idx" as the value.
+        """
+    ),  # Final system message
+])
+
 joiner_prompt = ChatPromptTemplate.from_messages([
     (
         "system",
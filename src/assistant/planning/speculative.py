@@ -0,0 +1,229 @@
+"""
+Speculative planning: plan over the full registry while select_tool_categories
+is still deciding, instead of after it.
+
+When the categories arrive, the speculative plan is kept if every task it has
+emitted so far uses a tool in the selected categories; its later tasks are
+checked as they stream. Otherwise it is cancelled and the planner runs again
+over the filtered tools, as it would without speculation; the same happens if
+the first task arrives late and is outside the categories, or the speculative
+planner fails before any task was dispatched. A task outside the categories
+(or a planner failure) after tasks were dispatched ends the plan there, since a
+fresh plan would number its tasks from 1 again; the joiner then sees the
+results so far and replans if they aren't enough.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set
+
+from langchain_core.runnables import Runnable
+
+from src.assistant.planning.output_parser import Task
+from src.logger import configured_logger
+
+SPECULATIVE_PLANNING = os.getenv("SPECULATIVE_PLANNING", "false").lower() == "true"
+
+# Kept whole, cancelled when the categories arrived, cut short by a later
+# task outside the categories, or the speculative planner failed
+OUTCOMES = ("kept", "discarded", "cut_short", "failed")
+
+_DONE = object()
+
+
+def _allowed(task: Task, tool_names: Set[str]) -> bool:
+    return isinstance(task["tool"], str) or task["tool"].name in tool_names
+
+
+class SpeculationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = {outcome: 0 for outcome in OUTCOMES}
+        # Category selection time the planner overlapped with, on kept plans
+        self.overlapped_seconds = 0.0
+
+    def record(self, outcome: str, overlapped: float = 0.0) -> None:
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if outcome == "kept":
+                self.overlapped_seconds += overlapped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.outcomes.values())
+            return {
+                "enabled": SPECULATIVE_PLANNING,
+                "speculations": total,
+                **self.outcomes,
+                "win_rate": self.outcomes["kept"] / total if total else 0.0,
+                "overlapped_seconds": self.overlapped_seconds,
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+class _Speculation(ABC):
+    """What the sync and async variants share: draining and checking what arrived so far."""
+
+    _queue: Any
+    _empty: type
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._finished = False
+
+    @abstractmethod
+    def cancel(self) -> None:
+        """Stop the speculative planner."""
+
+    def _take_buffered(self, tool_names: Set[str]) -> Optional[List[Task]]:
+        buffered = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except self._empty:
+                return buffered
+            if item is _DONE:
+                self._finished = True
+                return buffered
+            if isinstance(item, Exception):
+                configured_logger.warning(f"Speculative planner failed: {item!r}")
+                speculation_stats.record("failed")
+                return None
+            if not _allowed(item, tool_names):
+                self.cancel()
+                speculation_stats.record("discarded")
+                return None
+            buffered.append(item)
+
+    def _late(self, item: Any, tool_names: Set[str], dispatched: int) -> Optional[str]:
+        """None if the plan goes on with this item, else the outcome that ended it."""
+        if isinstance(item, Exception):
+            configured_logger.warning(f"Speculative planner failed after {dispatched} tasks: {item!r}")
+            outcome = "failed"
+        elif _allowed(item, tool_names):
+            return None
+        elif dispatched:
+            configured_logger.info(
+                f"Speculative plan cut short at task {item['idx']}: {item['tool'].name} is outside the selected categories"
+            )
+            outcome = "cut_short"
+        else:
+            outcome = "discarded"
+        self.cancel()
+        speculation_stats.record(outcome)
+        return outcome
+
+
+class SpeculativePlan(_Speculation):
+    """Streams a plan on a background thread while the categories are being chosen."""
+
+    _empty = queue.Empty
+
+    def __init__(self, planner: Runnable, messages: List[Any]):
+        super().__init__()
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        threading.Thread(
+            target=self._produce, args=(planner, messages), daemon=True, name="speculative-planner"
+        ).start()
+
+    def _produce(self, planner: Runnable, messages: List[Any]):
+        stream = planner.stream(messages)
+        try:
+            for task in stream:
+                if self._cancelled.is_set():
+                    break
+                self._queue.put(task)
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            # Stops the LLM stream if we left early
+            stream.close()
+            self._queue.put(_DONE)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def adopt(self, tool_names: Set[str], fallback: Callable[[], Iterator[Task]]) -> Iterator[Task]:
+        """
+        The plan's tasks if it only uses the given tools, else the tasks of
+        fallback (the planner over those tools) and the speculation is cancelled.
+        """
+        overlapped = time.perf_counter() - self.started
+        buffered = self._take_buffered(tool_names)
+        if buffered is None:
+            return fallback()
+        return self._follow(buffered, tool_names, fallback, overlapped)
+
+    def _follow(
+            self, buffered: List[Task], tool_names: Set[str], fallback: Callable[[], Iterator[Task]], overlapped: float
+    ) -> Iterator[Task]:
+        yield from buffered
+        dispatched = len(buffered)
+        while not self._finished:
+            item = self._queue.get()
+            if item is _DONE:
+                break
+            if self._late(item, tool_names, dispatched):
+                if not dispatched:
+                    # Nothing ran yet, so the filtered planner can start over
+                    yield from fallback()
+                return
+            yield item
+            dispatched += 1
+        speculation_stats.record("kept", overlapped)
+
+
+class AsyncSpeculativePlan(_Speculation):
+    """The asyncio variant: the plan streams in a task on the running loop."""
+
+    _empty = asyncio.QueueEmpty
+
+    def __init__(self, planner: Runnable, messages: List[Any]):
+        super().__init__()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._produce(planner, messages))
+
+    async def _produce(self, planner: Runnable, messages: List[Any]):
+        try:
+            async for task in planner.astream(messages):
+                self._queue.put_nowait(task)
+        except Exception as e:
+            self._queue.put_nowait(e)
+        finally:
+            self._queue.put_nowait(_DONE)
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+    def adopt(self, tool_names: Set[str], fallback: Callable[[], AsyncIterator[Task]]) -> AsyncIterator[Task]:
+        overlapped = time.perf_counter() - self.started
+        buffered = self._take_buffered(tool_names)
+        if buffered is None:
+            return fallback()
+        return self._follow(buffered, tool_names, fallback, overlapped)
+
+    async def _follow(
+            self, buffered: List[Task], tool_names: Set[str], fallback: Callable[[], AsyncIterator[Task]],
+            overlapped: float,
+    ) -> AsyncIterator[Task]:
+        for task in buffered:
+            yield task
+        dispatched = len(buffered)
+        while not self._finished:
+            item = await self._queue.get()
+            if item is _DONE:
+                break
+            if self._late(item, tool_names, dispatched):
+                if not dispatched:
+                    async for task in fallback():
+                        yield task
+                return
+            yield item
+            dispatched += 1
+        speculation_stats.record("kept", overlapped)
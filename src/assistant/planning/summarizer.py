@@ -0,0 +1,209 @@
+"""
+Conversation summarization, off the critical path.
+
+Once a thread's messages pass SUMMARIZE_AFTER_TOKENS, the older turns are
+folded into a summary after the answer has been returned: a background
+worker asks a cheaper model for the summary and writes it back to the
+thread through the checkpointer. The summary replaces the first folded
+message in place (a SystemMessage named "conversation_summary"), the rest of
+them are removed, and the recent turns stay verbatim, so the planner keeps
+seeing roughly the same number of tokens however long the conversation gets.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Set, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    FunctionMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
+
+from src.assistant.planning.token_count import message_tokens
+from src.logger import configured_logger
+
+# 0 disables summarization
+SUMMARIZE_AFTER_TOKENS = int(os.getenv("SUMMARIZE_AFTER_TOKENS", "4000"))
+# Recent turns kept verbatim, up to this many tokens; the last turn always is
+SUMMARY_KEEP_RECENT_TOKENS = int(os.getenv("SUMMARY_KEEP_RECENT_TOKENS", "1500"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+# Longer tool outputs are cut in the transcript the summarizer reads
+TRANSCRIPT_OBSERVATION_CHARS = 1500
+SUMMARY_NAME = "conversation_summary"
+
+
+def _content(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+def messages_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+def is_summary(message: BaseMessage) -> bool:
+    return isinstance(message, SystemMessage) and message.name == SUMMARY_NAME
+
+
+def split_for_summary(
+        messages: Sequence[BaseMessage], keep_tokens: int = SUMMARY_KEEP_RECENT_TOKENS
+) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """
+    (messages to fold into the summary, messages to keep). The cut is always
+    right before a question, so a turn is never split, and the last turn is
+    always kept.
+    """
+    cut, kept_tokens = len(messages), 0
+    for i in range(len(messages) - 1, -1, -1):
+        kept_tokens += message_tokens(messages[i])
+        if isinstance(messages[i], HumanMessage):
+            if cut < len(messages) and kept_tokens > keep_tokens:
+                break
+            cut = i
+    folded = list(messages[:cut])
+    # A previous summary on its own has nothing new to fold in
+    if all(is_summary(message) for message in folded):
+        return [], list(messages)
+    return folded, list(messages[cut:])
+
+
+def transcript(messages: Sequence[BaseMessage]) -> str:
+    """The folded messages as plain text for the summarizer, with long tool outputs cut."""
+    lines = []
+    for message in messages:
+        text = _content(message)
+        if isinstance(message, HumanMessage):
+            lines.append(f"User: {text}")
+        elif isinstance(message, FunctionMessage):
+            if len(text) > TRANSCRIPT_OBSERVATION_CHARS:
+                text = text[:TRANSCRIPT_OBSERVATION_CHARS] + " ..."
+            lines.append(f"Tool {message.name} (task {message.additional_kwargs.get('idx')}): {text}")
+        elif isinstance(message, AIMessage):
+            lines.append(f"Assistant: {text}")
+        elif not is_summary(message):
+            lines.append(f"System: {text}")
+    return "\n".join(lines)
+
+
+def summary_update(folded: Sequence[BaseMessage], summary: str) -> Dict[str, Any]:
+    """
+    State update that puts the summary where the first folded message was and
+    removes the rest. Only ids are used, so it still applies if the thread got
+    new messages while the summary was being written.
+    """
+    summary_message = SystemMessage(
+        content=f"Summary of the conversation so far: {summary}", name=SUMMARY_NAME, id=folded[0].id
+    )
+    return {"summary": summary, "messages": [summary_message] + [RemoveMessage(id=m.id) for m in folded[1:]]}
+
+
+class _ThreadLock:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Holding or waiting for it; the lock is dropped when nobody is
+        self.users = 0
+
+
+class BackgroundSummarizer:
+    """
+    Runs summaries on a small pool of workers, at most one per thread at a time.
+    Turns and summary write-backs of the same thread are serialized, so a
+    summary is never written into the middle of a turn (the turn's next
+    checkpoint would drop it).
+    """
+
+    def __init__(self, workers: int = SUMMARY_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarizer")
+        self._lock = threading.Lock()
+        self._thread_locks: Dict[Hashable, _ThreadLock] = {}
+        self._pending: Set[Hashable] = set()
+        self.runs = 0
+        self.failures = 0
+        self.seconds = 0.0
+
+    def _use_lock(self, thread_id: Hashable) -> threading.Lock:
+        with self._lock:
+            thread_lock = self._thread_locks.get(thread_id)
+            if thread_lock is None:
+                thread_lock = self._thread_locks[thread_id] = _ThreadLock()
+            thread_lock.users += 1
+            return thread_lock.lock
+
+    def _release_lock(self, thread_id: Hashable) -> None:
+        with self._lock:
+            thread_lock = self._thread_locks[thread_id]
+            thread_lock.lock.release()
+            thread_lock.users -= 1
+            if not thread_lock.users:
+                del self._thread_locks[thread_id]
+
+    @contextmanager
+    def holding(self, thread_id: Hashable):
+        """Held for a whole turn, and while a summary is written back."""
+        self._use_lock(thread_id).acquire()
+        try:
+            yield
+        finally:
+            self._release_lock(thread_id)
+
+    @asynccontextmanager
+    async def aholding(self, thread_id: Hashable):
+        lock = self._use_lock(thread_id)
+        # Waiting on a worker thread keeps the event loop free
+        acquired = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+        try:
+            await asyncio.shield(acquired)
+        except BaseException:
+            # Cancelled while waiting: the worker still gets the lock, so hand it back then
+            acquired.add_done_callback(lambda _: self._release_lock(thread_id))
+            raise
+        try:
+            yield
+        finally:
+            self._release_lock(thread_id)
+
+    def submit(self, thread_id: Hashable, summarize: Callable[[], bool]) -> bool:
+        """
+        Run summarize() in the background unless the thread already has a
+        summary on the way. summarize returns whether it wrote one.
+        """
+        with self._lock:
+            if thread_id in self._pending:
+                return False
+            self._pending.add(thread_id)
+        self._executor.submit(self._run, thread_id, summarize)
+        return True
+
+    def _run(self, thread_id: Hashable, summarize: Callable[[], bool]) -> None:
+        started = time.perf_counter()
+        try:
+            if summarize():
+                with self._lock:
+                    self.runs += 1
+                    self.seconds += time.perf_counter() - started
+        except Exception as e:
+            configured_logger.warning(f"Summarizing thread {thread_id} failed: {e!r}")
+            with self._lock:
+                self.failures += 1
+        finally:
+            with self._lock:
+                self._pending.discard(thread_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "summarize_after_tokens": SUMMARIZE_AFTER_TOKENS,
+                "summaries": self.runs,
+                "failures": self.failures,
+                "pending": len(self._pending),
+                "mean_seconds": self.seconds / self.runs if self.runs else 0.0,
+            }
+
+
+background_summarizer = BackgroundSummarizer()
@@ -1,95 +1,312 @@
+import asyncio
+import os
 import re
 import time
-from concurrent.futures import ThreadPoolExecutor, wait
-from typing import Any, Dict, Iterable, List, Union
+import traceback
+from concurrent.futures import Future
+from typing import Any, AsyncIterable, Callable, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
-from langchain_core.messages import BaseMessage, FunctionMessage
+from langchain_core.messages import AIMessage, BaseMessage, FunctionMessage, HumanMessage
 from langchain_core.runnables import (
+    RunnableConfig,
+    RunnableLambda,
     chain as as_runnable,
 )
+from langchain_core.tools import BaseTool, StructuredTool
 from typing_extensions import TypedDict
 
+from src.assistant.planning.dag_executor import AsyncDAGExecutor, DAGExecutor, TaskFailed, TaskRequeued
+from src.assistant.planning.deadlines import ToolCancelled, ToolTimeout, acall_with_deadline, call_with_deadline
+from src.assistant.planning.instrumentation import PlanExecutionTimeline
+from src.assistant.planning.joiner import ajoin_early, join_early
+from src.assistant.planning.latency_model import tool_latency_model
+from src.assistant.planning.observation_memo import observation_memo
+from src.assistant.planning.observation_store import ObservationStore, render_observation
 from src.assistant.planning.output_parser import Task
-from src.assistant.planning.planner import create_planner
-from src.assistant.planning.prompts import base_planner_prompt
-from src.assistant.tools.tool_categories import filter_tools_by_category
+from src.assistant.planning.plan_templates import PLAN_CACHE, plan_failed, plan_template_cache, unjudged_plans
+from src.assistant.planning.planner import PLAN_FORMAT, PlannerCache, create_planner
+from src.assistant.planning.prompt_cache import planner_base_prompt
+from src.assistant.planning.prompts import json_planner_prompt
+from src.assistant.planning.speculative import AsyncSpeculativePlan, SpeculativePlan
+from src.assistant.planning.tool_executor import get_tool_executor
+from src.assistant.planning.tool_descriptions import render_categorized_tool_descriptions
+from src.assistant.planning.tool_index import json_type, tool_index, tool_spec
+from src.assistant.planning.tool_policies import get_tool_policy
+from src.assistant.planning.tool_throttle import tool_throttle
+from src.assistant.tools.tool_categories import filter_tools_by_category, tool_categories
+from src.assistant.tools.rate_limit import RateLimited, as_rate_limited
 from src.assistant.tools.tool_registry import tools_registry
+from src.logger import configured_logger
+
+# "streaming" hands every ready task to the pool so the thread consuming the
+# planner stream never runs a tool itself; "inline" runs ready tasks on the
+# planner thread (the original behaviour).
+DISPATCH_MODE = os.getenv("SCHEDULER_DISPATCH_MODE", "streaming").lower()
+
+# Hedge only once the latency model has seen enough calls for a stable p95
+MIN_HEDGE_SAMPLES = 20
+
+# Incremental join: offer results to the joiner while slow tasks still run and
+# stop the plan if it can already answer. Only worth an extra joiner call when
+# the tasks still running are expected to take at least this many seconds.
+INCREMENTAL_JOIN = os.getenv("INCREMENTAL_JOIN", "false").lower() == "true"
+INCREMENTAL_JOIN_MIN_SAVING = float(os.getenv("INCREMENTAL_JOIN_MIN_SAVING", "3"))
+
+# "separate": select_tool_categories picks the categories with its own LLM call
+# (or the local classifier) and the planner only sees their tools.
+# "planner": no separate call; the planner sees every tool, grouped under
+# one-line category summaries, and picks categories by choosing actions.
+CATEGORY_SELECTION = os.getenv("CATEGORY_SELECTION", "separate").lower()
 
 
 def _get_observations(messages: List[BaseMessage]) -> Dict[int, Any]:
-    # Get all previous tool responses
+    # Get the tool responses of the current question; with a checkpointer the
+    # thread also holds earlier questions, whose task idx start at 1 again
     results = {}
     for message in messages[::-1]:
+        if isinstance(message, HumanMessage):
+            break
         if isinstance(message, FunctionMessage):
             results[int(message.additional_kwargs["idx"])] = message.content
     return results
 
 
-class SchedulerInput(TypedDict):
+class SchedulerInput(TypedDict, total=False):
     messages: List[BaseMessage]
-    tasks: Iterable[Task]
+    # An async iterable when passed to aschedule_tasks
+    tasks: Union[Iterable[Task], AsyncIterable[Task]]
+    timeline: PlanExecutionTimeline
+    join_early: bool
+    # Scope for reusing results of identical calls across replans
+    conversation: Hashable
+
+
+def _resolve_task_args(task: Task, observations: Mapping[int, Any]):
+    args = task["args"]
+    if isinstance(args, str):
+        return _resolve_arg(args, observations)
+    elif isinstance(args, dict):
+        spec = tool_spec(task["tool"]) if isinstance(task["tool"], BaseTool) else None
+        if spec is None:
+            return {key: _resolve_arg(val, observations) for key, val in args.items()}
+        return {
+            key: _resolve_arg(val, observations, spec.arg_types.get(key), spec.arg_schemas.get(key))
+            for key, val in args.items()
+        }
+    else:
+        # This will likely fail
+        return args
+
+
+def _resolution_error(tool: BaseTool, args: Any, e: Exception) -> str:
+    return (
+        f"ERROR(Failed to call {tool.name} with args {args}.)"
+        f" Args could not be resolved. Error: {repr(e)}"
+    )
+
+
+def _invocation_error(tool: BaseTool, args: Any, resolved_args: Any, e: Exception) -> str:
+    return (
+            f"ERROR(Failed to call {tool.name} with args {args}."
+            + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+    )
+
+
+def _timeout_error(tool: BaseTool, args: Any, timeout: float) -> str:
+    return f"ERROR(Failed to call {tool.name} with args {args}: no result after {timeout}s.)"
+
+
+def _stopped_error(idx: int) -> str:
+    return f"ERROR(Task {idx} was stopped: the question was answered without it.)"
+
+
+def _cancelled_error(idx: int, failed_dep: int) -> str:
+    return f"ERROR(Task {idx} was cancelled: its dependency {failed_dep} failed.)"
+
+
+def _hedge_after(name: str):
+    """p95 latency of the tool if it is configured for hedging and we have enough samples."""
+    if not get_tool_policy(name).hedge or tool_latency_model.count(name) < MIN_HEDGE_SAMPLES:
+        return None
+    return tool_latency_model.percentile(name, 0.95)
+
 
+def _hedge(name: str, call):
+    # The duplicate call takes its own throttle slot so hedging never pushes a
+    # provider past its limit; skip the hedge if no slot is free right now.
+    if not tool_throttle.try_acquire(name):
+        return None
+    configured_logger.info(f"Hedging slow call to {name}")
 
-def _execute_task(task, observations, config):
+    def hedged():
+        rate_limited = None
+        try:
+            return call()
+        except Exception as e:
+            rate_limited = as_rate_limited(e)
+            raise
+        finally:
+            tool_throttle.release(name, rate_limited)
+
+    return hedged
+
+
+def _ahedge(name: str, make_call):
+    if not tool_throttle.try_acquire(name):
+        return None
+    configured_logger.info(f"Hedging slow call to {name}")
+
+    async def hedged():
+        rate_limited = None
+        try:
+            return await make_call()
+        except Exception as e:
+            rate_limited = as_rate_limited(e)
+            raise
+        finally:
+            tool_throttle.release(name, rate_limited)
+
+    return hedged
+
+
+def _execute_task(task, observations, config, stop: Optional[Future] = None, conversation: Hashable = None):
     tool_to_use = task["tool"]
     if isinstance(tool_to_use, str):
         return tool_to_use
-    args = task["args"]
     try:
-        if isinstance(args, str):
-            resolved_args = _resolve_arg(args, observations)
-        elif isinstance(args, dict):
-            resolved_args = {
-                key: _resolve_arg(val, observations) for key, val in args.items()
-            }
-        else:
-            # This will likely fail
-            resolved_args = args
+        resolved_args = _resolve_task_args(task, observations)
     except Exception as e:
-        return (
-            f"ERROR(Failed to call {tool_to_use.name} with args {args}.)"
-            f" Args could not be resolved. Error: {repr(e)}"
+        raise TaskFailed(_resolution_error(tool_to_use, task["args"], e)) from e
+    policy = get_tool_policy(tool_to_use.name)
+
+    def call():
+        return tool_to_use.invoke(resolved_args, config)
+
+    try:
+        result = call_with_deadline(
+            call, policy.timeout, _hedge_after(tool_to_use.name), lambda: _hedge(tool_to_use.name, call), stop
         )
+    except ToolCancelled as e:
+        raise TaskFailed(_stopped_error(task["idx"])) from e
+    except ToolTimeout as e:
+        raise TaskFailed(_timeout_error(tool_to_use, task["args"], policy.timeout)) from e
+    except Exception as e:
+        if rate_limited := as_rate_limited(e):
+            # Let the scheduler re-queue the call instead of failing it
+            raise rate_limited from e
+        raise TaskFailed(_invocation_error(tool_to_use, task["args"], resolved_args, e)) from e
+    observation_memo.remember(conversation, tool_to_use.name, resolved_args, result)
+    return result
+
+
+def _recall(task: Task, observations: Mapping[int, Any], conversation: Hashable) -> Tuple[bool, Any]:
+    """The result of an identical earlier call in this conversation, if the tool is memoized."""
+    tool_to_use = task["tool"]
+    if conversation is None or isinstance(tool_to_use, str) or not observation_memo.memoizes(tool_to_use.name):
+        return False, None
     try:
-        return tool_to_use.invoke(resolved_args, config)
+        resolved_args = _resolve_task_args(task, observations)
+    except Exception:
+        return False, None
+    return observation_memo.recall(conversation, tool_to_use.name, resolved_args)
+
+
+def _has_native_async(tool: BaseTool) -> bool:
+    if isinstance(tool, StructuredTool):
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
+
+async def _aexecute_task(task, observations, config, conversation: Hashable = None):
+    tool_to_use = task["tool"]
+    if isinstance(tool_to_use, str):
+        return tool_to_use
+    try:
+        resolved_args = _resolve_task_args(task, observations)
     except Exception as e:
-        return (
-                f"ERROR(Failed to call {tool_to_use.name} with args {args}."
-                + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+        raise TaskFailed(_resolution_error(tool_to_use, task["args"], e)) from e
+    policy = get_tool_policy(tool_to_use.name)
+
+    def make_call():
+        if _has_native_async(tool_to_use):
+            return tool_to_use.ainvoke(resolved_args, config)
+        # Sync-only tools go to the shared bounded pool rather than the event
+        # loop's default executor, so thread usage stays bounded no matter how
+        # many sessions share the loop.
+        return get_tool_executor().arun(tool_to_use.invoke, resolved_args, config)
+
+    try:
+        result = await acall_with_deadline(
+            make_call, policy.timeout, _hedge_after(tool_to_use.name), lambda: _ahedge(tool_to_use.name, make_call)
         )
+    except ToolTimeout as e:
+        raise TaskFailed(_timeout_error(tool_to_use, task["args"], policy.timeout)) from e
+    except Exception as e:
+        if rate_limited := as_rate_limited(e):
+            raise rate_limited from e
+        raise TaskFailed(_invocation_error(tool_to_use, task["args"], resolved_args, e)) from e
+    observation_memo.remember(conversation, tool_to_use.name, resolved_args, result)
+    return result
+
 
+# $1 or ${1} -> 1
+ID_PATTERN = re.compile(r"\$\{?(\d+)\}?")
 
-def _resolve_arg(arg: Union[str, Any], observations: Dict[int, Any]):
-    # $1 or ${1} -> 1
-    id_pattern = r"\$\{?(\d+)\}?"
 
-    def replace_match(match):
-        # If the string is ${123}, match.group(0) is ${123}, and match.group(1) is 123.
-        idx = int(match.group(1))
-        return observations.get(idx, match.group(0))
+def _parse_number(text: str) -> Any:
+    # Results of earlier plans come back as text; give numbers their type back
+    try:
+        return float(text) if "." in text else int(text)
+    except ValueError:
+        return text
+
+
+def _nested(schema: Optional[Mapping], key: Optional[str] = None) -> Tuple[str, Optional[Mapping]]:
+    # Type and schema of a list item (key None) or a dict value inside an arg.
+    # Results go in as text unless the schema says the items are something else,
+    # e.g. math's context: List[str]
+    for option in [schema, *schema.get("anyOf", ())] if schema else ():
+        if key is None:
+            item = option.get("items")
+        else:
+            item = option.get("properties", {}).get(key) or option.get("additionalProperties")
+        if isinstance(item, Mapping):
+            return json_type(item) or "string", item
+    return "string", None
+
 
+def _resolve_arg(
+        arg: Union[str, Any], observations: Mapping[int, Any], arg_type: Optional[str] = None,
+        schema: Optional[Mapping] = None,
+):
     # For dependencies on other tasks
     if isinstance(arg, str):
-        # Check if the argument is a reference to a previous observation (e.g., "$1")
-        if re.match(id_pattern, arg):
-            resolved_value = re.sub(id_pattern, replace_match, arg)
-            # Try to convert the resolved value to the appropriate type
-            try:
-                # Check if the resolved value is a number
-                if "." in resolved_value:
-                    return float(resolved_value)  # Convert to float
-                else:
-                    return int(resolved_value)  # Convert to int
-            except (ValueError, TypeError):
-                # If conversion fails, return the resolved value as-is
-                return resolved_value
-        else:
-            # If it's not a reference, return the argument as-is
-            return arg
+        reference = ID_PATTERN.fullmatch(arg)
+        if reference:
+            # The whole argument is a reference: pass the result itself on,
+            # as text if the tool declares a string argument
+            idx = int(reference.group(1))
+            if idx not in observations:
+                return arg
+            value = observations[idx]
+            if arg_type == "string":
+                return render_observation(value)
+            if isinstance(value, str) and arg_type in (None, "integer", "number"):
+                return _parse_number(value)
+            return value
+        if "$" in arg:
+            # References inside a longer string are replaced with their text
+            return ID_PATTERN.sub(
+                lambda match: render_observation(observations[int(match.group(1))])
+                if int(match.group(1)) in observations else match.group(0),
+                arg,
+            )
+        # If it's not a reference, return the argument as-is
+        return arg
     elif isinstance(arg, list):
-        return [_resolve_arg(a, observations) for a in arg]
+        return [_resolve_arg(a, observations, *_nested(schema)) for a in arg]
     elif isinstance(arg, dict):
-        return {key: _resolve_arg(val, observations) for key, val in arg.items()}
+        return {key: _resolve_arg(val, observations, *_nested(schema, key)) for key, val in arg.items()}
     else:
         # For non-string arguments, return them as-is
         return arg
@@ -98,31 +315,164 @@ def _resolve_arg(arg: Union[str, Any], observations: Dict[int, Any]):
 @as_runnable
 def schedule_task(task_inputs, config):
     task: Task = task_inputs["task"]
-    observations: Dict[int, Any] = task_inputs["observations"]
+    observations: ObservationStore = task_inputs["observations"]
     try:
-        observation = _execute_task(task, observations, config)
-    except Exception:
-        import traceback
+        observation = _execute_task(
+            task, observations, config, task_inputs.get("stop"), task_inputs.get("conversation")
+        )
+    except RateLimited:
+        raise
+    except TaskFailed as e:
+        observations[task["idx"]] = str(e)
+        raise
+    except Exception as e:
+        observations[task["idx"]] = traceback.format_exc()
+        raise TaskFailed() from e
+    observations[task["idx"]] = observation
 
-        observation = traceback.format_exception()  # repr(e) +
+
+async def aschedule_task(task: Task, observations: ObservationStore, config=None, conversation: Hashable = None):
+    try:
+        observation = await _aexecute_task(task, observations, config, conversation)
+    except RateLimited:
+        raise
+    except TaskFailed as e:
+        observations[task["idx"]] = str(e)
+        raise
+    except Exception as e:
+        observations[task["idx"]] = traceback.format_exc()
+        raise TaskFailed() from e
     observations[task["idx"]] = observation
 
 
-def schedule_pending_task(
-        task: Task, observations: Dict[int, Any], retry_after: float = 0.2
-):
-    while True:
-        deps = task["dependencies"]
-        if deps and (any([dep not in observations for dep in deps])):
-            # Dependencies not yet satisfied
-            time.sleep(retry_after)
+def _record_unresolvable(unresolvable: List[Task], observations: ObservationStore):
+    # Anything still parked depends on an index the planner never emitted
+    # (directly or transitively); report it instead of waiting forever.
+    missing = {
+        task["idx"]: sorted(dep for dep in task["dependencies"] if dep not in observations)
+        for task in unresolvable
+    }
+    for idx, deps in missing.items():
+        observations[idx] = (
+            f"ERROR(Task {idx} was never run: its dependencies {deps}"
+            " never produced a result.)"
+        )
+
+
+def _to_function_messages(
+        observations: Mapping[int, Any], originals, task_names, args_for_tasks
+) -> List[FunctionMessage]:
+    # Convert observations to new tool messages to add to the state
+    new_observations = {
+        k: (task_names[k], args_for_tasks[k], observations[k])
+        for k in sorted(observations.keys() - originals)
+    }
+    return [
+        FunctionMessage(
+            name=name,
+            content=render_observation(obs),
+            additional_kwargs={"idx": k, "args": task_args},
+            tool_call_id=k,
+        )
+        for k, (name, task_args, obs) in new_observations.items()
+    ]
+
+
+def _cancel_task(observations: ObservationStore):
+    def cancel(task: Task, failed_dep: int):
+        # join is not a real call; it still runs so the joiner sees the errors
+        if isinstance(task["tool"], str):
+            observations[task["idx"]] = task["tool"]
+        else:
+            observations[task["idx"]] = _cancelled_error(task["idx"], failed_dep)
+
+    return cancel
+
+
+def _pending_tool_tasks(observations: Mapping[int, Any], task_names: Dict[int, str]) -> List[str]:
+    return [f"{idx} ({name})" for idx, name in task_names.items() if idx not in observations and name != "join"]
+
+
+def _worth_joining_early(observations: Mapping[int, Any], task_names: Dict[int, str], attempted) -> bool:
+    # Something new to look at, and enough expected waiting left to save
+    pending = [name for idx, name in task_names.items() if idx not in observations and name != "join"]
+    if not pending or observations.keys() <= attempted:
+        return False
+    return max(tool_latency_model.estimate(name) for name in pending) >= INCREMENTAL_JOIN_MIN_SAVING
+
+
+def _answered_early(
+        observations: Mapping[int, Any], originals, task_names, args_for_tasks, joined: dict
+) -> List[BaseMessage]:
+    for idx, name in task_names.items():
+        if idx not in observations:
+            observations[idx] = name if name == "join" else _stopped_error(idx)
+    return _to_function_messages(observations, originals, task_names, args_for_tasks) + joined["messages"]
+
+
+def _join_while_running(dag: DAGExecutor, messages, observations, originals, task_names, args_for_tasks):
+    """
+    After every completed task, offer the results so far to the joiner while
+    slow tasks are still running. Returns the final messages if it could
+    already answer, or None to wait for the plan and join as usual.
+    """
+    finished, attempted = 0, originals
+    while (finished := dag.wait_for_progress(finished)) is not None:
+        snapshot = observations.snapshot()
+        if not _worth_joining_early(snapshot, task_names, attempted):
+            continue
+        attempted = snapshot.keys()
+        joined = join_early(
+            messages + _to_function_messages(snapshot, originals, task_names, args_for_tasks),
+            _pending_tool_tasks(snapshot, task_names),
+        )
+        if joined is not None:
+            return _answered_early(snapshot, originals, task_names, args_for_tasks, joined)
+    return None
+
+
+async def _ajoin_while_running(dag: AsyncDAGExecutor, messages, observations, originals, task_names, args_for_tasks):
+    finished, attempted = 0, originals
+    while (finished := await dag.wait_for_progress(finished)) is not None:
+        snapshot = observations.snapshot()
+        if not _worth_joining_early(snapshot, task_names, attempted):
             continue
-        schedule_task.invoke({"task": task, "observations": observations})
-        break
+        attempted = snapshot.keys()
+        joined = await ajoin_early(
+            messages + _to_function_messages(snapshot, originals, task_names, args_for_tasks),
+            _pending_tool_tasks(snapshot, task_names),
+        )
+        if joined is not None:
+            return _answered_early(snapshot, originals, task_names, args_for_tasks, joined)
+    return None
+
+
+def _task_name(task: Task) -> str:
+    return task["tool"] if isinstance(task["tool"], str) else task["tool"].name
+
+
+def _rate_limit_error(name: str, attempts: int) -> str:
+    return f"ERROR(Failed to call {name}: still rate limited by the provider after {attempts} attempts.)"
+
+
+def _record_latency(name: str, started: float) -> None:
+    # join is not a real tool call and would skew the estimates
+    if name != "join":
+        tool_latency_model.record(name, time.perf_counter() - started)
+
+
+def _estimate_task(task: Task) -> float:
+    return tool_latency_model.estimate(_task_name(task))
+
+
+def _admit_task(task: Task, on_ready) -> bool:
+    # Per-tool token bucket and concurrency limit; throttled tasks are queued
+    # inside the throttle rather than on a pool thread.
+    return tool_throttle.acquire_or_wait(_task_name(task), on_ready)
 
 
 @as_runnable
-def schedule_tasks(scheduler_input: SchedulerInput) -> List[FunctionMessage]:
+def schedule_tasks(scheduler_input: SchedulerInput) -> List[BaseMessage]:
     """Group the tasks into a DAG schedule."""
     # For streaming, we are making a few simplifying assumption:
     # 1. The LLM does not create cyclic dependencies
@@ -135,92 +485,392 @@ def schedule_tasks(scheduler_input: SchedulerInput) -> List[FunctionMessage]:
     messages = scheduler_input["messages"]
     # If we are re-planning, we may have calls that depend on previous
     # plans. Start with those.
-    observations = _get_observations(messages)
+    observations = ObservationStore(_get_observations(messages))
     task_names = {}
     originals = set(observations)
     # ^^ We assume each task inserts a different key above to
     # avoid race conditions...
-    futures = []
-    retry_after = 0.25  # Retry every quarter second
-    with ThreadPoolExecutor() as executor:
-        for task in tasks:
-            deps = task["dependencies"]
-            task_names[task["idx"]] = (
-                task["tool"] if isinstance(task["tool"], str) else task["tool"].name
+    timeline = scheduler_input.get("timeline") or PlanExecutionTimeline()
+    run_inline = DISPATCH_MODE == "inline"
+    # Resolved to abandon in-flight tool calls when the plan is stopped early
+    stop = Future()
+    conversation = scheduler_input.get("conversation")
+    # idx -> result reused from an identical call earlier in the conversation
+    memoized = {}
+
+    def admit(task: Task, on_ready) -> bool:
+        timeline.task_ready(task["idx"])
+        # A memoized call needs neither the provider nor a throttle slot
+        hit, result = _recall(task, observations, conversation)
+        if hit:
+            memoized[task["idx"]] = result
+            return True
+        return _admit_task(task, on_ready)
+
+    attempts = {}
+
+    def run_task(task: Task):
+        if task["idx"] in memoized:
+            observations[task["idx"]] = memoized[task["idx"]]
+            timeline.task_finished(task["idx"], memoized[task["idx"]])
+            return
+        name = _task_name(task)
+        rate_limited = None
+        timeline.task_started(task["idx"])
+        started = time.perf_counter()
+        try:
+            schedule_task.invoke(
+                dict(task=task, observations=observations, stop=stop, conversation=conversation)
             )
-            args_for_tasks[task["idx"]] = task["args"]
-            if (
-                    # Depends on other tasks
-                    deps
-                    and (any([dep not in observations for dep in deps]))
-            ):
-                futures.append(
-                    executor.submit(
-                        schedule_pending_task, task, observations, retry_after
-                    )
-                )
-            else:
-                # No deps or all deps satisfied
-                # can schedule now
-                schedule_task.invoke(dict(task=task, observations=observations))
-                # futures.append(executor.submit(schedule_task.invoke, dict(task=task, observations=observations)))
-
-        # All tasks have been submitted or enqueued
-        # Wait for them to complete
-        wait(futures)
-    # Convert observations to new tool messages to add to the state
-    new_observations = {
-        k: (task_names[k], args_for_tasks[k], observations[k])
-        for k in sorted(observations.keys() - originals)
-    }
-    tool_messages = [
-        FunctionMessage(
-            name=name,
-            content=str(obs),
-            additional_kwargs={"idx": k, "args": task_args},
-            tool_call_id=k,
-        )
-        for k, (name, task_args, obs) in new_observations.items()
-    ]
-    return tool_messages
+            _record_latency(name, started)
+        except RateLimited as e:
+            rate_limited = e
+            attempts[task["idx"]] = attempts.get(task["idx"], 0) + 1
+            if attempts[task["idx"]] <= get_tool_policy(name).max_retries:
+                # Back into the throttle queue; it will start again once the
+                # provider's Retry-After has passed.
+                raise TaskRequeued() from e
+            observations[task["idx"]] = _rate_limit_error(name, attempts[task["idx"]])
+            raise TaskFailed() from e
+        finally:
+            timeline.task_finished(task["idx"], observations.get(task["idx"]))
+            tool_throttle.release(name, rate_limited)
+
+    def reject_task(task: Task, e: Exception):
+        if task["idx"] not in memoized:
+            tool_throttle.release(_task_name(task))
+        observations[task["idx"]] = f"ERROR(Task {task['idx']} was not run: {e})"
+
+    # Tasks whose dependencies are not yet satisfied are parked by the DAG
+    # executor and released by whichever thread completes their last
+    # dependency, so nothing sleeps on a pool thread waiting for inputs.
+    # The pool itself is shared by every request (see tool_executor).
+    dag = DAGExecutor(
+        get_tool_executor(),
+        run_task,
+        completed=originals,
+        on_rejected=reject_task,
+        admit=admit,
+        estimate=_estimate_task,
+        # A failed or timed-out task cancels everything downstream of it
+        on_cancelled=_cancel_task(observations),
+    )
+    for task in tasks:
+        task_names[task["idx"]] = _task_name(task)
+        args_for_tasks[task["idx"]] = task["args"]
+        timeline.task_queued(task["idx"], task_names[task["idx"]], task["args"], task["dependencies"])
+        # No deps or all deps satisfied: dispatch now, without blocking
+        # the planner stream unless inline dispatch was requested
+        dag.submit(task, run_inline_if_ready=run_inline)
+    timeline.planning_done()
+
+    if scheduler_input.get("join_early"):
+        answered = _join_while_running(dag, messages, observations, originals, task_names, args_for_tasks)
+        if answered is not None:
+            stop.set_result(None)
+            dag.cancel()
+            configured_logger.info(f"Plan answered early: {timeline.format_summary()}")
+            timeline.close()
+            return answered
+
+    # All tasks have been submitted or parked
+    # Wait for them to complete
+    _record_unresolvable(dag.join(), observations)
+    configured_logger.info(
+        f"Plan timeline ({DISPATCH_MODE} dispatch): {timeline.format_summary()},"
+        f" {len(memoized)} memoized observations reused"
+    )
+    timeline.close()
+    return _to_function_messages(observations, originals, task_names, args_for_tasks)
+
+
+async def aschedule_tasks(scheduler_input: SchedulerInput) -> List[BaseMessage]:
+    """
+    Async counterpart of schedule_tasks. The DAG is driven on the event loop:
+    tools with a native coroutine are awaited directly and sync-only tools run
+    on the bounded shared pool, so a session holds no thread while it waits.
+    """
+    tasks = scheduler_input["tasks"]
+    messages = scheduler_input["messages"]
+    observations = ObservationStore(_get_observations(messages))
+    originals = set(observations)
+    task_names = {}
+    args_for_tasks = {}
+    timeline = scheduler_input.get("timeline") or PlanExecutionTimeline()
+
+    conversation = scheduler_input.get("conversation")
+    reused = 0
+
+    async def run_task(task: Task):
+        nonlocal reused
+        timeline.task_ready(task["idx"])
+        hit, result = _recall(task, observations, conversation)
+        if hit:
+            observations[task["idx"]] = result
+            timeline.task_finished(task["idx"], result)
+            reused += 1
+            return
+        name = _task_name(task)
+        attempts = 0
+        while True:
+            await tool_throttle.wait_for_slot(name)
+            rate_limited = None
+            timeline.task_started(task["idx"])
+            started = time.perf_counter()
+            try:
+                await aschedule_task(task, observations, conversation=conversation)
+                _record_latency(name, started)
+                return
+            except RateLimited as e:
+                rate_limited = e
+                attempts += 1
+                if attempts > get_tool_policy(name).max_retries:
+                    observations[task["idx"]] = _rate_limit_error(name, attempts)
+                    raise TaskFailed() from e
+            finally:
+                timeline.task_finished(task["idx"], observations.get(task["idx"]))
+                tool_throttle.release(name, rate_limited)
+
+    dag = AsyncDAGExecutor(run_task, completed=originals, on_cancelled=_cancel_task(observations))
+    async for task in tasks:
+        task_names[task["idx"]] = _task_name(task)
+        args_for_tasks[task["idx"]] = task["args"]
+        timeline.task_queued(task["idx"], task_names[task["idx"]], task["args"], task["dependencies"])
+        dag.submit(task)
+    timeline.planning_done()
+
+    if scheduler_input.get("join_early"):
+        answered = await _ajoin_while_running(dag, messages, observations, originals, task_names, args_for_tasks)
+        if answered is not None:
+            dag.cancel()
+            configured_logger.info(f"Plan answered early (async): {timeline.format_summary()}")
+            timeline.close()
+            return answered
+
+    _record_unresolvable(await dag.join(), observations)
+    configured_logger.info(
+        f"Plan timeline (async): {timeline.format_summary()}, {reused} memoized observations reused"
+    )
+    timeline.close()
+    return _to_function_messages(observations, originals, task_names, args_for_tasks)
 
 
 import itertools
 
 from src.assistant.planning.llm_initializer import llm
 
+planner_prompt = json_planner_prompt if PLAN_FORMAT == "json" else planner_base_prompt()
 
-@as_runnable
-def plan_and_schedule(state):
-    messages = state["messages"]
 
-    if state.get("selected_tool_categories"):
+def _build_planner(tools: List[BaseTool]):
+    if CATEGORY_SELECTION == "planner":
+        descriptions = render_categorized_tool_descriptions(tools, tool_categories)
+        return create_planner(llm, tools, planner_prompt, tool_descriptions=descriptions)
+    return create_planner(llm, tools, planner_prompt)
+
+
+planner_cache = PlannerCache(_build_planner, max_size=int(os.getenv("PLANNER_CACHE_SIZE", "32")))
+
+
+def _select_tools(state) -> List[BaseTool]:
+    if CATEGORY_SELECTION != "planner" and state.get("selected_tool_categories"):
 
         selected_tool_categories = state["selected_tool_categories"]
 
-        print("Selected tool categories", selected_tool_categories)
+        configured_logger.debug(f"Selected tool categories: {selected_tool_categories}")
 
         # Filter tools based on selected categories
         filtered_tools = filter_tools_by_category(selected_tool_categories["required_categories"])
 
-        print(filtered_tools)
+        configured_logger.debug(f"Tools for the selected categories: {[tool.name for tool in filtered_tools]}")
+
+        return filtered_tools
+    return tools_registry.get_all_tools()
+
+
+def _plan_question(messages: List[BaseMessage]) -> Optional[str]:
+    # Only first plans come from (and go to) the template cache; a replan ends
+    # with the joiner's feedback instead of the user's question. So do only
+    # a thread's opening questions: a follow-up ("and tomorrow?") means
+    # something else in every thread, and templates are shared by all of them.
+    if not PLAN_CACHE or len(messages) != 1:
+        return None
+    if isinstance(messages[0], HumanMessage) and isinstance(messages[0].content, str):
+        return messages[0].content
+    return None
+
+
+def _cached_plan(tools: List[BaseTool], question: Optional[str]):
+    if question is None:
+        return None
+    return plan_template_cache.lookup(question, tool_index(tools))
+
+
+def _recorded(tasks: Iterable[Task], planned: List[Task]) -> Iterable[Task]:
+    for task in tasks:
+        planned.append(task)
+        yield task
+
+
+async def _as_async(tasks: List[Task]) -> AsyncIterable[Task]:
+    for task in tasks:
+        yield task
+
+
+async def _arecorded(tasks: AsyncIterable[Task], planned: List[Task]) -> AsyncIterable[Task]:
+    async for task in tasks:
+        planned.append(task)
+        yield task
+
+
+def _learn_plan(
+        conversation: Hashable, question: Optional[str], cached, planned: List[Task], scheduled,
+        timeline: PlanExecutionTimeline,
+):
+    if question is None:
+        return
+    template = cached[0] if cached is not None else None
+    if plan_failed(scheduled):
+        if template is not None:
+            plan_template_cache.invalidate(template)
+        return
+    planning_seconds = timeline.summary()["planning"]
+    if scheduled and isinstance(scheduled[-1], AIMessage):
+        # Answered early: the joiner has already judged the plan
+        unjudged_plans.apply(question, template, planned, planning_seconds, answered=True)
+    else:
+        unjudged_plans.hold(conversation, question, template, planned, planning_seconds)
+
+
+def judge_plan(state, config: Optional[RunnableConfig], joined: List[BaseMessage]) -> None:
+    """Learn from the turn's plan once the joiner has answered with it (or asked for a replan)."""
+    answered = bool(joined) and isinstance(joined[-1], AIMessage)
+    unjudged_plans.judge(_conversation_key(state, config), answered)
+
+
+def _conversation_key(state, config: Optional[RunnableConfig]) -> Hashable:
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    if thread_id is not None:
+        return thread_id
+    # Without a thread, replans of one question share its first message
+    messages = state["messages"]
+    return messages[0].id if messages else None
+
 
-        # Recreate the planner with the filtered tools
-        planner = create_planner(llm, filtered_tools, base_planner_prompt)
+def _plan_and_schedule(state, config: RunnableConfig):
+    messages = state["messages"]
+    question = _plan_question(messages)
+
+    tools = _select_tools(state)
+    timeline = PlanExecutionTimeline()
+    cached = _cached_plan(tools, question)
+    planned = []
+    if cached is not None:
+        tasks = iter(cached[1])
     else:
-        planner = create_planner(llm, tools_registry, base_planner_prompt)
+        # Planner for the selected tools, built on first use
+        tasks = _recorded(planner_cache.get(tools).stream(messages), planned)
+    scheduled_tasks = _schedule(state, config, tasks, timeline)
+    _learn_plan(_conversation_key(state, config), question, cached, planned, scheduled_tasks, timeline)
+    return {"messages": scheduled_tasks}
+
 
-    tasks = planner.stream(messages)
+def _schedule(state, config: RunnableConfig, tasks: Iterator[Task], timeline: PlanExecutionTimeline):
     # Begin executing the planner immediately
     try:
         tasks = itertools.chain([next(tasks)], tasks)
     except StopIteration:
         # Handle the case where tasks is empty.
         tasks = iter([])
-    scheduled_tasks = schedule_tasks.invoke(
+    return schedule_tasks.invoke(
         {
-            "messages": messages,
+            "messages": state["messages"],
             "tasks": tasks,
+            "timeline": timeline,
+            "join_early": INCREMENTAL_JOIN,
+            "conversation": _conversation_key(state, config),
         }
     )
+
+
+async def _aplan_and_schedule(state, config: RunnableConfig):
+    messages = state["messages"]
+    question = _plan_question(messages)
+
+    tools = _select_tools(state)
+    timeline = PlanExecutionTimeline()
+    cached = _cached_plan(tools, question)
+    planned = []
+    if cached is not None:
+        tasks = _as_async(cached[1])
+    else:
+        tasks = _arecorded(planner_cache.get(tools).astream(messages), planned)
+    scheduled_tasks = await _aschedule(state, config, tasks, timeline)
+    _learn_plan(_conversation_key(state, config), question, cached, planned, scheduled_tasks, timeline)
     return {"messages": scheduled_tasks}
+
+
+async def _aschedule(state, config: RunnableConfig, tasks: AsyncIterable[Task], timeline: PlanExecutionTimeline):
+    return await aschedule_tasks(
+        {
+            "messages": state["messages"],
+            "tasks": tasks,
+            "timeline": timeline,
+            "join_early": INCREMENTAL_JOIN,
+            "conversation": _conversation_key(state, config),
+        }
+    )
+
+
+# Graphs run with invoke/stream take the threaded path; ainvoke/astream take the
+# asyncio path.
+plan_and_schedule = RunnableLambda(
+    _plan_and_schedule, afunc=_aplan_and_schedule, name="plan_and_schedule"
+)
+
+
+def speculative_plan_and_schedule(select_categories: Callable[[dict], dict]) -> RunnableLambda:
+    """
+    Node that runs select_categories and, at the same time, a planner over the
+    whole registry (see speculative.py). select_categories returns the state
+    with selected_tool_categories set, like select_tool_categories.
+    """
+
+    def _selected(state):
+        selected = select_categories(dict(state))["selected_tool_categories"]
+        return {**state, "selected_tool_categories": selected}
+
+    def _run(state, config: RunnableConfig):
+        timeline = PlanExecutionTimeline()
+        speculation = SpeculativePlan(planner_cache.get(tools_registry.get_all_tools()), state["messages"])
+        try:
+            state = _selected(state)
+            tools = _select_tools(state)
+        except BaseException:
+            # Don't leave the planner streaming for a node that is retried or gives up
+            speculation.cancel()
+            raise
+        # Falls back to the planner over the selected tools if the speculation is dropped
+        tasks = speculation.adopt(
+            {tool.name for tool in tools}, lambda: planner_cache.get(tools).stream(state["messages"])
+        )
+        scheduled_tasks = _schedule(state, config, tasks, timeline)
+        return {"messages": scheduled_tasks, "selected_tool_categories": state["selected_tool_categories"]}
+
+    async def _arun(state, config: RunnableConfig):
+        timeline = PlanExecutionTimeline()
+        speculation = AsyncSpeculativePlan(planner_cache.get(tools_registry.get_all_tools()), state["messages"])
+        # The selector is a blocking call; the speculative plan streams on the loop meanwhile
+        try:
+            state = await asyncio.to_thread(_selected, state)
+            tools = _select_tools(state)
+        except BaseException:
+            speculation.cancel()
+            raise
+        tasks = speculation.adopt(
+            {tool.name for tool in tools}, lambda: planner_cache.get(tools).astream(state["messages"])
+        )
+        scheduled_tasks = await _aschedule(state, config, tasks, timeline)
+        return {"messages": scheduled_tasks, "selected_tool_categories": state["selected_tool_categories"]}
+
+    return RunnableLambda(_run, afunc=_arun, name="select_and_plan")
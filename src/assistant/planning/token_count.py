@@ -0,0 +1,47 @@
+import os
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+# tiktoken encoding used when it is installed; without it we fall back to the
+# usual ~4 characters per token estimate, which is close enough for budgeting
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+CHARS_PER_TOKEN = 4
+TOKEN_COUNT_KEY = "token_count"
+
+
+@lru_cache(maxsize=1)
+def _encoder() -> Optional[Callable[..., List[int]]]:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding(TOKEN_ENCODING).encode
+
+
+def tokens_are_estimated() -> bool:
+    return _encoder() is None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text, estimated from its length if tiktoken is not installed."""
+    if not text:
+        return 0
+    encode = _encoder()
+    if encode is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encode(text, disallowed_special=()))
+
+
+def message_tokens(message) -> int:
+    """
+    Tokens in a message's content. The count is cached in the message's
+    response_metadata (and so checkpointed with it), and recounted only if the
+    content's length changed since, e.g. after a node appended to it.
+    """
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    cached = message.response_metadata.get(TOKEN_COUNT_KEY)
+    if isinstance(cached, dict) and cached.get("chars") == len(text):
+        return cached["tokens"]
+    tokens = count_tokens(text)
+    message.response_metadata[TOKEN_COUNT_KEY] = {"chars": len(text), "tokens": tokens}
+    return tokens
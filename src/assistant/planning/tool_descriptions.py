@@ -0,0 +1,136 @@
+"""
+Tool descriptions for the planner prompt, which is re-sent on every plan and
+replan. Besides the hand-written descriptions ("long"), two variants are
+generated from each tool's args schema:
+
+    compact: weather(lat: float, lon: float, lang: str = 'en') - Get the weather forecast.
+    short:   the compact line, plus the tool's metadata["short_description"]
+             (usage notes the planner must not lose) and one line per arg description
+
+Pick one with TOOL_DESCRIPTION_STYLE. `python -m src.evals.tool_description_tokens`
+shows what each costs, per tool and per category.
+"""
+import os
+import re
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.tools import BaseTool
+
+from src.assistant.planning.token_count import count_tokens
+from src.assistant.planning.tool_index import ToolSpec, tool_spec
+from src.logger import configured_logger
+
+STYLES = ("long", "short", "compact")
+TOOL_DESCRIPTION_STYLE = os.getenv("TOOL_DESCRIPTION_STYLE", "long").lower()
+if TOOL_DESCRIPTION_STYLE not in STYLES:
+    configured_logger.warning(f"Unknown TOOL_DESCRIPTION_STYLE {TOOL_DESCRIPTION_STYLE!r}; using 'long'")
+    TOOL_DESCRIPTION_STYLE = "long"
+
+_PY_TYPES = {
+    "string": "str",
+    "integer": "int",
+    "number": "float",
+    "boolean": "bool",
+    "object": "dict",
+    "null": "None",
+}
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _type_name(schema: Dict[str, Any]) -> str:
+    if "enum" in schema:
+        return " | ".join(repr(value) for value in schema["enum"])
+    if "anyOf" in schema:
+        options = [_type_name(option) for option in schema["anyOf"]]
+        present = [option for option in options if option != "None"]
+        name = " | ".join(present) or "None"
+        return f"Optional[{name}]" if len(present) < len(options) else name
+    json_type = schema.get("type")
+    if json_type == "array":
+        items = schema.get("items")
+        return f"list[{_type_name(items)}]" if items else "list"
+    return _PY_TYPES.get(json_type, "Any")
+
+
+def signature(spec: ToolSpec) -> str:
+    """`name(arg: type, arg: type = default)`, built from the args schema."""
+    params = []
+    for name in spec.arg_names:
+        param = f"{name}: {_type_name(spec.arg_schemas[name])}"
+        if name in spec.defaults:
+            param += f" = {spec.defaults[name]!r}"
+        params.append(param)
+    return f"{spec.name}({', '.join(params)})"
+
+
+def summary(spec: ToolSpec) -> str:
+    """First sentence of the hand-written description, minus any signature it starts with."""
+    for line in spec.tool.description.splitlines():
+        line = line.strip().lstrip("-").strip()
+        if not line:
+            continue
+        if line.startswith(f"{spec.name}(") and ") - " in line:
+            line = line.split(") - ", 1)[1]
+        return _SENTENCE_END.split(line, 1)[0]
+    return ""
+
+
+def _arg_notes(spec: ToolSpec) -> List[str]:
+    return [
+        f"    {name}: {spec.arg_schemas[name]['description']}"
+        for name in spec.arg_names
+        if spec.arg_schemas[name].get("description")
+    ]
+
+
+def render_tool_description(tool: BaseTool, style: str = TOOL_DESCRIPTION_STYLE) -> str:
+    if style == "long":
+        return tool.description
+    spec = tool_spec(tool)
+    line = signature(spec)
+    if text := summary(spec):
+        line += f" - {text}"
+    if style == "compact":
+        return line
+    lines = [line]
+    if notes := (tool.metadata or {}).get("short_description"):
+        lines.append(f"    {notes}")
+    lines.extend(_arg_notes(spec))
+    return "\n".join(lines)
+
+
+def render_tool_descriptions(tools: Sequence[BaseTool], style: str = TOOL_DESCRIPTION_STYLE) -> str:
+    """The numbered tool list of the planner prompt."""
+    # +1 to offset the 0 starting index, we want it count normally from 1.
+    return "\n".join(f"{i + 1}. {render_tool_description(tool, style)}\n" for i, tool in enumerate(tools))
+
+
+def render_categorized_tool_descriptions(
+        tools: Sequence[BaseTool], categories: Sequence[Any], style: str = TOOL_DESCRIPTION_STYLE
+) -> str:
+    """
+    The numbered tool list grouped under one-line category summaries, for a
+    planner that picks the categories itself by choosing actions. categories
+    are ToolCategory-like (name, description, tools). A tool in several
+    categories is listed under the first; tools in none come last.
+    """
+    available = {tool.name: tool for tool in tools}
+    sections = []
+    for category in categories:
+        members = [available.pop(tool.name) for tool in category.tools if tool.name in available]
+        if members:
+            sections.append((f"{category.name}: {category.description}", members))
+    if available:
+        sections.append(("Other tools", list(available.values())))
+    lines, number = [], 0
+    for heading, members in sections:
+        lines.append(f"## {heading}")
+        for tool in members:
+            number += 1
+            lines.append(f"{number}. {render_tool_description(tool, style)}\n")
+    return "\n".join(lines)
+
+
+def description_tokens(tool: BaseTool) -> Dict[str, int]:
+    """Tokens each style costs for this tool."""
+    return {style: count_tokens(render_tool_description(tool, style)) for style in STYLES}
@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from src.logger import configured_logger
+
+
+class ToolExecutorSaturated(RuntimeError):
+    """Raised when the tool pool's queue stays full for longer than the queue timeout."""
+
+
+class ToolExecutor(Executor):
+    """
+    Long-lived, bounded thread pool shared by every plan and replan.
+
+    At most max_workers tools run at once and at most max_queue_size more wait
+    for a worker. Callers beyond that block (backpressure) for up to
+    queue_timeout seconds and are then rejected with ToolExecutorSaturated.
+    Work submitted from inside the pool (dependents released by a finished
+    task) is never blocked, since its plan has already been admitted and
+    blocking a worker on its own pool could deadlock.
+
+    Queued work is started highest priority first (FIFO among equals): each
+    submission hands the pool a trampoline that pops the best queued item at
+    the moment a worker frees up.
+    """
+
+    def __init__(self, max_workers: int = 32, max_queue_size: int = 256, queue_timeout: float = 30.0):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._slots = threading.Semaphore(max_workers + max_queue_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._active = 0
+        self._queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._overflow = 0
+        self._busy_seconds = 0.0
+        self._queue_waits = deque(maxlen=1024)
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> Future:
+        return self.submit_with_priority(0.0, fn, *args, **kwargs)
+
+    def submit_with_priority(self, priority: float, fn: Callable, /, *args: Any, **kwargs: Any) -> Future:
+        """Like submit, but queued work with a higher priority starts first."""
+        if getattr(self._local, "in_worker", False):
+            if not self._slots.acquire(blocking=False):
+                # Over the queue limit, but refusing would strand an admitted plan
+                with self._lock:
+                    self._overflow += 1
+                return self._enqueue(fn, args, kwargs, holds_slot=False, priority=priority)
+        elif not self._slots.acquire(timeout=self.queue_timeout):
+            self._reject()
+        return self._enqueue(fn, args, kwargs, holds_slot=True, priority=priority)
+
+    async def arun(self, fn: Callable, /, *args: Any, **kwargs: Any) -> Any:
+        """
+        Run fn on the pool from async code. Waiting for a free slot happens off
+        the event loop so backpressure never stalls other sessions.
+        """
+        if not self._slots.acquire(blocking=False):
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, self._slots.acquire, True, self.queue_timeout):
+                self._reject()
+        return await asyncio.wrap_future(self._enqueue(fn, args, kwargs, holds_slot=True))
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = time.monotonic() - self._started_at
+            waits = sorted(self._queue_waits)
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "active": self._active,
+                "queued": self._queued,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "overflow": self._overflow,
+                "utilization": self._active / self.max_workers,
+                "average_utilization": self._busy_seconds / (self.max_workers * uptime) if uptime else 0.0,
+                "queue_wait_avg": sum(waits) / len(waits) if waits else 0.0,
+                "queue_wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "queue_wait_max": waits[-1] if waits else 0.0,
+            }
+
+    def _reject(self):
+        with self._lock:
+            self._rejected += 1
+        raise ToolExecutorSaturated(
+            f"Tool executor saturated: {self.max_workers} workers busy and"
+            f" {self.max_queue_size} tasks queued for more than {self.queue_timeout}s."
+        )
+
+    def _enqueue(self, fn: Callable, args, kwargs, holds_slot: bool, priority: float = 0.0) -> Future:
+        future = Future()
+        with self._lock:
+            self._submitted += 1
+            self._queued += 1
+            heapq.heappush(
+                self._heap,
+                (-priority, next(self._sequence), time.monotonic(), fn, args, kwargs, holds_slot, future),
+            )
+        try:
+            self._pool.submit(self._run_next)
+        except RuntimeError:
+            # Pool already shut down
+            with self._lock:
+                self._heap.remove(next(item for item in self._heap if item[-1] is future))
+                heapq.heapify(self._heap)
+                self._queued -= 1
+            if holds_slot:
+                self._slots.release()
+            raise
+        return future
+
+    def _run_next(self):
+        with self._lock:
+            _, _, enqueued_at, fn, args, kwargs, holds_slot, future = heapq.heappop(self._heap)
+            started_at = time.monotonic()
+            self._queued -= 1
+            self._active += 1
+            self._queue_waits.append(started_at - enqueued_at)
+        if not future.set_running_or_notify_cancel():
+            self._finish(started_at, holds_slot)
+            return
+        self._local.in_worker = True
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            self._local.in_worker = False
+            self._finish(started_at, holds_slot)
+
+    def _finish(self, started_at: float, holds_slot: bool):
+        with self._lock:
+            self._active -= 1
+            self._completed += 1
+            self._busy_seconds += time.monotonic() - started_at
+        if holds_slot:
+            self._slots.release()
+
+
+_tool_executor: Optional[ToolExecutor] = None
+_tool_executor_lock = threading.Lock()
+
+
+def start_tool_executor(**overrides: Any) -> ToolExecutor:
+    """
+    Create the process-wide tool executor. Sizes come from TOOL_EXECUTOR_*
+    environment variables unless overridden.
+    """
+    global _tool_executor
+    settings = {
+        "max_workers": int(os.getenv("TOOL_EXECUTOR_MAX_WORKERS", "32")),
+        "max_queue_size": int(os.getenv("TOOL_EXECUTOR_MAX_QUEUE", "256")),
+        "queue_timeout": float(os.getenv("TOOL_EXECUTOR_QUEUE_TIMEOUT", "30")),
+    }
+    settings.update(overrides)
+    with _tool_executor_lock:
+        if _tool_executor is None:
+            _tool_executor = ToolExecutor(**settings)
+            configured_logger.info(f"Started tool executor: {settings}")
+        return _tool_executor
+
+
+def get_tool_executor() -> ToolExecutor:
+    """Return the shared executor, starting it on first use outside the server."""
+    return _tool_executor or start_tool_executor()
+
+
+def shutdown_tool_executor(wait: bool = True) -> None:
+    global _tool_executor
+    with _tool_executor_lock:
+        executor, _tool_executor = _tool_executor, None
+    if executor is not None:
+        configured_logger.info(f"Shutting down tool executor: {executor.metrics()}")
+        executor.shutdown(wait=wait)
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.tools import BaseTool
+
+# Cached specs and indexes keep their tools alive, so the id() keys below stay valid
+MAX_CACHED_SPECS = 512
+MAX_CACHED_INDEXES = 64
+
+
+def json_type(schema: Dict[str, Any]) -> Optional[str]:
+    # Optional[int] comes out as {"anyOf": [{"type": "integer"}, {"type": "null"}]}
+    if "type" in schema:
+        return schema["type"]
+    for option in schema.get("anyOf", ()):
+        if option.get("type") not in (None, "null"):
+            return option["type"]
+    return None
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """
+    What the parser and the scheduler need to know about a tool, read from
+    its args schema once. `tool.args` rebuilds the JSON schema on every access.
+    """
+    tool: BaseTool
+    name: str
+    arg_names: Tuple[str, ...]
+    # JSON schema type of each arg ("string", "integer", ...), None if it has none
+    arg_types: Mapping
+    defaults: Mapping
+    required: frozenset
+    # The JSON schema of each arg, as the tool declares it
+    arg_schemas: Mapping
+
+    @classmethod
+    def from_tool(cls, tool: BaseTool) -> "ToolSpec":
+        properties = tool.args
+        return cls(
+            tool=tool,
+            name=tool.name,
+            arg_names=tuple(properties),
+            arg_types=MappingProxyType({name: json_type(schema) for name, schema in properties.items()}),
+            defaults=MappingProxyType(
+                {name: schema["default"] for name, schema in properties.items() if "default" in schema}
+            ),
+            required=frozenset(name for name, schema in properties.items() if "default" not in schema),
+            arg_schemas=MappingProxyType(dict(properties)),
+        )
+
+    def has_arg(self, name: str) -> bool:
+        return name in self.arg_types
+
+
+_lock = threading.Lock()
+_specs: "OrderedDict[int, ToolSpec]" = OrderedDict()
+_indexes: "OrderedDict[Tuple[int, ...], ToolIndex]" = OrderedDict()
+
+
+def _remember(cache: OrderedDict, key, value, limit: int):
+    with _lock:
+        cache[key] = value
+        if len(cache) > limit:
+            cache.popitem(last=False)
+    return value
+
+
+def tool_spec(tool: BaseTool) -> ToolSpec:
+    """The cached spec of a tool."""
+    spec = _specs.get(id(tool))
+    if spec is None or spec.tool is not tool:
+        spec = _remember(_specs, id(tool), ToolSpec.from_tool(tool), MAX_CACHED_SPECS)
+    return spec
+
+
+class ToolIndex(Mapping):
+    """Immutable tool name -> ToolSpec lookup for one toolset."""
+
+    def __init__(self, tools: Sequence[BaseTool]):
+        self.tools = tuple(tools)
+        self._specs = MappingProxyType({tool.name: tool_spec(tool) for tool in self.tools})
+
+    def __getitem__(self, name: str) -> ToolSpec:
+        return self._specs[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+
+def tool_index(tools: Sequence[BaseTool]) -> ToolIndex:
+    """The index of a toolset, built the first time that toolset is seen."""
+    if isinstance(tools, ToolIndex):
+        return tools
+    key = tuple(id(tool) for tool in tools)
+    index = _indexes.get(key)
+    if index is None:
+        index = _remember(_indexes, key, ToolIndex(tools), MAX_CACHED_INDEXES)
+    return index
@@ -0,0 +1,91 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ToolPolicy(BaseModel):
+    """
+    Scheduling policy for a single tool, looked up by tool name.
+    """
+    rate: Optional[float] = Field(
+        None, description="Sustained calls per second allowed by the provider. None means unlimited."
+    )
+    burst: int = Field(1, description="How many calls may be made back to back before the rate applies.")
+    max_concurrency: Optional[int] = Field(
+        None, description="Maximum number of calls in flight at once. None means unlimited."
+    )
+    max_retries: int = Field(5, description="How many times a rate-limited call is re-queued before giving up.")
+    timeout: Optional[float] = Field(
+        60.0, description="Seconds a single call may take before it is abandoned. None means no deadline."
+    )
+    hedge: bool = Field(
+        False,
+        description="Start a duplicate call once this one has run longer than the tool's p95 latency and "
+                    "take whichever finishes first. Only for idempotent, cheap calls.",
+    )
+    memoize_ttl: Optional[float] = Field(
+        None,
+        description="Reuse the result of an identical call (same resolved args) made earlier in the same "
+                    "conversation for this many seconds. None disables it; only for side-effect-free tools.",
+    )
+    error_keys: List[str] = Field(
+        ["error"],
+        description="A dict result with any of these keys set is a failure the tool returned instead of raising.",
+    )
+    error_pattern: Optional[str] = Field(
+        None, description="A str result matching this regex (from its start) is a failure the tool returned.",
+    )
+
+    def is_failure(self, result: Any) -> bool:
+        """Whether the tool reported an error in its result; such results are not worth reusing."""
+        if isinstance(result, dict):
+            return any(result.get(key) for key in self.error_keys)
+        if isinstance(result, str) and self.error_pattern:
+            return re.match(self.error_pattern, result) is not None
+        return False
+
+
+# Conservative defaults for the external providers we call. Override any of them
+# with TOOL_POLICIES, e.g. '{"weather_forecast": {"rate": 10, "burst": 10}}'.
+DEFAULT_TOOL_POLICIES: Dict[str, ToolPolicy] = {
+    "weather_forecast": ToolPolicy(
+        rate=1.0, burst=5, max_concurrency=4, timeout=20.0, hedge=True, memoize_ttl=600.0
+    ),
+    "geocode_location": ToolPolicy(
+        rate=1.0, burst=5, max_concurrency=4, timeout=20.0, hedge=True, memoize_ttl=86400.0
+    ),
+    "reverse_geocode": ToolPolicy(
+        rate=1.0, burst=5, max_concurrency=4, timeout=20.0, hedge=True, memoize_ttl=86400.0
+    ),
+    # "Error: <status> - ..." and "Error occurred during Wolfram Alpha API call -> ..."
+    "wolfram_alpha": ToolPolicy(rate=2.0, burst=4, max_concurrency=4, memoize_ttl=3600.0, error_pattern=r"Error"),
+    # The langchain tool returns repr(exception) instead of raising, e.g. "HTTPError('502 ...')"
+    "tavily_search_results_json": ToolPolicy(
+        rate=2.0, burst=5, max_concurrency=5, memoize_ttl=600.0, error_pattern=r"\w+(Error|Exception)\("
+    ),
+    # Some URLs failing is worth a retry too
+    "tavily_extract": ToolPolicy(
+        rate=1.0, burst=3, max_concurrency=3, memoize_ttl=600.0, error_keys=["error", "failed_results"]
+    ),
+    "perplexity_search": ToolPolicy(rate=0.8, burst=2, max_concurrency=2),
+    "browser_task": ToolPolicy(max_concurrency=2, timeout=300.0),
+}
+
+
+def _load_tool_policies() -> Dict[str, ToolPolicy]:
+    policies = dict(DEFAULT_TOOL_POLICIES)
+    overrides = json.loads(os.getenv("TOOL_POLICIES", "{}"))
+    for name, fields in overrides.items():
+        base = policies.get(name, ToolPolicy())
+        policies[name] = base.model_copy(update=fields)
+    return policies
+
+
+tool_policies = _load_tool_policies()
+
+
+def get_tool_policy(name: str) -> ToolPolicy:
+    return tool_policies.get(name) or ToolPolicy()
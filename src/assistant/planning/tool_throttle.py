@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from src.assistant.planning.tool_policies import ToolPolicy, get_tool_policy
+from src.assistant.tools.rate_limit import RateLimited
+
+# Pause used when a provider sends 429 without a Retry-After header.
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class TokenBucket:
+    """
+    Classic token bucket. The refill rate can be lowered when the provider
+    pushes back and recovers towards the configured rate on success.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.configured_rate = rate
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def back_off(self):
+        # Multiplicative decrease: we were over the provider's real limit
+        self.rate = max(self.configured_rate * 0.1, self.rate * 0.5)
+        self.tokens = min(self.tokens, 0.0)
+
+    def recover(self):
+        # Additive increase back towards the configured rate
+        if self.rate < self.configured_rate:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate * 0.1)
+
+
+class _ToolGate:
+    def __init__(self, policy: ToolPolicy):
+        self.policy = policy
+        self.bucket = TokenBucket(policy.rate, policy.burst) if policy.rate else None
+        self.active = 0
+        self.paused_until = 0.0
+        self.waiters: Deque[Callable[[], None]] = deque()
+        self.timer: Optional[threading.Timer] = None
+        self.calls = 0
+        self.rate_limited = 0
+
+    def delay(self, now: float) -> Optional[float]:
+        """0 if a call may start now, seconds to wait for a token, or None if waiting on concurrency."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.policy.max_concurrency is not None and self.active >= self.policy.max_concurrency:
+            return None
+        return self.bucket.delay(now) if self.bucket else 0.0
+
+    def acquire(self):
+        self.active += 1
+        self.calls += 1
+        if self.bucket:
+            self.bucket.take()
+
+
+class ToolThrottle:
+    """
+    Per-tool token bucket and concurrency limit, shared by every request in the
+    process since provider limits are per API key rather than per user.
+
+    Calls that cannot start yet are queued as callbacks and started, in order,
+    as soon as a token and a slot are available, so a throttled task never
+    holds a pool thread or an event-loop slot while it waits.
+    """
+
+    def __init__(self, policy_for: Callable[[str], ToolPolicy] = get_tool_policy):
+        self._policy_for = policy_for
+        self._lock = threading.Lock()
+        self._gates: Dict[str, _ToolGate] = {}
+
+    def _gate(self, name: str) -> _ToolGate:
+        gate = self._gates.get(name)
+        if gate is None:
+            gate = self._gates[name] = _ToolGate(self._policy_for(name))
+        return gate
+
+    def acquire_or_wait(self, name: str, on_ready: Callable[[], None]) -> bool:
+        """
+        Take a slot for `name` and return True if the call may start now.
+        Otherwise return False; on_ready is called (from another thread) once
+        the slot has been taken on the caller's behalf.
+        """
+        if self.try_acquire(name):
+            return True
+        with self._lock:
+            self._gate(name).waiters.append(on_ready)
+        self._pump(name)
+        return False
+
+    def try_acquire(self, name: str) -> bool:
+        """Take a slot for `name` only if one is free right now and nobody is queued for it."""
+        with self._lock:
+            gate = self._gate(name)
+            if not gate.waiters and gate.delay(time.monotonic()) == 0.0:
+                gate.acquire()
+                return True
+            return False
+
+    async def wait_for_slot(self, name: str) -> None:
+        """Async variant of acquire_or_wait."""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def grant():
+            if ready.cancelled():
+                # The waiter went away (its plan was stopped); hand the slot back
+                self.release(name)
+            else:
+                ready.set_result(None)
+
+        if not self.acquire_or_wait(name, lambda: loop.call_soon_threadsafe(grant)):
+            await ready
+
+    def release(self, name: str, rate_limited: Optional[RateLimited] = None) -> None:
+        """Give the slot back. Pass the RateLimited error if the call was refused with a 429."""
+        with self._lock:
+            gate = self._gate(name)
+            gate.active -= 1
+            if rate_limited is not None:
+                gate.rate_limited += 1
+                retry_after = rate_limited.retry_after
+                if retry_after is None:
+                    retry_after = DEFAULT_RETRY_AFTER
+                gate.paused_until = max(gate.paused_until, time.monotonic() + retry_after)
+                if gate.bucket:
+                    gate.bucket.back_off()
+            elif gate.bucket:
+                gate.bucket.recover()
+        self._pump(name)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": gate.calls,
+                    "rate_limited": gate.rate_limited,
+                    "active": gate.active,
+                    "queued": len(gate.waiters),
+                    "current_rate": gate.bucket.rate if gate.bucket else None,
+                }
+                for name, gate in self._gates.items()
+            }
+
+    def _pump(self, name: str) -> None:
+        ready = []
+        with self._lock:
+            gate = self._gate(name)
+            while gate.waiters:
+                delay = gate.delay(time.monotonic())
+                if delay is None:
+                    # A release() will pump again
+                    break
+                if delay > 0:
+                    if gate.timer is None:
+                        gate.timer = threading.Timer(delay, self._on_timer, args=(name,))
+                        gate.timer.daemon = True
+                        gate.timer.start()
+                    break
+                gate.acquire()
+                ready.append(gate.waiters.popleft())
+        for on_ready in ready:
+            on_ready()
+
+    def _on_timer(self, name: str) -> None:
+        with self._lock:
+            self._gate(name).timer = None
+        self._pump(name)
+
+
+tool_throttle = ToolThrottle()
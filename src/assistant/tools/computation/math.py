@@ -21,6 +21,11 @@ _MATH_DESCRIPTION = (
     " - Never use search action outputs as problem variables - search returns text, not values. Instead, provide search results in context argument. Example: Instead of search('Barack Obama') then math('age of $1'), use math('age of Barack Obama', context=['$1']).\n"
     " - When querying context, always specify units (e.g., 'what is xx in height?' not 'what is xx?').\n"
 )
+# The rules the planner keeps with TOOL_DESCRIPTION_STYLE=short
+_MATH_NOTES = (
+    "One expression per call. It can't see earlier outputs: pass them (and search results) in context "
+    "rather than in the problem, e.g. math('age of Barack Obama', context=['$1'])."
+)
 
 _SYSTEM_PROMPT = """Translate a math problem into a expression that can be executed using Python's numexpr library. Use the output of running this code to answer the question.
 
@@ -126,4 +131,5 @@ def get_math_tool(llm: ChatOpenAI):
         name="math",
         func=calculate_expression,
         description=_MATH_DESCRIPTION,
+        metadata={"short_description": _MATH_NOTES},
     )
@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 
+from src.assistant.tools.rate_limit import raise_for_rate_limit
 from src.logger import configured_logger  # Assuming the logger is imported here
 
 # Load environment variables
@@ -49,8 +50,9 @@ def wolfram_alpha_computing(query: str, max_chars: int = 800) -> str:
         # Log the API request parameters
         configured_logger.info(f"Sending request to Wolfram Alpha with params: {params}")
 
-        response = requests.get(base_url, params=params)
+        response = requests.get(base_url, params=params, timeout=15)
 
+        raise_for_rate_limit(response)
         response.raise_for_status()  # Raise HTTPError for bad responses
 
         if response.status_code == 200:
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 
+from src.assistant.tools.rate_limit import RateLimited, raise_for_rate_limit
 from src.logger import configured_logger  # Assuming the logger is imported
 
 load_dotenv()
@@ -44,8 +45,9 @@ def geocode_location(
         )
 
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         configured_logger.info(f"API request sent to: {url}")
+        raise_for_rate_limit(response)
 
         if response.status_code == 200:
             data = response.json()
@@ -58,6 +60,8 @@ def geocode_location(
             configured_logger.error(f"Request failed with status code {response.status_code}.")
             return {"error": f"Request failed with status code {response.status_code}."}
 
+    except RateLimited:
+        raise
     except Exception as e:
         configured_logger.error(f"Error during geocode_location request: {str(e)}")
         return {"error": f"An error occurred: {str(e)}"}
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 
+from src.assistant.tools.rate_limit import RateLimited, raise_for_rate_limit
 from src.logger import configured_logger
 
 load_dotenv()
@@ -27,7 +28,8 @@ def reverse_geocode(lat: float, lon: float, limit: int = 5) -> dict:
     configured_logger.info(f"Making reverse geocoding request to URL: {url}")
 
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
+        raise_for_rate_limit(response)
 
         if response.status_code == 200:
             data = response.json()
@@ -39,6 +41,8 @@ def reverse_geocode(lat: float, lon: float, limit: int = 5) -> dict:
         else:
             configured_logger.error(f"Request failed with status code {response.status_code}.")
             return {"error": f"Request failed with status code {response.status_code}."}
+    except RateLimited:
+        raise
     except Exception as e:
         configured_logger.error(f"Error during reverse geocoding request: {e}")
         return {"error": f"Error: {e}"}
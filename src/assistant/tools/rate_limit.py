@@ -0,0 +1,49 @@
+import email.utils
+import time
+from typing import Optional
+
+
+class RateLimited(Exception):
+    """A provider answered 429 Too Many Requests. retry_after is in seconds, if the provider sent one."""
+
+    def __init__(self, message: str = "Rate limited by provider", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as delta-seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def raise_for_rate_limit(response) -> None:
+    """
+    Raise RateLimited if the response is a 429, so the scheduler can queue the
+    task for a later retry instead of it being reported as a tool failure.
+    """
+    if response.status_code == 429:
+        raise RateLimited(
+            f"Rate limited by {response.url}",
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+
+def as_rate_limited(e: BaseException) -> Optional[RateLimited]:
+    """Return e as a RateLimited if it represents a 429 (e.g. requests.HTTPError), else None."""
+    if isinstance(e, RateLimited):
+        return e
+    response = getattr(e, "response", None)
+    if response is not None and getattr(response, "status_code", None) == 429:
+        return RateLimited(
+            str(e), retry_after=parse_retry_after(response.headers.get("Retry-After"))
+        )
+    return None
@@ -110,7 +110,7 @@ def filter_tools_by_category(selected_categories: List[str]) -> List[StructuredT
     """
     if not selected_categories:
         # If no categories are selected, return all tools
-        return tools_registry
+        return tools_registry.get_all_tools()
 
     filtered_tools = []
     for category in tool_categories:
@@ -39,7 +39,7 @@ class OpenWeather:
             "units": units,
             "lang": lang,
         }
-        response = requests.get(self.base_url, params=query_params)
+        response = requests.get(self.base_url, params=query_params, timeout=10)
         response.raise_for_status()
         return response.json()
 
@@ -5,6 +5,7 @@ import requests
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 
+from src.assistant.tools.rate_limit import raise_for_rate_limit
 from src.logger import configured_logger
 
 
@@ -110,7 +111,8 @@ def perplexity_search(
 
     try:
         configured_logger.info(f"Querying Perplexity API with query: {query}")
-        response = requests.post(url, json=payload, headers=headers)
+        response = requests.post(url, json=payload, headers=headers, timeout=60)
+        raise_for_rate_limit(response)
         response.raise_for_status()
         configured_logger.info(f"API response received successfully for query: {query}")
         return response.json()
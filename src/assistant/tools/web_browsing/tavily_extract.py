@@ -7,6 +7,7 @@ from dotenv import load_dotenv
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel
 
+from src.assistant.tools.rate_limit import RateLimited, raise_for_rate_limit
 from src.logger import configured_logger
 
 load_dotenv()
@@ -39,7 +40,8 @@ def extract_raw_content_from_url(urls: List[str]) -> Dict:
         configured_logger.info(f"Sending extraction request to Tavily API with payload: {payload}")
 
         # Synchronous request using requests
-        response = requests.post(f"{base_url}/extract", headers=headers, json=payload)
+        response = requests.post(f"{base_url}/extract", headers=headers, json=payload, timeout=30)
+        raise_for_rate_limit(response)
 
         if response.status_code == 200:
             results = response.json()
@@ -73,6 +75,8 @@ def extract_raw_content_from_url(urls: List[str]) -> Dict:
             configured_logger.error(f"Extraction failed with error: {error_msg}")
             raise Exception(f"Extraction failed -> {error_msg}") from Exception(error_msg)
 
+    except RateLimited:
+        raise
     except Exception as e:
         # Log the exception that occurred
         configured_logger.error(f"Tavily extract failed -> {e}")
@@ -1,7 +1,8 @@
 # client.py
+import uuid
+
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage
 
 from src.assistant.planning.agent import query_agent
 
@@ -15,6 +16,10 @@ st.title("Personal Assistant Chat")
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
+# Each browser session is its own conversation thread in the checkpointer
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = uuid.uuid4().hex
+
 
 # Function to handle the chat interaction
 def handle_chat(prompt):
@@ -22,25 +27,11 @@ def handle_chat(prompt):
         # Add user message to chat history
         st.session_state.chat_history.append({"role": "user", "content": prompt})
 
-        # Prepare inputs for the agent
-        config = {"configurable": {"thread_id": "1"}}
-        messages = [HumanMessage(content=prompt)]
-
-        # Invoke the agent
-        result = query_agent(query=prompt)
-
-        # Extract the agent's response
-        if result and isinstance(result, dict) and "messages" in result:
-            if result["messages"]:
-                last_message = result["messages"][-1]  # Select the last message
-                if hasattr(last_message, "content"):
-                    full_response = last_message.content
-                else:
-                    full_response = "I'm sorry, I couldn't process that. Can you please rephrase?"
-            else:
-                full_response = "I'm sorry, I didn't get a response. Can you try again?"
-        else:
-            full_response = "I'm sorry, something went wrong. Please try again."
+        # Invoke the agent on this session's thread
+        result = query_agent(query=prompt, thread_id=st.session_state.thread_id)
+
+        # query_agent returns the final answer's text
+        full_response = result or "I'm sorry, I didn't get a response. Can you try again?"
 
         # Add agent response to chat history
         st.session_state.chat_history.append({"role": "assistant", "content": full_response})
@@ -67,6 +58,7 @@ if st.button("Send"):
 # Optional: Add a reset button to clear chat history
 if st.button("Reset Chat"):
     st.session_state.chat_history = []
+    st.session_state.thread_id = uuid.uuid4().hex
     st.experimental_rerun()
 
 # Optional: Add a greeting from the assistant if the chat is empty
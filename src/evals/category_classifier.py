@@ -0,0 +1,55 @@
+"""
+How often the local category classifier would answer instead of the LLM, and
+how often it agrees with the LLM when it does, on the logged decisions
+(CATEGORY_TRACES). The model is trained on the first 80% of the traces and
+scored on the rest, with and without the keyword rules added to it.
+
+Run with: python -m src.evals.category_classifier
+"""
+import time
+
+from src.assistant.planning.category_classifier import (
+    CATEGORY_CLASSIFIER_CONFIDENCE,
+    CategoryClassifier,
+    CategoryModel,
+    load_traces,
+)
+from src.assistant.tools.tool_categories import tool_categories
+
+TRAIN_SHARE = 0.8
+
+
+def score(classifier: CategoryClassifier, examples) -> str:
+    answered = agreed = 0
+    started = time.perf_counter()
+    for message, labels in examples:
+        selected = classifier.classify(message)
+        if selected is not None:
+            answered += 1
+            agreed += set(selected) == set(labels)
+    per_call = (time.perf_counter() - started) / len(examples)
+    return (
+        f"answered locally {answered / len(examples):.1%}, agreed with the LLM on "
+        f"{agreed / answered if answered else 0:.1%} of those, {per_call * 1e6:.0f} us per message"
+    )
+
+
+def main():
+    categories = [category.name for category in tool_categories]
+    examples = [(message, [c for c in labels if c in categories]) for message, labels in load_traces()]
+    split = int(len(examples) * TRAIN_SHARE)
+    if not split or split == len(examples):
+        print(f"Only {len(examples)} logged decisions; run the assistant with the LLM selector for a while first")
+        return
+    train, test = examples[:split], examples[split:]
+    print(f"{len(train)} decisions to train on, {len(test)} to test; confidence {CATEGORY_CLASSIFIER_CONFIDENCE}")
+    started = time.perf_counter()
+    model = CategoryModel.fit(train, categories)
+    print(f"Trained in {time.perf_counter() - started:.1f}s")
+    # Score the model whatever CATEGORY_CLASSIFIER_MIN_EXAMPLES says
+    print(f"Model: {score(CategoryClassifier(categories, model, min_examples=0, keywords=False), test)}")
+    print(f"Model + keywords: {score(CategoryClassifier(categories, model, min_examples=0), test)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Checkpoint write and read latency per step, DeltaSqliteSaver against
+langgraph's SqliteSaver, with many conversations running at once.
+
+Each conversation runs TURNS turns through a graph shaped like the agent's:
+category selection, then plan_and_schedule adding a plan thought and a few
+tool observations, then the joiner's answer. Every step writes a checkpoint
+(put) and every turn starts by reading the latest one (get_tuple); both are
+timed on the saver itself. Observations are a few KB, like search results,
+so a saver that copies the whole state gets slower as conversations grow.
+
+Run with: python -m src.evals.checkpointer_latency
+"""
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Callable, Dict, List
+
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from src.assistant.planning.checkpointer import DeltaSqliteSaver
+
+CONVERSATIONS = 64
+CONCURRENCY = 16
+TURNS = 20
+OBSERVATIONS_PER_TURN = 3
+OBSERVATION_CHARS = 3000
+
+_WORDS = "weather forecast lagos rain umbrella temperature wind humidity search result page city".split()
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+    selected_tool_categories: dict
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    words = []
+    while sum(map(len, words)) + len(words) < chars:
+        words.append(rng.choice(_WORDS))
+    return " ".join(words)
+
+
+def _graph(saver):
+    rng = random.Random(0)
+
+    def select_tool_categories(state: State):
+        return {"selected_tool_categories": {"required_categories": ["Weather Information"], "explanation": ""}}
+
+    def plan_and_schedule(state: State):
+        messages = [AIMessage(content="Thought: look it up")]
+        for idx in range(1, OBSERVATIONS_PER_TURN + 1):
+            messages.append(FunctionMessage(
+                name="tavily_search_results_json", content=_text(rng, OBSERVATION_CHARS),
+                additional_kwargs={"idx": idx, "args": {"query": "weather"}},
+            ))
+        return {"messages": messages}
+
+    def join(state: State):
+        return {"messages": [AIMessage(content=_text(rng, 300))]}
+
+    builder = StateGraph(State)
+    builder.add_node("select_tool_categories", select_tool_categories)
+    builder.add_node("plan_and_schedule", plan_and_schedule)
+    builder.add_node("join", join)
+    builder.add_edge(START, "select_tool_categories")
+    builder.add_edge("select_tool_categories", "plan_and_schedule")
+    builder.add_edge("plan_and_schedule", "join")
+    builder.add_edge("join", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _timed(method: Callable, samples: List[float]) -> Callable:
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    return timed
+
+
+def _ms(samples: List[float]) -> str:
+    cuts = statistics.quantiles(samples, n=100)
+    return f"{cuts[49] * 1000:>7.2f} {cuts[94] * 1000:>7.2f}"
+
+
+def run(name: str, make_saver: Callable[[str], object]) -> Dict[str, object]:
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "checkpoints.sqlite")
+    saver = make_saver(path)
+    puts, gets = [], []
+    saver.put = _timed(saver.put, puts)
+    saver.get_tuple = _timed(saver.get_tuple, gets)
+    app = _graph(saver)
+    # put latency on each conversation's last turn, to see whether it grows
+    last_turn_puts = []
+
+    def conversation(n: int):
+        config = {"configurable": {"thread_id": f"{name}-{n}"}}
+        for turn in range(TURNS):
+            before = len(puts)
+            app.invoke({"messages": [HumanMessage(content=_text(random.Random(turn), 80))]}, config)
+            if turn == TURNS - 1:
+                last_turn_puts.extend(puts[before:])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        list(pool.map(conversation, range(CONVERSATIONS)))
+    elapsed = time.perf_counter() - started
+    size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+    return {
+        "saver": name, "puts": puts, "gets": gets, "last_turn_puts": last_turn_puts,
+        "elapsed": elapsed, "size": size,
+    }
+
+
+def main():
+    print(f"{CONVERSATIONS} conversations of {TURNS} turns, {CONCURRENCY} at a time; "
+          f"{OBSERVATIONS_PER_TURN} observations of {OBSERVATION_CHARS} chars per turn")
+    savers = {
+        "SqliteSaver": lambda path: SqliteSaver(sqlite3.connect(path, check_same_thread=False)),
+        # keep=0: measure the write path without compaction, then with it
+        "DeltaSqliteSaver, no compaction": lambda path: DeltaSqliteSaver(path, keep=0),
+        "DeltaSqliteSaver": lambda path: DeltaSqliteSaver(path),
+    }
+    print(f"{'saver':>32} {'put p50':>7} {'p95 ms':>7} {'last-turn p50':>13} {'p95 ms':>7} "
+          f"{'get p50':>7} {'p95 ms':>7} {'wall s':>7} {'db MB':>7}")
+    for name, make_saver in savers.items():
+        result = run(name, make_saver)
+        print(f"{name:>32} {_ms(result['puts'])} {_ms(result['last_turn_puts']):>21} {_ms(result['gets'])} "
+              f"{result['elapsed']:>7.1f} {result['size'] / 1e6:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+What the planner and the joiner are sent for a thread with oversized
+observations (a Tavily page extraction, One Call JSON, the same search
+repeated), before and after the context builder, and what building the
+context costs with and without the token counts cached on the messages.
+
+Run with: python -m src.evals.context_budget
+"""
+import json
+import random
+import time
+
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage, SystemMessage
+
+from src.assistant.planning.context_window import (
+    JOINER_MESSAGE_TOKENS,
+    PLANNER_MESSAGE_TOKENS,
+    joiner_context,
+    planner_context,
+)
+from src.assistant.planning.token_count import count_tokens, tokens_are_estimated
+
+REPEATS = 200
+_WORDS = "the city forecast rain page result lagos museum ticket opening hours review price".split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _one_call(rng: random.Random) -> str:
+    hourly = [{"dt": 1700000000 + 3600 * h, "temp": round(rng.uniform(20, 32), 2), "humidity": rng.randint(40, 99),
+               "weather": [{"id": 500, "main": "Rain", "description": "light rain"}]} for h in range(48)]
+    daily = [{"dt": 1700000000 + 86400 * d, "temp": {"min": 21.3, "max": 31.9}, "pop": round(rng.random(), 2)}
+             for d in range(8)]
+    return json.dumps({"lat": 6.45, "lon": 3.39, "timezone": "Africa/Lagos", "hourly": hourly, "daily": daily})
+
+
+def _observation(name: str, idx: int, content: str) -> FunctionMessage:
+    return FunctionMessage(name=name, content=content, additional_kwargs={"idx": idx, "args": {}})
+
+
+def conversation(seed: int = 0) -> list:
+    rng = random.Random(seed)
+    search = _text(rng, 1500)
+    messages = []
+    for turn in range(4):
+        messages += [
+            HumanMessage(content=f"Question {turn}: {_text(rng, 20)}"),
+            AIMessage(content=f"Thought: {_text(rng, 30)}"),
+            _observation("tavily_search_results_json", 1, search),
+            _observation("weather_information", 2, _one_call(rng)),
+            AIMessage(content=_text(rng, 120)),
+        ]
+    # The current question: a page extraction, and the same search again
+    messages += [
+        HumanMessage(content=f"Question 4: {_text(rng, 20)}"),
+        AIMessage(content=f"Thought: {_text(rng, 30)}"),
+        _observation("extract_raw_content_from_url", 1, _text(rng, 25000)),
+        _observation("tavily_search_results_json", 2, search),
+        _observation("tavily_search_results_json", 3, search),
+        SystemMessage(content="Context from last attempt: the page did not list opening hours"),
+    ]
+    return messages
+
+
+def _tokens(messages) -> int:
+    return sum(count_tokens(message.content) for message in messages)
+
+
+def _idx(messages) -> list:
+    return [message.additional_kwargs["idx"] for message in messages if isinstance(message, FunctionMessage)]
+
+
+def _current_turn(messages) -> list:
+    # What the joiner's select_recent_messages passes on
+    start = max(i for i, message in enumerate(messages) if isinstance(message, HumanMessage))
+    return messages[start:]
+
+
+def _per_call_ms(build, cached: bool) -> float:
+    # Fresh copies of the thread have no cached counts
+    threads = [conversation(0) for _ in range(REPEATS)] if not cached else [conversation(0)] * REPEATS
+    build(threads[0])
+    started = time.perf_counter()
+    for messages in threads[1:]:
+        build(messages)
+    return (time.perf_counter() - started) / (REPEATS - 1) * 1000
+
+
+def main():
+    estimated = " (estimated: tiktoken is not installed)" if tokens_are_estimated() else ""
+    print(f"Budgets: planner {PLANNER_MESSAGE_TOKENS}, joiner {JOINER_MESSAGE_TOKENS} tokens{estimated}")
+    messages = conversation(0)
+    joiner_input = _current_turn(messages)
+    for name, before, after in (
+            ("planner", messages, planner_context(messages)),
+            ("joiner", joiner_input, joiner_context(joiner_input)),
+    ):
+        print(f"{name:>8}: {_tokens(before):>6} -> {_tokens(after):>5} tokens, "
+              f"{len(before)} -> {len(after)} messages, task idx {_idx(after)}")
+    print(f"planner_context: {_per_call_ms(planner_context, cached=False):.2f} ms counting every message, "
+          f"{_per_call_ms(planner_context, cached=True):.2f} ms with counts cached on the messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Planner input over a long conversation, with and without background
+summarization (SUMMARIZE_AFTER_TOKENS / SUMMARY_KEEP_RECENT_TOKENS).
+
+Each simulated turn is a question, a plan thought, a few tool observations
+and an answer, sized like real ones. After each turn the summarizer's own
+split_for_summary / summary_update decide what would be folded, with a
+summary of SUMMARY_TOKENS standing in for the model's. The numbers are the
+message tokens the planner gets at the start of the next turn, and the
+prefill time they cost at the rate time_to_first_tool_model assumes.
+
+Run with: python -m src.evals.conversation_growth
+"""
+import random
+
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage
+from langgraph.graph.message import add_messages
+
+from src.assistant.planning.summarizer import (
+    SUMMARIZE_AFTER_TOKENS,
+    messages_tokens,
+    split_for_summary,
+    summary_update,
+)
+from src.evals.time_to_first_tool_model import PREFILL_TOKENS_PER_SECOND
+
+TURNS = 60
+REPORT_EVERY = 10
+SUMMARY_TOKENS = 250
+_WORDS = "weather forecast lagos rain umbrella temperature wind search result page city train ticket".split()
+
+
+def _text(rng: random.Random, tokens: int) -> str:
+    # About a token per short word
+    return " ".join(rng.choice(_WORDS) for _ in range(tokens))
+
+
+def _turn(rng: random.Random, n: int) -> list:
+    messages = [HumanMessage(content=f"Question {n}: {_text(rng, 20)}"), AIMessage(content=f"Thought: {_text(rng, 30)}")]
+    for idx in range(1, rng.randint(1, 3) + 1):
+        messages.append(FunctionMessage(
+            name="tavily_search_results_json", content=_text(rng, rng.randint(150, 900)), additional_kwargs={"idx": idx}
+        ))
+    messages.append(AIMessage(content=_text(rng, rng.randint(60, 200))))
+    return messages
+
+
+def simulate(summarize: bool, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    messages, sizes = [], []
+    for n in range(1, TURNS + 1):
+        sizes.append(messages_tokens(messages))
+        messages = add_messages(messages, _turn(rng, n))
+        if summarize and messages_tokens(messages) > SUMMARIZE_AFTER_TOKENS:
+            folded, _ = split_for_summary(messages)
+            if folded:
+                messages = add_messages(messages, summary_update(folded, _text(rng, SUMMARY_TOKENS))["messages"])
+    return sizes
+
+
+def main():
+    print(f"{TURNS} turns; summarize after {SUMMARIZE_AFTER_TOKENS} tokens, prefill {PREFILL_TOKENS_PER_SECOND} tok/s")
+    print(f"{'turn':>5} {'tokens':>8} {'prefill s':>9} {'summarized':>11} {'prefill s':>9}")
+    without, with_summaries = simulate(False), simulate(True)
+    for turn in range(REPORT_EVERY, TURNS + 1, REPORT_EVERY):
+        a, b = without[turn - 1], with_summaries[turn - 1]
+        print(f"{turn:>5} {a:>8} {a / PREFILL_TOKENS_PER_SECOND:>9.2f} {b:>11} {b / PREFILL_TOKENS_PER_SECOND:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
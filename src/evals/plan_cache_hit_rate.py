@@ -0,0 +1,121 @@
+"""
+Replays a synthetic stream of recurring questions ("weather in X for N days",
+"remember that I like Y", ...) through the plan-template cache. Misses are
+answered by a stand-in planner that takes PLANNER_SECONDS and builds the plan
+the real one would; its plans are recorded as templates, as plan_and_schedule
+does after a plan runs cleanly.
+
+Reports the hit rate as the stream goes on, the planner time the hits saved,
+how long a lookup costs, and checks every cached plan against the one the
+planner would have made.
+
+Run with: python -m src.evals.plan_cache_hit_rate
+"""
+import random
+import time
+from typing import List, Optional, Tuple
+
+from langchain_core.tools import StructuredTool
+
+from src.assistant.planning.output_parser import Task, _get_dependencies_from_graph
+from src.assistant.planning.plan_templates import PlanTemplateCache
+from src.assistant.planning.tool_index import tool_index
+
+QUESTIONS = 2000
+PLANNER_SECONDS = 1.8
+REPORT_EVERY = 250
+
+CITIES = ["Paris", "Lyon", "Berlin", "Lagos", "Nairobi", "Osaka", "Lima", "Quito", "Oslo", "Accra", "New York"]
+THINGS = ["jazz", "green tea", "long walks", "sci-fi novels", "cycling", "spicy food", "chess"]
+TOPICS = ["solar panels", "the stock market", "electric cars", "the world cup", "quantum computing"]
+
+
+def geocode_location(location: str) -> str:
+    """Coordinates of a place."""
+    return ""
+
+
+def weather_information(location: str, days: int = 3, lang: str = "en") -> str:
+    """Weather forecast."""
+    return ""
+
+
+def store_user_personal_info(info: str) -> str:
+    """Remember something about the user."""
+    return ""
+
+
+def search(query: str, max_results: int = 5) -> str:
+    """Search the web."""
+    return ""
+
+
+TOOLS = [StructuredTool.from_function(f) for f in (geocode_location, weather_information, store_user_personal_info, search)]
+INDEX = tool_index(TOOLS)
+
+
+def _task(idx: int, name: str, args) -> Task:
+    tool = "join" if name == "join" else INDEX[name].tool
+    return Task(idx=idx, tool=tool, args=args, dependencies=_get_dependencies_from_graph(idx, name, args), thought=None)
+
+
+def make_question(rng: random.Random) -> Tuple[str, List[Task]]:
+    """A question and the plan the planner would make for it."""
+    kind = rng.random()
+    if kind < 0.4:
+        city, days = rng.choice(CITIES), rng.randint(1, 7)
+        return f"What's the weather in {city} for {days} days?", [
+            _task(1, "geocode_location", {"location": city}),
+            _task(2, "weather_information", {"location": "$1", "days": days}),
+            _task(3, "join", ()),
+        ]
+    if kind < 0.7:
+        thing = rng.choice(THINGS)
+        return f"Remember that I like {thing}", [
+            _task(1, "store_user_personal_info", {"info": f"likes {thing}"}),
+            _task(2, "join", ()),
+        ]
+    if kind < 0.9:
+        topic = rng.choice(TOPICS)
+        return f"Find the latest news about {topic}", [
+            _task(1, "search", {"query": f"latest news {topic}"}),
+            _task(2, "join", ()),
+        ]
+    # One-off questions the cache should leave to the planner
+    words = " ".join("".join(rng.choice("abcdefghij") for _ in range(6)) for _ in range(3))
+    return f"{words}?", [_task(1, "search", {"query": words}), _task(2, "join", ())]
+
+
+def _same(planned: List[Task], cached: List[Task]) -> bool:
+    def shape(tasks):
+        return [(t["idx"], getattr(t["tool"], "name", t["tool"]), t["args"], t["dependencies"]) for t in tasks]
+
+    return shape(planned) == shape(cached)
+
+
+def main(questions: int = QUESTIONS, seed: int = 0):
+    rng = random.Random(seed)
+    cache = PlanTemplateCache()
+    wrong = 0
+    lookup_seconds = 0.0
+    print(f"{'questions':>9} {'hit rate':>9} {'saved s':>9}")
+    for n in range(1, questions + 1):
+        question, plan = make_question(rng)
+        started = time.perf_counter()
+        cached: Optional[tuple] = cache.lookup(question, INDEX)
+        lookup_seconds += time.perf_counter() - started
+        if cached is None:
+            cache.record(question, plan, PLANNER_SECONDS)
+        elif not _same(plan, cached[1]):
+            wrong += 1
+        if n % REPORT_EVERY == 0:
+            stats = cache.stats()
+            print(f"{n:>9} {stats['hit_rate']:>9.1%} {stats['planner_seconds_saved']:>9.0f}")
+    stats = cache.stats()
+    print(f"\n{stats['size']} templates ({stats['templates_with_slots']} with slots), "
+          f"{stats['low_confidence']} low-confidence misses, {wrong} cached plans differing from the planner's")
+    print(f"Lookup: {lookup_seconds / questions * 1e6:.0f} us on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Microbenchmark for the streaming plan parser on long synthetic plans.
+
+Streams plans of growing length through the parser in small chunks, the way
+the planner's tokens arrive, and reports the cost per KB of plan text. A
+linear parser keeps that number flat as plans grow. The previous line-based
+parser (re-split buffer, two regexes per line, index/split per argument key)
+is kept here as the baseline.
+
+The text scan and argument parsing are measured first (the baseline reads
+`tool.args` per task, as the old parser did; the current one uses the
+toolset's precomputed ToolIndex), then dependency extraction on its own: the
+old rule re-ran the $id regex over the stringified args once per earlier task.
+
+Run with: python -m src.evals.plan_parser_throughput
+"""
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import StructuredTool
+
+from src.assistant.planning.output_parser import (
+    ID_PATTERN,
+    PlanScanner,
+    _ast_parse,
+    _get_dependencies_from_graph,
+    _parse_llm_compiler_action_args,
+)
+from src.assistant.planning.tool_index import tool_index
+
+PLAN_SIZES = (100, 400, 1600, 6400)
+# The old dependency rule is quadratic; keep its runs short
+DEPENDENCY_PLAN_SIZES = (100, 400, 1600)
+CHUNK_SIZE = 4
+# The long-argument case: one task whose args are streamed a few characters at a time
+LONG_ARG_SIZES = (10_000, 100_000, 1_000_000)
+
+LEGACY_THOUGHT_PATTERN = r"Thought: ([^\n]*)"
+LEGACY_ACTION_PATTERN = r"\n*(\d+)\. (\w+)\((.*)\)(\s*#\w+\n)?"
+
+
+def search(query: str, max_results: int = 5, region: Optional[List[str]] = None) -> str:
+    """Search the news."""
+    return ""
+
+
+SEARCH_TOOL = StructuredTool.from_function(func=search)
+
+
+def build_plan(tasks: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for idx in range(1, tasks + 1):
+        if rng.random() < 0.2:
+            lines.append(f"Thought: look up item {idx} and compare it with the previous results")
+        ref = f" about ${rng.randint(1, idx - 1)}" if idx > 1 and rng.random() < 0.5 else ""
+        lines.append(
+            f'{idx}. search(query="news{ref}, (part {idx})", max_results={rng.randint(1, 9)}, region=["eu", "us"])'
+        )
+    lines.append(f"{tasks + 1}. join()")
+    lines.append("<END_OF_PLAN>")
+    return "\n".join(lines)
+
+
+def _chunks(text: str, size: int = CHUNK_SIZE) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _legacy_args(args: str, tool) -> Dict[str, Any]:
+    extracted_args = {}
+    tool_key = None
+    prev_idx = None
+    for key in tool.args.keys():
+        if f"{key}=" in args:
+            idx = args.index(f"{key}=")
+            if prev_idx is not None:
+                extracted_args[tool_key] = _ast_parse(args[prev_idx:idx].strip().rstrip(","))
+            args = args.split(f"{key}=", 1)[1]
+            tool_key = key
+            prev_idx = 0
+    if prev_idx is not None:
+        extracted_args[tool_key] = _ast_parse(args[prev_idx:].strip().rstrip(",").rstrip(")"))
+    return extracted_args
+
+
+def _legacy_line(line: str, parsed: List[Any]):
+    if re.match(LEGACY_THOUGHT_PATTERN, line):
+        return
+    if match := re.match(LEGACY_ACTION_PATTERN, line):
+        parsed.append(_legacy_args(match.group(3), SEARCH_TOOL))
+
+
+def run_legacy(chunks: List[str]) -> int:
+    """The previous ingest_token / _parse_task behaviour."""
+    parsed = []
+    buffer = []
+    for token in chunks:
+        buffer.append(token)
+        if "\n" in token:
+            lines = "".join(buffer).split("\n")
+            for line in lines[:-1]:
+                _legacy_line(line, parsed)
+            buffer.clear()
+            buffer.append(lines[-1])
+    if buffer:
+        _legacy_line("".join(buffer), parsed)
+    return len(parsed)
+
+
+def run_scanner(chunks: List[str]) -> int:
+    parsed = []
+    scanner = PlanScanner()
+    index = tool_index([SEARCH_TOOL])
+    for chunk in chunks:
+        for _, name, args, _ in scanner.feed(chunk):
+            parsed.append(_parse_llm_compiler_action_args(args, index.get(name)))
+    for _, name, args, _ in scanner.finish():
+        parsed.append(_parse_llm_compiler_action_args(args, index.get(name)))
+    return len(parsed)
+
+
+def legacy_dependencies(parsed_args: List[Dict[str, Any]]) -> int:
+    """The previous default_dependency_rule / _get_dependencies_from_graph behaviour."""
+    edges = 0
+    for idx, args in enumerate(parsed_args, start=1):
+        edges += len([i for i in range(1, idx) if i in [int(m) for m in re.findall(ID_PATTERN, str(args))]])
+    return edges
+
+
+def extracted_dependencies(parsed_args: List[Dict[str, Any]]) -> int:
+    return sum(
+        len(_get_dependencies_from_graph(idx, "search", args)) for idx, args in enumerate(parsed_args, start=1)
+    )
+
+
+def _best(runner, chunks, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        runner(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(repeats: int = 3):
+    print(f"Streaming in {CHUNK_SIZE}-character chunks; best of {repeats}")
+    print(f"{'tasks':>7} {'KB':>8} {'legacy us/KB':>13} {'scanner us/KB':>14}")
+    for tasks in PLAN_SIZES:
+        plan = build_plan(tasks)
+        chunks = _chunks(plan)
+        assert run_legacy(chunks) == run_scanner(chunks) == tasks + 1
+        kb = len(plan) / 1024
+        legacy, scanner = (_best(runner, chunks, repeats) for runner in (run_legacy, run_scanner))
+        print(f"{tasks:>7} {kb:>8.1f} {legacy / kb * 1e6:>13.1f} {scanner / kb * 1e6:>14.1f}")
+
+    print("\nOne task with a long argument")
+    print(f"{'arg KB':>7} {'legacy us/KB':>13} {'scanner us/KB':>14}")
+    for size in LONG_ARG_SIZES:
+        plan = f'1. search(query="{"x" * size}", max_results=3)\n2. join()\n'
+        chunks = _chunks(plan)
+        kb = len(plan) / 1024
+        legacy, scanner = (_best(runner, chunks, repeats) for runner in (run_legacy, run_scanner))
+        print(f"{size / 1024:>7.0f} {legacy / kb * 1e6:>13.1f} {scanner / kb * 1e6:>14.1f}")
+
+    print("\nDependency extraction")
+    print(f"{'tasks':>7} {'legacy us/task':>15} {'current us/task':>16}")
+    for tasks in DEPENDENCY_PLAN_SIZES:
+        scanner = PlanScanner()
+        parsed_args = [
+            _parse_llm_compiler_action_args(args, tool_index([SEARCH_TOOL]).get(name))
+            for _, name, args, _ in scanner.feed(build_plan(tasks)) if name != "join"
+        ]
+        assert legacy_dependencies(parsed_args) == extracted_dependencies(parsed_args)
+        legacy, current = (
+            _best(runner, parsed_args, repeats) for runner in (legacy_dependencies, extracted_dependencies)
+        )
+        print(f"{tasks:>7} {legacy / tasks * 1e6:>15.1f} {current / tasks * 1e6:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
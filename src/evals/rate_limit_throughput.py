@@ -0,0 +1,149 @@
+"""
+Throughput against a rate-limited provider, with and without the tool throttle.
+
+A local fake HTTP provider allows LIMIT requests per sliding one-second window
+and answers 429 with Retry-After once the window is full. Like most real
+providers, refused requests still count towards the window, so clients that
+retry aggressively keep the window full and get starved.
+
+- naive: the old behaviour, every call fired at once on a large pool and
+  retried shortly after a 429.
+- throttled: calls go through DAGExecutor + ToolExecutor gated by ToolThrottle
+  (token bucket at the provider limit, honouring Retry-After).
+
+Run with: python -m src.evals.rate_limit_throughput
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.assistant.planning.dag_executor import DAGExecutor, TaskRequeued
+from src.assistant.planning.tool_executor import ToolExecutor
+from src.assistant.planning.tool_policies import ToolPolicy
+from src.assistant.planning.tool_throttle import ToolThrottle
+from src.assistant.tools.rate_limit import RateLimited, raise_for_rate_limit
+
+LIMIT = 20  # requests per second
+CALLS = 200
+PROVIDER_LATENCY = 0.02
+
+
+class _FakeProvider(BaseHTTPRequestHandler):
+    window = deque()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] > 1.0:
+                self.window.popleft()
+            allowed = len(self.window) < LIMIT
+            self.window.append(now)
+        time.sleep(PROVIDER_LATENCY)
+        if allowed:
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"{}")
+        else:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_provider():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def _call(session, url):
+    response = session.get(url, timeout=10)
+    raise_for_rate_limit(response)
+    return response.json()
+
+
+def run_naive(url):
+    stats = {"ok": 0, "429": 0, "failed": 0}
+    lock = threading.Lock()
+    session = requests.Session()
+
+    def call_with_retries():
+        for _ in range(50):
+            try:
+                _call(session, url)
+                with lock:
+                    stats["ok"] += 1
+                return
+            except RateLimited:
+                with lock:
+                    stats["429"] += 1
+                time.sleep(0.05)
+        with lock:
+            stats["failed"] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        wait([executor.submit(call_with_retries) for _ in range(CALLS)])
+    return stats, time.perf_counter() - start
+
+
+def run_throttled(url):
+    stats = {"ok": 0, "429": 0, "failed": 0}
+    lock = threading.Lock()
+    session = requests.Session()
+    policy = ToolPolicy(rate=LIMIT, burst=1, max_concurrency=8, max_retries=50)
+    throttle = ToolThrottle(lambda name: policy)
+    executor = ToolExecutor(max_workers=32, max_queue_size=CALLS)
+
+    def run_task(task):
+        rate_limited = None
+        try:
+            _call(session, url)
+            with lock:
+                stats["ok"] += 1
+        except RateLimited as e:
+            rate_limited = e
+            with lock:
+                stats["429"] += 1
+            raise TaskRequeued() from e
+        finally:
+            throttle.release("provider", rate_limited)
+
+    dag = DAGExecutor(
+        executor,
+        run_task,
+        admit=lambda task, on_ready: throttle.acquire_or_wait("provider", on_ready),
+    )
+    start = time.perf_counter()
+    for idx in range(1, CALLS + 1):
+        dag.submit({"idx": idx, "tool": "provider", "args": {}, "dependencies": []})
+    dag.join()
+    elapsed = time.perf_counter() - start
+    executor.shutdown()
+    return stats, elapsed
+
+
+def main():
+    print(f"Provider limit: {LIMIT} req/s (sliding window), {CALLS} calls")
+    for name, runner in (("naive", run_naive), ("throttled", run_throttled)):
+        server, url = _start_provider()
+        _FakeProvider.window.clear()
+        stats, elapsed = runner(url)
+        server.shutdown()
+        print(
+            f"{name:>10}: {stats['ok'] / elapsed:6.1f} successful req/s "
+            f"({stats['ok']} ok, {stats['failed']} failed, {stats['429']} x 429) in {elapsed:.1f}s"
+        )
+        # Let the provider window drain between runs
+        time.sleep(1.1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to import the planner
+(and whatever else is listed in MODULES), which is what every new server
+process or worker pays before it can take a request.
+
+Each module is imported in its own subprocess, several times, and the median
+is reported. Pass --hub to also time the LangChain Hub pull that planner.py
+used to do at import (needs network and the langchain package).
+
+Run with: python -m src.evals.startup_time [--hub]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = (
+    "src.assistant.planning.output_parser",
+    "src.assistant.planning.planner",
+    "src.assistant.planning.prompt_cache",
+)
+RUNS = 5
+
+
+def time_import(module: str, runs: int = RUNS) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, stdin=subprocess.DEVNULL, check=True
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def time_hub_pull(runs: int = RUNS) -> float:
+    from langchain import hub
+
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        hub.pull("wfh/llm-compiler")
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    print(f"Median of {RUNS} fresh interpreters")
+    for module in MODULES:
+        print(f"{module:>42}: {time_import(module) * 1000:8.1f} ms")
+    if "--hub" in sys.argv:
+        print(f"{'hub.pull(wfh/llm-compiler)':>42}: {time_hub_pull() * 1000:8.1f} ms (previously paid at import)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+A model (not a measurement) of time to first tool: from the user's message
+until the first plan task can be dispatched, for the two ways of choosing tool
+categories (CATEGORY_SELECTION):
+
+- separate: select_tool_categories makes a structured-output call, then the
+  planner is called with only the selected categories' tools;
+- separate, local: the same, with the local classifier answering instead
+  of the LLM;
+- planner: a single planner call that sees every tool grouped by category.
+
+The prompts are the real ones (planner and category prompts, rendered with
+the tool description styles) over stand-ins with the registry's tool names
+and categories; token counts come from count_tokens. Nothing is called: each
+LLM call is a round trip with log-normal jitter, prefill proportional to the
+prompt, and decode of the selector's answer or the first plan line, at the
+assumed rates below. The output is only as good as those rates, so set them
+to what your provider shows; it compares the modes' prompt sizes, it doesn't
+time the graph.
+
+Run with: python -m src.evals.time_to_first_tool_model
+"""
+import json
+import random
+import statistics
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel
+
+from src.assistant.planning.prompts import TOOL_CATEGORY_PROMPT, base_planner_prompt
+from src.assistant.planning.token_count import count_tokens
+from src.assistant.planning.tool_descriptions import render_categorized_tool_descriptions, render_tool_descriptions
+
+SAMPLES = 2000
+# Assumed, not measured
+RTT_SECONDS = 0.35
+RTT_SIGMA = 0.35
+PREFILL_TOKENS_PER_SECOND = 4000
+DECODE_TOKENS_PER_SECOND = 60
+# Categories plus a one-line explanation
+SELECTOR_OUTPUT_TOKENS = 60
+# "Thought: ..." and the first "1. tool(...)" line
+FIRST_ACTION_TOKENS = 30
+
+_USAGE_NOTES = " - Use it only when the question needs it; pass earlier outputs as $id.\n" * 4
+
+
+def _tool(name: str, signature: str, summary: str) -> StructuredTool:
+    def run(**kwargs) -> str:
+        return ""
+
+    return StructuredTool.from_function(
+        func=run, name=name, description=f" - {summary}\n - Tool signature: {signature}\n{_USAGE_NOTES}"
+    )
+
+
+class Category(BaseModel):
+    name: str
+    description: str
+    tools: List[StructuredTool]
+
+
+# Mirrors tool_categories.py; search and image_url_interpreter are registered
+# but in no category
+_math = _tool("math", "math(problem: str, context: Optional[list[str]]) -> float", "Solves math problems.")
+_extract = _tool("tavily_extract", "tavily_extract(urls: list[str]) -> dict", "Raw content of web pages.")
+CATEGORIES = [
+    Category(name="Computation", description="Tools for performing computations and scientific tasks.",
+             tools=[_math]),
+    Category(name="Location Information", description="Tools for geolocation, mapping, and location-based tasks.",
+             tools=[
+                 _tool("geocode_location", "geocode_location(location: str) -> dict", "Coordinates of a place."),
+                 _tool("reverse_geocode", "reverse_geocode(lat: float, lon: float) -> str", "Place at coordinates."),
+                 _tool("get_current_location", "get_current_location() -> dict", "The user's current location."),
+             ]),
+    Category(name="Weather Information", description="Tools for weather forecast and information.", tools=[
+        _tool("weather_forecast", "weather_forecast(lat: float, lon: float) -> dict", "Weather forecast."),
+    ]),
+    Category(name="Content Extraction", description="Tools for extracting content from various sources.",
+             tools=[_extract]),
+    Category(name="User Personal Info Management",
+             description="Tools for storing and retrieving user personal information.", tools=[
+            _tool("store_user_personal_info", "store_user_personal_info(info: str) -> str", "Remembers a fact."),
+            _tool("retrieve_user_personal_info", "retrieve_user_personal_info(query: str) -> str", "Recalls facts."),
+        ]),
+    Category(name="Web browsing", description="Tools for browsing the web", tools=[
+        _extract,
+        _tool("browser_task", "browser_task(task: str) -> str", "Carries out a task in a browser."),
+    ]),
+]
+ALL_TOOLS = list({tool.name: tool for category in CATEGORIES for tool in category.tools}.values()) + [
+    _tool("tavily_search_results_json", "tavily_search_results_json(query: str) -> list", "A search engine."),
+    _tool("image_url_interpreter", "image_url_interpreter(url: str, question: str) -> str", "Describes an image."),
+]
+QUESTION = "What's the weather like in Lagos this weekend, and should I pack an umbrella?"
+
+
+def _planner_prompt_tokens(tool_descriptions: str, num_tools: int) -> int:
+    messages = base_planner_prompt.format_messages(
+        messages=[HumanMessage(content=QUESTION)], replan="", num_tools=num_tools + 1,
+        tool_descriptions=tool_descriptions,
+    )
+    return sum(count_tokens(message.content) for message in messages)
+
+
+def _selector_prompt_tokens() -> int:
+    summaries = {
+        category.name: [{"name": tool.name, "description": tool.description.split("\n")[0]} for tool in category.tools]
+        for category in CATEGORIES
+    }
+    return count_tokens(TOOL_CATEGORY_PROMPT.format(tool_categories=json.dumps(summaries))) + count_tokens(QUESTION)
+
+
+def _call(rng: random.Random, prompt_tokens: int, output_tokens: int) -> float:
+    rtt = RTT_SECONDS * rng.lognormvariate(0, RTT_SIGMA)
+    speed = rng.lognormvariate(0, 0.15)
+    return rtt + (prompt_tokens / PREFILL_TOKENS_PER_SECOND + output_tokens / DECODE_TOKENS_PER_SECOND) * speed
+
+
+def _selected_tools(rng: random.Random) -> Sequence[StructuredTool]:
+    chosen = rng.sample(CATEGORIES, rng.choice((1, 1, 2)))
+    return [tool for category in chosen for tool in category.tools]
+
+
+def simulate(style: str, seed: int = 0) -> Dict[str, List[float]]:
+    rng = random.Random(seed)
+    selector_tokens = _selector_prompt_tokens()
+    single_tokens = _planner_prompt_tokens(
+        render_categorized_tool_descriptions(ALL_TOOLS, CATEGORIES, style), len(ALL_TOOLS)
+    )
+    results = {"separate": [], "separate, local": [], "planner": []}
+    for _ in range(SAMPLES):
+        tools = _selected_tools(rng)
+        planner_tokens = _planner_prompt_tokens(render_tool_descriptions(tools, style), len(tools))
+        select = _call(rng, selector_tokens, SELECTOR_OUTPUT_TOKENS)
+        plan = _call(rng, planner_tokens, FIRST_ACTION_TOKENS)
+        results["separate"].append(select + plan)
+        results["separate, local"].append(plan)
+        results["planner"].append(_call(rng, single_tokens, FIRST_ACTION_TOKENS))
+    return results
+
+
+def _percentiles(samples: List[float]) -> Tuple[float, float]:
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49], cuts[94]
+
+
+def main():
+    print(f"{SAMPLES} modelled turns at assumed rates; RTT {RTT_SECONDS}s, prefill {PREFILL_TOKENS_PER_SECOND} tok/s, "
+          f"decode {DECODE_TOKENS_PER_SECOND} tok/s")
+    print(f"{'descriptions':>12} {'mode':>16} {'p50 s':>7} {'p95 s':>7}")
+    for style in ("long", "compact"):
+        for mode, samples in simulate(style).items():
+            p50, p95 = _percentiles(samples)
+            print(f"{style:>12} {mode:>16} {p50:>7.2f} {p95:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Token cost of the planner's tool descriptions in each TOOL_DESCRIPTION_STYLE,
+per tool and per category, plus the whole rendered tool list for the full
+registry. That list is part of every plan and replan prompt.
+
+Counts use tiktoken when it is installed, otherwise a ~4 characters per token
+estimate (flagged in the output).
+
+Run with: python -m src.evals.tool_description_tokens
+"""
+from src.assistant.planning.token_count import count_tokens, tokens_are_estimated
+from src.assistant.planning.tool_descriptions import STYLES, description_tokens, render_tool_descriptions
+from src.assistant.tools.tool_categories import tool_categories
+from src.assistant.tools.tool_registry import tools_registry
+
+
+def _row(name: str, counts) -> str:
+    return f"{name:<36} " + " ".join(f"{counts[style]:>8}" for style in STYLES)
+
+
+def main():
+    if tokens_are_estimated():
+        print("tiktoken is not installed; token counts are estimated from text length\n")
+    header = f"{'':<36} " + " ".join(f"{style:>8}" for style in STYLES)
+
+    tools = tools_registry.get_all_tools()
+    print("Per tool")
+    print(header)
+    per_tool = {tool.name: description_tokens(tool) for tool in tools}
+    for name, counts in sorted(per_tool.items(), key=lambda item: -item[1]["long"]):
+        print(_row(name, counts))
+
+    print("\nPer category")
+    print(header)
+    for category in tool_categories:
+        counts = {
+            style: sum(description_tokens(tool)[style] for tool in category.tools) for style in STYLES
+        }
+        print(_row(category.name, counts))
+
+    print("\nFull registry tool list, as rendered into the planner prompt")
+    print(header)
+    print(_row(f"{len(tools)} tools", {
+        style: count_tokens(render_tool_descriptions(tools, style)) for style in STYLES
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,17 +12,38 @@ load_dotenv()
 
 app_name = os.getenv("APP_NAME")
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from logger import configured_logger
+from src.assistant.planning.instrumentation import recent_timelines, recent_timelines_lock, recent_traces
+from src.assistant.planning.latency_model import tool_latency_model
+from src.assistant.planning.observation_memo import observation_memo
+from src.assistant.planning.plan_templates import plan_template_cache
+from src.assistant.planning.speculative import speculation_stats
+from src.assistant.planning.summarizer import background_summarizer
+from src.assistant.planning.task_fetching_unit import planner_cache
+from src.assistant.planning.tool_executor import (
+    get_tool_executor,
+    shutdown_tool_executor,
+    start_tool_executor,
+)
+from src.assistant.planning.tool_throttle import tool_throttle
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     configured_logger.info(f"Starting {app_name} Service...")
+    # One bounded tool-execution pool for the whole process, shared by every
+    # request's plans and replans.
+    start_tool_executor()
     try:
         yield
     finally:
+        shutdown_tool_executor()
+        try:
+            tool_latency_model.save()
+        except Exception as e:
+            configured_logger.warning(f"Could not save tool latencies on shutdown: {e}")
         configured_logger.info(f"Shutting down {app_name} Service...")
 
 
@@ -49,5 +70,64 @@ async def root():
     return {"detail": f"Welcome to the Root of the {app_name} Service!"}
 
 
+@app.get("/metrics/tool-executor", response_class=JSONResponse)
+async def tool_executor_metrics():
+    return get_tool_executor().metrics()
+
+
+@app.get("/metrics/tool-throttle", response_class=JSONResponse)
+async def tool_throttle_metrics():
+    return tool_throttle.stats()
+
+
+@app.get("/metrics/tool-latency", response_class=JSONResponse)
+async def tool_latency_metrics():
+    return tool_latency_model.stats()
+
+
+@app.get("/metrics/observation-memo", response_class=JSONResponse)
+async def observation_memo_metrics():
+    return observation_memo.stats()
+
+
+@app.get("/metrics/planner-cache", response_class=JSONResponse)
+async def planner_cache_metrics():
+    return planner_cache.stats()
+
+
+@app.get("/metrics/plan-cache", response_class=JSONResponse)
+async def plan_cache_metrics():
+    return plan_template_cache.stats()
+
+
+@app.get("/metrics/speculative-planning", response_class=JSONResponse)
+async def speculative_planning_metrics():
+    return speculation_stats.stats()
+
+
+@app.get("/metrics/summaries", response_class=JSONResponse)
+async def summary_metrics():
+    return background_summarizer.stats()
+
+
+@app.get("/traces", response_class=JSONResponse)
+async def list_traces():
+    """Recent plans, newest first, with their timing summary."""
+    return [
+        {"request_id": request_id, "created_at": timeline.created_at, **timeline.summary()}
+        for request_id, timeline in reversed(recent_traces())
+    ]
+
+
+@app.get("/traces/{request_id}", response_class=JSONResponse)
+async def get_trace(request_id: str):
+    """Chrome trace JSON for one plan; load it in ui.perfetto.dev or chrome://tracing."""
+    with recent_timelines_lock:
+        timeline = recent_timelines.get(request_id)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail=f"No trace for request {request_id}")
+    return timeline.chrome_trace()
+
+
 if __name__ == "__main__":
     uvicorn.run("server:app", host="127.0.0.1", port=8002, reload=True)
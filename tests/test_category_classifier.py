@@ -0,0 +1,75 @@
+from src.assistant.planning.category_classifier import (
+    CategoryClassifier,
+    CategoryModel,
+    keyword_categories,
+    load_model,
+    load_traces,
+    record_trace,
+    train,
+)
+
+CATEGORIES = ["Weather Information", "Location Information", "Computation", "Web browsing"]
+SURE, UNSURE, NO = 10.0, 0.0, -10.0
+
+
+def _model(examples=1000, **bias):
+    # Bias only: every message gets the same probabilities
+    biases = {category: bias.get(category.split()[0].lower(), NO) for category in CATEGORIES}
+    return CategoryModel(CATEGORIES, {}, {c: {} for c in CATEGORIES}, biases, examples)
+
+
+def test_defers_to_the_llm_without_a_trusted_model():
+    question = "What's the weather in Paris?"
+    assert keyword_categories(question) == ["Weather Information", "Location Information"]
+    assert CategoryClassifier(CATEGORIES).classify(question) is None
+    assert CategoryClassifier(CATEGORIES, _model(examples=10), min_examples=200).classify(question) is None
+
+
+def test_confident_model_picks_in_registry_order():
+    classifier = CategoryClassifier(CATEGORIES, _model(computation=SURE, weather=SURE))
+    assert classifier.classify("anything") == ["Weather Information", "Computation"]
+    assert classifier.stats()["local"] == 1
+
+
+def test_defers_when_the_model_is_unsure_or_picks_nothing():
+    assert CategoryClassifier(CATEGORIES, _model(weather=SURE, computation=UNSURE)).classify("anything") is None
+    assert CategoryClassifier(CATEGORIES, _model()).classify("anything") is None
+
+
+def test_keywords_only_add_to_the_model():
+    model = _model(computation=SURE)
+    classifier = CategoryClassifier(CATEGORIES, model)
+    assert classifier.classify("the temperature in SF to the 3rd power") == [
+        "Weather Information", "Location Information", "Computation"
+    ]
+    assert CategoryClassifier(CATEGORIES, model, keywords=False).classify("the temperature in SF") == ["Computation"]
+    # A keyword doesn't settle a category the model is unsure of
+    unsure = CategoryClassifier(CATEGORIES, _model(computation=SURE, web=UNSURE))
+    assert unsure.classify("what's the weather") is None
+    assert unsure.stats()["deferred_to_llm"] == 1
+
+
+def test_model_for_other_categories_is_ignored():
+    classifier = CategoryClassifier(CATEGORIES[:2], _model(weather=SURE))
+    assert classifier.model is None
+    assert classifier.classify("weather") is None
+
+
+def test_trained_model_round_trips(tmp_path, monkeypatch):
+    traces = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("CATEGORY_TRACES", str(traces))
+    for city in ("Paris", "Lyon", "Oslo", "Lima"):
+        record_trace(f"how warm is it in {city} today", ["Weather Information", "Location Information"])
+        record_trace(f"what is 17 times {len(city)}", ["Computation"])
+    with traces.open("a") as f:
+        f.write("not json\n")
+    assert len(load_traces()) == 8
+
+    path = tmp_path / "model.json"
+    trained = train(CATEGORIES, path=path)
+    loaded = load_model(path)
+    assert loaded.examples == trained.examples == 8
+    probabilities = loaded.predict_proba("how warm is it in Quito today")
+    assert probabilities == trained.predict_proba("how warm is it in Quito today")
+    assert probabilities["Weather Information"] > 0.5 > probabilities["Computation"]
+    assert load_model(tmp_path / "missing.json") is None
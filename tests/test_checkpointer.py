@@ -0,0 +1,139 @@
+import asyncio
+import sqlite3
+from typing import Annotated
+
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage, RemoveMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from src.assistant.planning.checkpointer import DeltaSqliteSaver
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+    summary: str
+
+
+def _graph(saver):
+    # Shaped like the agent: a plan step adding observations, then an answer
+    def plan_and_schedule(state: State):
+        # "question 3" -> 3
+        turn = state["messages"][-1].content.split()[-1]
+        return {"messages": [
+            AIMessage(content=f"Thought: turn {turn}"),
+            FunctionMessage(name="search", content=f"result {turn}", additional_kwargs={"idx": 1}),
+        ]}
+
+    def join(state: State):
+        return {"messages": [AIMessage(content=f"answer to {state['messages'][-3].content}")]}
+
+    builder = StateGraph(State)
+    builder.add_node("plan_and_schedule", plan_and_schedule)
+    builder.add_node("join", join)
+    builder.add_edge(START, "plan_and_schedule")
+    builder.add_edge("plan_and_schedule", "join")
+    builder.add_edge("join", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _config(thread_id="thread"):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _contents(app, config):
+    return [message.content for message in app.get_state(config).values.get("messages", [])]
+
+
+def _expected(turns):
+    return [
+        content
+        for turn in range(1, turns + 1)
+        for content in (f"question {turn}", f"Thought: turn {turn}", f"result {turn}", f"answer to question {turn}")
+    ]
+
+
+def _count(path, table, thread_id="thread"):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+
+
+def test_state_round_trips_through_deltas(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    app = _graph(DeltaSqliteSaver(path, keep=0, snapshot_every=3))
+    for turn in range(1, 6):
+        app.invoke({"messages": [HumanMessage(content=f"question {turn}")]}, _config())
+    assert _contents(app, _config()) == _expected(5)
+    with sqlite3.connect(path) as conn:
+        kinds = {kind for kind, in conn.execute("SELECT kind FROM blobs WHERE channel = 'messages'")}
+    assert {"delta", "full"} <= kinds
+
+    # A new saver has none of the first one's caches
+    reopened = _graph(DeltaSqliteSaver(path, keep=0, snapshot_every=3))
+    assert _contents(reopened, _config()) == _expected(5)
+    assert _contents(reopened, _config("other")) == []
+    reopened.invoke({"messages": [HumanMessage(content="question 6")]}, _config())
+    assert _contents(reopened, _config()) == _expected(6)
+
+
+def test_history_and_earlier_checkpoints_are_readable(tmp_path):
+    app = _graph(DeltaSqliteSaver(tmp_path / "checkpoints.sqlite", keep=0))
+    for turn in range(1, 4):
+        app.invoke({"messages": [HumanMessage(content=f"question {turn}")]}, _config())
+    history = list(app.get_state_history(_config()))
+    lengths = [len(snapshot.values.get("messages", [])) for snapshot in history]
+    assert lengths == sorted(lengths, reverse=True)
+    after_first_turn = next(s for s in history if len(s.values.get("messages", [])) == 4)
+    assert [m.content for m in after_first_turn.values["messages"]] == _expected(1)
+
+
+def test_removed_messages_are_stored_in_full(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    app = _graph(DeltaSqliteSaver(path, keep=0))
+    for turn in range(1, 3):
+        app.invoke({"messages": [HumanMessage(content=f"question {turn}")]}, _config())
+    messages = app.get_state(_config()).values["messages"]
+    # What the summarizer's write-back does
+    app.update_state(_config(), {"messages": [RemoveMessage(id=m.id) for m in messages[:4]], "summary": "s"})
+    assert _contents(app, _config()) == _expected(2)[4:]
+    app.invoke({"messages": [HumanMessage(content="question 3")]}, _config())
+    assert _contents(_graph(DeltaSqliteSaver(path, keep=0)), _config()) == _expected(3)[4:]
+
+
+def test_compaction_keeps_the_latest_checkpoints(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    saver = DeltaSqliteSaver(path, keep=0, snapshot_every=4)
+    app = _graph(saver)
+    for turn in range(1, 9):
+        app.invoke({"messages": [HumanMessage(content=f"question {turn}")]}, _config())
+    checkpoints, blobs = _count(path, "checkpoints"), _count(path, "blobs")
+    assert saver.compact("thread", keep=2) == checkpoints - 2
+    assert _count(path, "checkpoints") == 2
+    assert _count(path, "blobs") < blobs
+    assert _contents(_graph(DeltaSqliteSaver(path, keep=0)), _config()) == _expected(8)
+
+
+def test_threads_compact_as_they_go_and_can_be_deleted(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    saver = DeltaSqliteSaver(path, keep=4)
+    app = _graph(saver)
+    for turn in range(1, 7):
+        app.invoke({"messages": [HumanMessage(content=f"question {turn}")]}, _config())
+        app.invoke({"messages": [HumanMessage(content=f"question {turn}")]}, _config("other"))
+    assert _count(path, "checkpoints") < 4 * 2
+    assert _contents(app, _config()) == _expected(6)
+    saver.delete_thread("thread")
+    assert _contents(app, _config()) == []
+    assert _count(path, "blobs") == 0
+    assert _contents(app, _config("other")) == _expected(6)
+
+
+def test_async_round_trip(tmp_path):
+    app = _graph(DeltaSqliteSaver(tmp_path / "checkpoints.sqlite", keep=3))
+
+    async def main():
+        for turn in range(1, 4):
+            await app.ainvoke({"messages": [HumanMessage(content=f"question {turn}")]}, _config())
+        return [m.content for m in (await app.aget_state(_config())).values["messages"]]
+
+    assert asyncio.run(main()) == _expected(3)
@@ -0,0 +1,89 @@
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage, SystemMessage
+
+from src.assistant.planning.context_window import build_context, cut_observation
+from src.assistant.planning.summarizer import SUMMARY_NAME
+from src.assistant.planning.token_count import message_tokens
+
+
+def _observation(idx, content, name="search"):
+    return FunctionMessage(name=name, content=content, additional_kwargs={"idx": idx, "args": {"query": "q"}})
+
+
+def _words(word, count):
+    return " ".join(f"{word}{i}" for i in range(count))
+
+
+def _turn(n, observation_words=200):
+    return [
+        HumanMessage(content=f"question {n}"),
+        AIMessage(content=f"Thought: look up {n}"),
+        _observation(1, _words(f"t{n}x", observation_words)),
+        AIMessage(content=f"answer {n}"),
+    ]
+
+
+def _tokens(messages):
+    return sum(message_tokens(message) for message in messages)
+
+
+def test_no_budget_sends_everything():
+    messages = _turn(1) + _turn(2)
+    assert build_context(messages, 0) == messages
+
+
+def test_context_within_budget_is_unchanged():
+    messages = _turn(1) + _turn(2)
+    assert build_context(messages, _tokens(messages)) == messages
+
+
+def test_oldest_turns_are_dropped_first():
+    messages = _turn(1) + _turn(2) + _turn(3)
+    budget = _tokens(messages[4:])
+    assert build_context(messages, budget) == messages[4:]
+    assert build_context(messages, budget - 1) == messages[8:]
+
+
+def test_summary_and_current_turn_are_always_kept():
+    summary = SystemMessage(content="Summary of the conversation so far: ...", name=SUMMARY_NAME)
+    messages = [summary] + _turn(1) + _turn(2)
+    context = build_context(messages, _tokens([summary] + messages[5:]))
+    assert context == [summary] + messages[5:]
+
+
+def test_current_turn_over_budget_has_its_observations_cut():
+    messages = _turn(1) + _turn(2, observation_words=3000)
+    budget = 800
+    context = build_context(messages, budget)
+    assert _tokens(context) <= budget
+    assert [type(m) for m in context] == [type(m) for m in messages[4:]]
+    cut = context[2]
+    assert "tokens cut" in cut.content
+    assert cut.content.startswith("t2x0 ") and cut.content.endswith(" t2x2999")
+    # Cut messages are copies; the thread keeps the original
+    assert cut.additional_kwargs == messages[6].additional_kwargs
+    assert "tokens cut" not in messages[6].content
+
+
+def test_observation_cap_applies_to_every_turn():
+    messages = _turn(1, observation_words=1000)
+    context = build_context(messages, 100000, observation_tokens=100)
+    assert message_tokens(context[2]) < message_tokens(messages[2])
+    assert message_tokens(context[2]) <= 120
+
+
+def test_repeated_observations_point_to_the_first():
+    search = _words("r", 200)
+    messages = [HumanMessage(content="q"), _observation(1, search), _observation(2, search), _observation(3, "short")]
+    context = build_context(messages, 100000)
+    assert context[1] is messages[1]
+    assert context[2].content == "Same result as search (task 1) above."
+    assert context[2].additional_kwargs["idx"] == 2
+    assert context[3] is messages[3]
+
+
+def test_cut_observation_keeps_head_and_tail():
+    message = _observation(1, _words("w", 2000))
+    cut = cut_observation(message, 100)
+    assert cut.content.startswith("w0 ")
+    assert cut.content.endswith(" w1999")
+    assert cut_observation(message, message_tokens(message)) is message
@@ -0,0 +1,192 @@
+import asyncio
+import gc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.assistant.planning.dag_executor import AsyncDAGExecutor, DAGExecutor, TaskFailed, TaskRequeued
+
+
+def _task(idx, dependencies=()):
+    return {"idx": idx, "tool": "tool", "args": {}, "dependencies": list(dependencies), "thought": None}
+
+
+def _plan():
+    # 3 waits on 1 and 2, 4 on 3; dependents are submitted before what they wait on
+    return [_task(4, [3]), _task(3, [1, 2]), _task(1), _task(2)]
+
+
+def _run_plan(tasks, run_task, **kwargs):
+    with ThreadPoolExecutor(4) as pool:
+        dag = DAGExecutor(pool, run_task, **kwargs)
+        for task in tasks:
+            dag.submit(task)
+        return dag.join()
+
+
+def test_dependents_run_after_their_dependencies():
+    order, lock = [], threading.Lock()
+
+    def run_task(task):
+        with lock:
+            order.append(task["idx"])
+
+    assert _run_plan(_plan(), run_task) == []
+    assert sorted(order) == [1, 2, 3, 4]
+    assert order.index(3) > max(order.index(1), order.index(2))
+    assert order.index(4) > order.index(3)
+
+
+def test_completed_dependencies_release_right_away():
+    ran = []
+    # 1 is an observation from a previous plan
+    assert _run_plan([_task(2, [1])], lambda task: ran.append(task["idx"]), completed=[1]) == []
+    assert ran == [2]
+
+
+def test_failure_cancels_dependents_transitively():
+    ran, cancelled = [], []
+
+    def run_task(task):
+        ran.append(task["idx"])
+        if task["idx"] == 1:
+            raise TaskFailed()
+
+    tasks = [_task(2, [1]), _task(3, [2]), _task(1), _task(4)]
+    _run_plan(tasks, run_task, on_cancelled=lambda task, failed_dep: cancelled.append((task["idx"], failed_dep)))
+    assert sorted(ran) == [1, 4]
+    assert sorted(cancelled) == [(2, 1), (3, 2)]
+
+
+def test_task_submitted_after_its_dependency_failed_is_cancelled():
+    cancelled = []
+
+    def run_task(task):
+        raise TaskFailed()
+
+    with ThreadPoolExecutor(2) as pool:
+        dag = DAGExecutor(pool, run_task, on_cancelled=lambda task, failed_dep: cancelled.append(task["idx"]))
+        dag.submit(_task(1))
+        dag.join()
+        dag.submit(_task(2, [1]))
+        dag.join()
+    assert cancelled == [2]
+
+
+def test_requeued_task_runs_again_before_its_dependents():
+    order, attempts = [], {}
+
+    def run_task(task):
+        attempts[task["idx"]] = attempts.get(task["idx"], 0) + 1
+        if task["idx"] == 1 and attempts[1] == 1:
+            raise TaskRequeued()
+        order.append(task["idx"])
+
+    _run_plan([_task(2, [1]), _task(1)], run_task)
+    assert attempts == {1: 2, 2: 1}
+    assert order == [1, 2]
+
+
+def test_join_returns_tasks_waiting_on_unknown_indices():
+    unresolvable = _run_plan([_task(1), _task(2, [99])], lambda task: None)
+    assert [task["idx"] for task in unresolvable] == [2]
+
+
+def test_rejected_task_counts_as_failed():
+    rejected, cancelled = [], []
+    pool = ThreadPoolExecutor(1)
+    pool.shutdown()
+    dag = DAGExecutor(
+        pool,
+        lambda task: None,
+        on_rejected=lambda task, e: rejected.append(task["idx"]),
+        on_cancelled=lambda task, failed_dep: cancelled.append(task["idx"]),
+    )
+    dag.submit(_task(2, [1]))
+    dag.submit(_task(1))
+    assert dag.join() == []
+    assert rejected == [1]
+    assert cancelled == [2]
+
+
+def _run_async_plan(tasks, run_task, **kwargs):
+    async def main():
+        dag = AsyncDAGExecutor(run_task, **kwargs)
+        for task in tasks:
+            dag.submit(task)
+        return await dag.join()
+
+    return asyncio.run(main())
+
+
+def test_async_dependents_run_after_their_dependencies():
+    order = []
+
+    async def run_task(task):
+        # The later a task is submitted, the sooner it finishes
+        await asyncio.sleep(0.01 * (5 - task["idx"]))
+        order.append(task["idx"])
+
+    assert _run_async_plan(_plan(), run_task) == []
+    assert sorted(order) == [1, 2, 3, 4]
+    assert order.index(3) > max(order.index(1), order.index(2))
+    assert order.index(4) > order.index(3)
+
+
+def test_async_failure_cancels_dependents_transitively():
+    ran, cancelled = [], []
+
+    async def run_task(task):
+        ran.append(task["idx"])
+        if task["idx"] == 1:
+            raise TaskFailed()
+
+    tasks = [_task(2, [1]), _task(3, [2]), _task(1), _task(4)]
+    _run_async_plan(tasks, run_task, on_cancelled=lambda task, failed_dep: cancelled.append((task["idx"], failed_dep)))
+    assert sorted(ran) == [1, 4]
+    assert sorted(cancelled) == [(2, 1), (3, 2)]
+
+
+def test_async_unexpected_error_fails_the_task():
+    ran, cancelled = [], []
+
+    async def run_task(task):
+        ran.append(task["idx"])
+        if task["idx"] == 1:
+            raise RuntimeError("bug in run_task")
+
+    async def main():
+        dag = AsyncDAGExecutor(
+            run_task, on_cancelled=lambda task, failed_dep: cancelled.append((task["idx"], failed_dep))
+        )
+        for task in (_task(1), _task(2, [1]), _task(3)):
+            dag.submit(task)
+        unhandled = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        await dag.join()
+        gc.collect()
+        return unhandled
+
+    assert asyncio.run(main()) == []
+    assert sorted(ran) == [1, 3]
+    assert cancelled == [(2, 1)]
+
+
+def test_async_cancel_stops_running_tasks():
+    finished = []
+
+    async def run_task(task):
+        await asyncio.sleep(10)
+        finished.append(task["idx"])
+
+    async def main():
+        dag = AsyncDAGExecutor(run_task)
+        dag.submit(_task(1))
+        dag.submit(_task(2, [1]))
+        await asyncio.sleep(0)
+        dag.cancel()
+        unresolvable = await dag.join()
+        await asyncio.sleep(0)
+        return unresolvable
+
+    assert asyncio.run(main()) == []
+    assert finished == []
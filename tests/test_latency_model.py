@@ -0,0 +1,55 @@
+import json
+import threading
+import time
+
+import src.assistant.planning.latency_model as latency_model
+from src.assistant.planning.latency_model import ToolLatencyModel
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 2
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_samples_round_trip(tmp_path):
+    path = tmp_path / "latency.json"
+    model = ToolLatencyModel(path=path)
+    for seconds in (0.1, 0.2, 0.3):
+        model.record("search", seconds)
+    model.save()
+    loaded = ToolLatencyModel(path=path)
+    loaded.load()
+    assert loaded.count("search") == 3
+    assert loaded.estimate("search") == 0.2
+    assert loaded.estimate("weather") == latency_model.DEFAULT_LATENCY
+
+
+def test_periodic_saves_happen_off_the_recording_thread(tmp_path, monkeypatch):
+    model = ToolLatencyModel(path=tmp_path / "latency.json", save_every=2)
+    saved_on, release = [], threading.Event()
+    save = model.save
+
+    def slow_save():
+        saved_on.append(threading.current_thread().name)
+        release.wait(2)
+        save()
+
+    monkeypatch.setattr(model, "save", slow_save)
+    for _ in range(6):
+        # Returns right away even though a save is still writing
+        model.record("search", 0.1)
+    release.set()
+    _wait_until(lambda: not model._saving)
+    assert saved_on == ["tool-latency-save"]
+    assert len(json.loads((tmp_path / "latency.json").read_text())["search"]) >= 2
+
+
+def test_save_errors_are_logged_not_raised(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    model = ToolLatencyModel(path=blocker / "latency.json", save_every=1)
+    model.record("search", 0.1)
+    model.save()
+    _wait_until(lambda: not model._saving)
+    assert model.count("search") == 1
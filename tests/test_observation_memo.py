@@ -0,0 +1,71 @@
+import time
+
+from src.assistant.planning.observation_memo import ObservationMemo, canonical_args
+from src.assistant.planning.tool_policies import ToolPolicy
+
+POLICIES = {
+    "search": ToolPolicy(memoize_ttl=60.0, error_pattern=r"\w+Error\("),
+    "send_email": ToolPolicy(),
+    "flaky": ToolPolicy(memoize_ttl=0.05),
+}
+
+
+def _memo(**kwargs):
+    return ObservationMemo(lambda name: POLICIES[name], **kwargs)
+
+
+def test_canonical_args_ignore_key_order_and_container_type():
+    assert canonical_args({"a": 1, "b": [1, 2]}) == canonical_args({"b": (1, 2), "a": 1})
+    assert canonical_args({"a": 1}) != canonical_args({"a": "1"})
+
+
+def test_identical_call_in_the_same_conversation_is_recalled():
+    memo = _memo()
+    memo.remember("thread", "search", {"query": "lagos", "max_results": 3}, "result")
+    assert memo.recall("thread", "search", {"max_results": 3, "query": "lagos"}) == (True, "result")
+    assert memo.recall("thread", "search", {"query": "paris", "max_results": 3}) == (False, None)
+    # Memos are per conversation
+    assert memo.recall("other thread", "search", {"query": "lagos", "max_results": 3}) == (False, None)
+    assert memo.stats()["hits"] == 1
+
+
+def test_tools_without_a_ttl_or_conversation_are_not_memoized():
+    memo = _memo()
+    memo.remember("thread", "send_email", {"to": "me"}, "sent")
+    assert memo.recall("thread", "send_email", {"to": "me"}) == (False, None)
+    memo.remember(None, "search", {"query": "lagos"}, "result")
+    assert memo.recall(None, "search", {"query": "lagos"}) == (False, None)
+
+
+def test_entries_expire_after_the_ttl():
+    memo = _memo()
+    memo.remember("thread", "flaky", {}, "result")
+    assert memo.recall("thread", "flaky", {}) == (True, "result")
+    time.sleep(0.06)
+    assert memo.recall("thread", "flaky", {}) == (False, None)
+    assert memo.stats()["entries"] == 0
+
+
+def test_error_results_are_not_memoized():
+    memo = _memo()
+    memo.remember("thread", "search", {"query": "a"}, "HTTPError('502 Server Error')")
+    memo.remember("thread", "search", {"query": "b"}, {"error": "quota exceeded"})
+    assert memo.recall("thread", "search", {"query": "a"}) == (False, None)
+    assert memo.recall("thread", "search", {"query": "b"}) == (False, None)
+    # A falsy error key is not a failure
+    memo.remember("thread", "search", {"query": "c"}, {"error": None, "results": []})
+    assert memo.recall("thread", "search", {"query": "c"})[0]
+
+
+def test_conversations_and_entries_are_bounded():
+    memo = _memo(max_conversations=2, max_entries=2)
+    for query in ("a", "b", "c"):
+        memo.remember("thread", "search", {"query": query}, query)
+    assert memo.recall("thread", "search", {"query": "a"}) == (False, None)
+    assert memo.recall("thread", "search", {"query": "c"}) == (True, "c")
+    memo.remember("second", "search", {}, "x")
+    memo.remember("third", "search", {}, "x")
+    assert memo.stats()["conversations"] == 2
+    assert memo.recall("thread", "search", {"query": "c"}) == (False, None)
+    memo.forget("third")
+    assert memo.recall("third", "search", {}) == (False, None)
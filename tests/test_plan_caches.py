@@ -0,0 +1,140 @@
+from langchain_core.messages import AIMessage, FunctionMessage
+from langchain_core.tools import StructuredTool
+
+from src.assistant.planning.output_parser import Task, _get_dependencies_from_graph
+from src.assistant.planning.plan_templates import PlanTemplateCache, UnjudgedPlans, plan_failed
+from src.assistant.planning.planner import PlannerCache
+from src.assistant.planning.tool_index import tool_index
+
+
+def geocode_location(location: str) -> str:
+    """Coordinates of a place."""
+    return ""
+
+
+def weather_information(location: str, days: int = 3) -> str:
+    """Weather forecast."""
+    return ""
+
+
+def search(query: str, max_results: int = 5) -> str:
+    """Search the web."""
+    return ""
+
+
+TOOLS = [StructuredTool.from_function(f) for f in (geocode_location, weather_information, search)]
+INDEX = tool_index(TOOLS)
+
+
+def _task(idx, name, args):
+    tool = "join" if name == "join" else INDEX[name].tool
+    return Task(idx=idx, tool=tool, args=args, dependencies=_get_dependencies_from_graph(idx, name, args), thought=None)
+
+
+def _weather_plan(city, days):
+    return [
+        _task(1, "geocode_location", {"location": city}),
+        _task(2, "weather_information", {"location": "$1", "days": days}),
+        _task(3, "join", ()),
+    ]
+
+
+def _shape(tasks):
+    return [(task["idx"], task["tool"] if isinstance(task["tool"], str) else task["tool"].name, task["args"],
+             task["dependencies"]) for task in tasks]
+
+
+def test_planner_cache_reuses_planners_per_tool_set():
+    built = []
+    cache = PlannerCache(lambda tools: built.append(tools) or object(), max_size=2)
+    first = cache.get(TOOLS[:2])
+    assert cache.get(list(reversed(TOOLS[:2]))) is first
+    assert len(built) == 1
+    cache.get(TOOLS[1:])
+    cache.get(TOOLS)
+    # The least recently used tool set was evicted
+    assert cache.get(TOOLS[:2]) is not first
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["size"] == 2
+    cache.clear()
+    assert cache.stats()["size"] == 0
+
+
+def test_template_is_reused_with_new_slot_values():
+    cache = PlanTemplateCache()
+    cache.record("What's the weather in Paris for 3 days?", _weather_plan("Paris", 3), 1.5)
+    hit = cache.lookup("what's the weather in New York for 5 days", INDEX)
+    assert hit is not None
+    template, tasks = hit
+    assert _shape(tasks) == _shape(_weather_plan("New York", 5))
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["planner_seconds_saved"] == 1.5
+
+
+def test_different_questions_go_to_the_planner():
+    cache = PlanTemplateCache()
+    cache.record("What's the weather in Paris for 3 days?", _weather_plan("Paris", 3), 1.5)
+    assert cache.lookup("Find the latest news about solar panels", INDEX) is None
+    # Same words, but a slot that should be a number isn't
+    assert cache.lookup("What's the weather in Paris for many days?", INDEX) is None
+    # The template's tools aren't all available
+    assert cache.lookup("What's the weather in Lyon for 2 days?", tool_index(TOOLS[2:])) is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_plan_not_grounded_in_the_question_is_reused_verbatim_only():
+    cache = PlanTemplateCache()
+    # The planner knew the coordinates; they can't be derived from another city
+    plan = [_task(1, "weather_information", {"location": "48.85,2.35", "days": 3}), _task(2, "join", ())]
+    cache.record("Weather in Paris", plan, 1.0)
+    assert cache.lookup("Weather in Lyon", INDEX) is None
+    assert _shape(cache.lookup("weather in paris?", INDEX)[1]) == _shape(plan)
+
+
+def test_invalidated_template_is_not_reused():
+    cache = PlanTemplateCache()
+    cache.record("What's the weather in Paris for 3 days?", _weather_plan("Paris", 3), 1.5)
+    template, _ = cache.lookup("What's the weather in Lyon for 2 days?", INDEX)
+    cache.invalidate(template)
+    assert cache.lookup("What's the weather in Lyon for 2 days?", INDEX) is None
+    assert cache.stats()["invalidated"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_templates_are_learned_only_from_answered_plans():
+    cache = PlanTemplateCache()
+    unjudged = UnjudgedPlans(cache)
+    question = "What's the weather in Paris for 3 days?"
+    unjudged.hold("thread", question, None, _weather_plan("Paris", 3), 1.5)
+    assert cache.stats()["size"] == 0
+    # The joiner asked for a replan
+    unjudged.judge("thread", answered=False)
+    assert cache.stats()["size"] == 0
+    unjudged.hold("thread", question, None, _weather_plan("Paris", 3), 1.5)
+    unjudged.judge("thread", answered=True)
+    template, _ = cache.lookup("What's the weather in Lyon for 2 days?", INDEX)
+    # A reused template that didn't answer the question is dropped
+    unjudged.hold("other thread", "What's the weather in Lyon for 2 days?", template, [], 0.0)
+    unjudged.judge("other thread", answered=False)
+    assert cache.stats()["size"] == 0
+
+
+def test_unjudged_plans_are_bounded():
+    cache = PlanTemplateCache()
+    unjudged = UnjudgedPlans(cache, max_size=1)
+    unjudged.hold("first", "What's the weather in Paris for 3 days?", None, _weather_plan("Paris", 3), 1.0)
+    unjudged.hold("second", "Weather in Lyon", None, _weather_plan("Lyon", 3), 1.0)
+    unjudged.judge("first", answered=True)
+    assert cache.stats()["size"] == 0
+
+
+def test_error_observations_fail_the_plan():
+    def observation(name, content):
+        return FunctionMessage(name=name, content=content, additional_kwargs={"idx": 1})
+
+    assert not plan_failed([observation("search", "results"), AIMessage(content="ERROR(not an observation)")])
+    assert plan_failed([observation("search", "ERROR(Failed to call search with args {}.)")])
+    # Tools that return their error instead of raising
+    assert plan_failed([observation("search", '{"error": "quota exceeded"}')])
+    assert plan_failed([observation("tavily_search_results_json", "HTTPError('502 Server Error')")])
+    assert not plan_failed([observation("search", '{"error": null, "results": []}')])
@@ -0,0 +1,140 @@
+import json
+import random
+
+from langchain_core.tools import tool
+
+from src.assistant.planning.json_plan import JSONPlanParser, JSONPlanScanner
+from src.assistant.planning.output_parser import LLMCompilerPlanParser, PlanScanner
+
+
+@tool
+def search(query: str, max_results: int = 5) -> str:
+    """Search the web."""
+    return query
+
+
+@tool
+def weather(city: str) -> str:
+    """Weather for a city."""
+    return city
+
+
+TOOLS = [search, weather]
+
+TEXT_PLAN = (
+    "Thought: look up both cities first\n"
+    "1. weather(city=\"Paris (France)\")\n"
+    "2. search(query='what\\'s on, tonight', max_results=3)\n"
+    "Thought: then compare\n"
+    "3. search(query=\"compare $1 and ${2}\")\n"
+    "4. join()<END_OF_PLAN>"
+)
+
+JSON_PLAN = json.dumps({"tasks": [
+    {"idx": 1, "tool": "weather", "args": {"city": "Paris {France}"}, "thought": "look it up"},
+    {"idx": 2, "tool": "search", "args": {"query": "say \"hi\" [now]", "max_results": 3}},
+    {"idx": 3, "tool": "search", "args": {"query": "compare $1 and $2"}},
+    {"idx": 4, "tool": "join", "args": {}},
+]})
+
+
+def _chunks(text, sizes):
+    pos, chunks = 0, []
+    while pos < len(text):
+        size = next(sizes)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def _chunkings(text):
+    rng = random.Random(0)
+    yield [text]
+    for size in (1, 2, 3, 7):
+        yield _chunks(text, iter(lambda: size, None))
+    for _ in range(20):
+        yield _chunks(text, iter(lambda: rng.randint(1, 12), None))
+
+
+def _scan_text(chunks):
+    scanner = PlanScanner()
+    actions = []
+    for chunk in chunks:
+        actions.extend(scanner.feed(chunk))
+    return actions + scanner.finish()
+
+
+def test_plan_scanner_is_independent_of_chunking():
+    expected = _scan_text([TEXT_PLAN])
+    assert [(idx, name) for idx, name, _, _ in expected] == [(1, "weather"), (2, "search"), (3, "search"), (4, "join")]
+    assert expected[0][2] == 'city="Paris (France)"'
+    assert expected[0][3] == "look up both cities first"
+    assert expected[2][3] == "then compare"
+    for chunks in _chunkings(TEXT_PLAN):
+        assert _scan_text(chunks) == expected
+
+
+def test_plan_scanner_emits_an_action_when_it_closes():
+    scanner = PlanScanner()
+    assert list(scanner.feed("1. search(query=\"a")) == []
+    assert [action[:2] for action in scanner.feed("b\")")] == [(1, "search")]
+
+
+def test_plan_scanner_falls_back_to_the_last_parenthesis_on_the_line():
+    scanner = PlanScanner()
+    # The quote never closes, so the ")" inside it never ends the action
+    actions = scanner.feed('1. search(query="a)\n2. join()\n')
+    assert actions == [(1, "search", 'query="a', None), (2, "join", "", None)]
+
+
+def test_plan_scanner_flushes_an_action_left_open():
+    scanner = PlanScanner()
+    scanner.feed("1. search(query=(a)")
+    assert [action[2] for action in scanner.finish()] == ["query=(a"]
+
+
+def test_text_parser_builds_tasks_with_dependencies():
+    parser = LLMCompilerPlanParser(tools=TOOLS)
+    one_shot = parser.parse(TEXT_PLAN)
+    assert [task["idx"] for task in one_shot] == [1, 2, 3, 4]
+    assert one_shot[0]["tool"] is weather
+    assert one_shot[1]["args"] == {"query": "what's on, tonight", "max_results": 3}
+    assert one_shot[2]["dependencies"] == {1, 2}
+    assert one_shot[3]["tool"] == "join"
+    assert one_shot[3]["dependencies"] == {1, 2, 3}
+    streamed = list(parser.transform(iter(_chunks(TEXT_PLAN, iter(lambda: 3, None)))))
+    assert [(t["idx"], t["args"], t["dependencies"]) for t in streamed] == \
+           [(t["idx"], t["args"], t["dependencies"]) for t in one_shot]
+
+
+def _scan_json(chunks):
+    scanner = JSONPlanScanner()
+    items = []
+    for chunk in chunks:
+        items.extend(scanner.feed(chunk))
+    return items
+
+
+def test_json_scanner_is_independent_of_chunking():
+    expected = _scan_json([JSON_PLAN])
+    assert [json.loads(item)["idx"] for item in expected] == [1, 2, 3, 4]
+    for chunks in _chunkings(JSON_PLAN):
+        assert _scan_json(chunks) == expected
+
+
+def test_json_scanner_returns_a_task_when_it_closes():
+    scanner = JSONPlanScanner()
+    assert scanner.feed('{"tasks": [{"idx": 1, "tool": "search", "args": {"query": "}"') == []
+    assert scanner.feed('}}, {"idx": 2') == ['{"idx": 1, "tool": "search", "args": {"query": "}"}}']
+
+
+def test_json_parser_builds_tasks_and_drops_bad_ones():
+    parser = JSONPlanParser(tools=TOOLS)
+    tasks = parser.parse(JSON_PLAN)
+    assert [task["idx"] for task in tasks] == [1, 2, 3, 4]
+    assert tasks[0]["thought"] == "look it up"
+    assert tasks[1]["args"] == {"query": 'say "hi" [now]', "max_results": 3}
+    assert tasks[2]["dependencies"] == {1, 2}
+    assert tasks[3]["tool"] == "join"
+    broken = json.dumps({"tasks": [{"idx": 1, "tool": "unknown", "args": {}}, {"tool": "search"}]})
+    assert parser.parse(broken) == []
@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableGenerator
+from langchain_core.tools import tool
+
+import src.assistant.planning.speculative as speculative
+from src.assistant.planning.speculative import AsyncSpeculativePlan, SpeculationStats, SpeculativePlan
+
+
+@tool
+def search(query: str) -> str:
+    """Search the web."""
+    return query
+
+
+@tool
+def weather(city: str) -> str:
+    """Weather for a city."""
+    return city
+
+
+def _task(idx, tool_):
+    return {"idx": idx, "tool": tool_, "args": {}, "dependencies": set(), "thought": None}
+
+
+def _planner(tasks, release: threading.Event = None):
+    # Streams tasks[0] right away and the rest once release is set
+    def stream(_):
+        for i, task in enumerate(tasks):
+            if i and release is not None:
+                release.wait(2)
+            yield task
+
+    async def astream(input_):
+        async for _ in input_:
+            pass
+        for i, task in enumerate(tasks):
+            if i and release is not None:
+                await asyncio.to_thread(release.wait, 2)
+            yield task
+
+    return RunnableGenerator(stream, astream)
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = SpeculationStats()
+    monkeypatch.setattr(speculative, "speculation_stats", stats)
+    return stats
+
+
+def _fallback(*tasks):
+    return lambda: iter(tasks)
+
+
+def _idx(tasks):
+    return [(task["idx"], task["tool"] if isinstance(task["tool"], str) else task["tool"].name) for task in tasks]
+
+
+def _wait_for_first(plan):
+    while plan._queue.empty():
+        time.sleep(0.01)
+
+
+def test_plan_within_the_categories_is_kept(stats):
+    plan_tasks = [_task(1, weather), _task(2, "join")]
+    plan = SpeculativePlan(_planner(plan_tasks), [])
+    tasks = plan.adopt({"weather"}, _fallback())
+    assert [task["idx"] for task in tasks] == [1, 2]
+    assert stats.outcomes["kept"] == 1
+
+
+def test_plan_outside_the_categories_is_discarded(stats):
+    release = threading.Event()
+    plan_tasks = [_task(1, search), _task(2, weather)]
+    plan = SpeculativePlan(_planner(plan_tasks, release), [])
+    _wait_for_first(plan)
+    tasks = plan.adopt({"weather"}, _fallback(_task(1, weather)))
+    assert plan._cancelled.is_set()
+    release.set()
+    assert _idx(tasks) == [(1, "weather")]
+    assert stats.outcomes["discarded"] == 1
+
+
+def test_late_first_task_outside_the_categories_falls_back(stats):
+    release = threading.Event()
+
+    def stream(_):
+        release.wait(2)
+        yield _task(1, search)
+
+    # The categories come back before the first task
+    plan = SpeculativePlan(RunnableGenerator(stream), [])
+    tasks = plan.adopt({"weather"}, _fallback(_task(1, weather), _task(2, "join")))
+    release.set()
+    assert _idx(tasks) == [(1, "weather"), (2, "join")]
+    assert stats.outcomes == {"kept": 0, "discarded": 1, "cut_short": 0, "failed": 0}
+
+
+def test_later_task_outside_the_categories_cuts_the_plan(stats):
+    release = threading.Event()
+    plan_tasks = [_task(1, weather), _task(2, search), _task(3, "join")]
+    plan = SpeculativePlan(_planner(plan_tasks, release), [])
+    _wait_for_first(plan)
+    tasks = plan.adopt({"weather"}, _fallback(_task(1, weather)))
+    release.set()
+    assert [task["idx"] for task in tasks] == [1]
+    assert stats.outcomes == {"kept": 0, "discarded": 0, "cut_short": 1, "failed": 0}
+
+
+def test_failed_speculation_falls_back_to_the_planner(stats):
+    def stream(_):
+        raise RuntimeError("planner down")
+        yield
+
+    plan = SpeculativePlan(RunnableGenerator(stream), [])
+    _wait_for_first(plan)
+    assert _idx(plan.adopt({"weather"}, _fallback(_task(1, weather)))) == [(1, "weather")]
+    assert stats.outcomes["failed"] == 1
+
+
+def test_planner_failing_mid_stream_ends_the_plan(stats):
+    release = threading.Event()
+
+    def stream(_):
+        yield _task(1, weather)
+        release.wait(2)
+        raise RuntimeError("planner down")
+
+    plan = SpeculativePlan(RunnableGenerator(stream), [])
+    _wait_for_first(plan)
+    tasks = plan.adopt({"weather"}, _fallback(_task(1, search)))
+    release.set()
+    # Task 1 was dispatched, so the joiner replans rather than a second plan starting at 1
+    assert _idx(tasks) == [(1, "weather")]
+    assert stats.outcomes == {"kept": 0, "discarded": 0, "cut_short": 0, "failed": 1}
+
+
+def _afallback(*tasks):
+    async def stream():
+        for task in tasks:
+            yield task
+
+    return stream
+
+
+def test_async_keep_and_discard(stats):
+    async def main():
+        kept = AsyncSpeculativePlan(_planner([_task(1, weather), _task(2, "join")]), [])
+        await asyncio.sleep(0.05)
+        tasks = [task["idx"] async for task in kept.adopt({"weather"}, _afallback())]
+
+        release = threading.Event()
+        discarded = AsyncSpeculativePlan(_planner([_task(1, search), _task(2, weather)], release), [])
+        await asyncio.sleep(0.05)
+        adopted = [task async for task in discarded.adopt({"weather"}, _afallback(_task(1, weather)))]
+        release.set()
+        await asyncio.sleep(0.05)
+        return tasks, adopted, discarded._task.cancelled()
+
+    tasks, adopted, cancelled = asyncio.run(main())
+    assert tasks == [1, 2]
+    assert _idx(adopted) == [(1, "weather")]
+    assert cancelled
+    assert stats.outcomes["kept"] == 1
+    assert stats.outcomes["discarded"] == 1
+
+
+def test_async_late_failure_falls_back(stats):
+    release = threading.Event()
+
+    async def astream(input_):
+        async for _ in input_:
+            pass
+        await asyncio.to_thread(release.wait, 2)
+        raise RuntimeError("planner down")
+        yield
+
+    def stream(_):
+        yield from ()
+
+    async def main():
+        plan = AsyncSpeculativePlan(RunnableGenerator(stream, astream), [])
+        tasks = plan.adopt({"weather"}, _afallback(_task(1, weather)))
+        release.set()
+        return [task async for task in tasks]
+
+    assert _idx(asyncio.run(main())) == [(1, "weather")]
+    assert stats.outcomes["failed"] == 1
+
+
+class _Planners:
+    """Stands in for planner_cache: the full registry gets one plan, anything else another."""
+
+    def __init__(self, tfu, full, filtered):
+        self.all_tools = tfu.tools_registry.get_all_tools()
+        self.full, self.filtered = full, filtered
+        self.built_for = []
+
+    def get(self, tools):
+        # Like create_planner, which needs a sized list of tools
+        self.built_for.append(len(tools))
+        return self.full if tools is self.all_tools else self.filtered
+
+
+def _node(monkeypatch, full, filtered):
+    tfu = pytest.importorskip("src.assistant.planning.task_fetching_unit")
+    planners = _Planners(tfu, full, filtered)
+    monkeypatch.setattr(tfu, "planner_cache", planners)
+    monkeypatch.setattr(tfu, "filter_tools_by_category", lambda categories: [weather])
+    monkeypatch.setattr(tfu, "_schedule", lambda state, config, tasks, timeline: _idx(tasks))
+
+    async def aschedule(state, config, tasks, timeline):
+        return _idx([task async for task in tasks])
+
+    monkeypatch.setattr(tfu, "_aschedule", aschedule)
+
+    def select_categories(state):
+        return {**state, "selected_tool_categories": {"required_categories": ["Weather Information"]}}
+
+    return tfu.speculative_plan_and_schedule(select_categories), planners
+
+
+def test_select_and_plan_node(monkeypatch, stats):
+    full = _planner([_task(1, weather), _task(2, "join")])
+    node, planners = _node(monkeypatch, full, _planner([_task(1, search)]))
+    state = {"messages": [HumanMessage(content="weather in Paris?")]}
+    result = node.invoke(state)
+    assert result["messages"] == [(1, "weather"), (2, "join")]
+    assert result["selected_tool_categories"] == {"required_categories": ["Weather Information"]}
+    assert stats.outcomes["kept"] == 1
+
+    # A speculative plan outside the categories is replaced by the filtered one
+    node, planners = _node(monkeypatch, _planner([_task(1, search)]), _planner([_task(1, weather)]))
+    assert asyncio.run(node.ainvoke(state))["messages"] == [(1, "weather")]
+    assert planners.built_for == [len(planners.all_tools), 1]
@@ -0,0 +1,129 @@
+import threading
+import time
+
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage
+from langgraph.graph.message import add_messages
+
+from src.assistant.planning.summarizer import (
+    BackgroundSummarizer,
+    is_summary,
+    messages_tokens,
+    split_for_summary,
+    summary_update,
+    transcript,
+)
+
+
+def _turn(n, words=50):
+    return [
+        HumanMessage(content=f"question {n}", id=f"q{n}"),
+        FunctionMessage(name="search", content=" ".join(["result"] * words), additional_kwargs={"idx": 1}, id=f"f{n}"),
+        AIMessage(content=f"answer {n}", id=f"a{n}"),
+    ]
+
+
+def _thread(turns):
+    return [message for n in range(1, turns + 1) for message in _turn(n)]
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 2
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_split_keeps_whole_recent_turns():
+    messages = _thread(4)
+    turn_tokens = messages_tokens(_turn(4))
+    folded, kept = split_for_summary(messages, keep_tokens=turn_tokens * 2)
+    assert [m.id for m in kept] == ["q3", "f3", "a3", "q4", "f4", "a4"]
+    assert folded == messages[:6]
+
+
+def test_split_always_keeps_the_last_turn():
+    messages = _thread(3)
+    folded, kept = split_for_summary(messages, keep_tokens=1)
+    assert [m.id for m in kept] == ["q3", "f3", "a3"]
+    assert len(folded) == 6
+    folded, kept = split_for_summary(_turn(1), keep_tokens=1)
+    assert folded == []
+    assert [m.id for m in kept] == ["q1", "f1", "a1"]
+
+
+def test_summary_replaces_the_folded_messages():
+    messages = _thread(3)
+    folded, kept = split_for_summary(messages, keep_tokens=1)
+    update = summary_update(folded, "the user asked twice")
+    assert update["summary"] == "the user asked twice"
+    summarized = add_messages(messages, update["messages"])
+    assert is_summary(summarized[0])
+    assert summarized[0].id == "q1"
+    assert summarized[1:] == kept
+    # A summary on its own has nothing new to fold in
+    assert split_for_summary(summarized, keep_tokens=1) == ([], summarized)
+
+
+def test_summary_still_applies_after_new_messages():
+    messages = _thread(2)
+    folded, _ = split_for_summary(messages, keep_tokens=1)
+    update = summary_update(folded, "earlier")
+    # The thread got another turn while the summary was being written
+    grown = add_messages(messages, _turn(3))
+    summarized = add_messages(grown, update["messages"])
+    assert [m.id for m in summarized] == ["q1", "q2", "f2", "a2", "q3", "f3", "a3"]
+
+
+def test_folding_again_extends_the_summary():
+    summarized = add_messages(_thread(2), summary_update(_thread(1), "first")["messages"])
+    summarized = add_messages(summarized, _turn(3))
+    folded, kept = split_for_summary(summarized, keep_tokens=1)
+    assert is_summary(folded[0])
+    assert [m.id for m in kept] == ["q3", "f3", "a3"]
+    text = transcript(folded)
+    assert "first" not in text
+    assert text.startswith("User: question 2\nTool search (task 1): result")
+
+
+def test_transcript_cuts_long_tool_outputs():
+    text = transcript(_turn(1, words=1000))
+    assert text.splitlines()[1].endswith(" ...")
+    assert len(text) < 2000
+
+
+def test_background_summaries_run_one_per_thread():
+    summarizer = BackgroundSummarizer(workers=2)
+    started, release = threading.Event(), threading.Event()
+
+    def summarize():
+        started.set()
+        release.wait(2)
+        return True
+
+    assert summarizer.submit("thread", summarize)
+    started.wait(2)
+    assert not summarizer.submit("thread", summarize)
+    release.set()
+    _wait_until(lambda: not summarizer.stats()["pending"])
+    assert summarizer.stats()["summaries"] == 1
+    assert summarizer.submit("thread", lambda: 1 / 0)
+    _wait_until(lambda: summarizer.stats()["failures"])
+    assert summarizer.stats()["failures"] == 1
+
+
+def test_write_back_waits_for_the_turn():
+    summarizer = BackgroundSummarizer()
+    events = []
+
+    def write_back():
+        with summarizer.holding("thread"):
+            events.append("summary written")
+
+    with summarizer.holding("thread"):
+        writer = threading.Thread(target=write_back)
+        writer.start()
+        time.sleep(0.05)
+        events.append("turn finished")
+    writer.join(2)
+    assert events == ["turn finished", "summary written"]
+    # Nobody holds or waits for the thread's lock any more
+    assert summarizer._thread_locks == {}
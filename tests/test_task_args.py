@@ -0,0 +1,39 @@
+from typing import Dict, List, Optional
+
+import pytest
+from langchain_core.tools import tool
+
+tfu = pytest.importorskip("src.assistant.planning.task_fetching_unit")
+
+
+@tool
+def math(problem: str, context: Optional[List[str]] = None) -> str:
+    """Solve a math problem."""
+    return problem
+
+
+@tool
+def plot(points: List[float], options: Dict[str, dict]) -> str:
+    """Plot some points."""
+    return ""
+
+
+def _task(tool_, args):
+    return {"idx": 3, "tool": tool_, "args": args, "dependencies": {1, 2}, "thought": None}
+
+
+def test_references_in_string_lists_become_text():
+    observations = {1: {"temp": 21}, 2: "42"}
+    args = tfu._resolve_task_args(_task(math, {"problem": "$2 + 1", "context": ["$1", "$2"]}), observations)
+    assert args == {"problem": "42 + 1", "context": ['{"temp":21}', "42"]}
+
+
+def test_references_keep_the_type_the_schema_declares():
+    observations = {1: "2.5", 2: {"color": "red"}}
+    args = tfu._resolve_task_args(_task(plot, {"points": ["$1", 3.0], "options": {"style": "$2"}}), observations)
+    assert args == {"points": [2.5, 3.0], "options": {"style": {"color": "red"}}}
+
+
+def test_references_in_untyped_containers_become_text():
+    args = tfu._resolve_task_args(_task("join", {"anything": ["$1"]}), {1: {"a": 1}})
+    assert args == {"anything": ['{"a":1}']}
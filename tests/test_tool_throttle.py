@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.assistant.planning.dag_executor import DAGExecutor, TaskRequeued
+from src.assistant.planning.tool_policies import ToolPolicy
+from src.assistant.planning.tool_throttle import TokenBucket, ToolThrottle
+from src.assistant.tools.rate_limit import RateLimited, as_rate_limited, parse_retry_after
+
+
+def _throttle(**policy):
+    return ToolThrottle(lambda name: ToolPolicy(**policy))
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=2.0, burst=2)
+    now = bucket.updated
+    for _ in range(2):
+        assert bucket.delay(now) == 0.0
+        bucket.take()
+    assert abs(bucket.delay(now) - 0.5) < 1e-6
+    assert bucket.delay(now + 0.5) == 0.0
+
+
+def test_token_bucket_backs_off_and_recovers():
+    bucket = TokenBucket(rate=10.0, burst=1)
+    bucket.back_off()
+    assert bucket.rate == 5.0
+    bucket.recover()
+    assert bucket.rate == 6.0
+    for _ in range(10):
+        bucket.recover()
+    assert bucket.rate == 10.0
+
+
+def test_concurrency_limit_queues_callers_in_order():
+    throttle = _throttle(max_concurrency=1)
+    started = []
+    assert throttle.acquire_or_wait("tool", lambda: started.append("first"))
+    assert not throttle.acquire_or_wait("tool", lambda: started.append("second"))
+    assert not throttle.acquire_or_wait("tool", lambda: started.append("third"))
+    # Nobody jumps the queue
+    assert not throttle.try_acquire("tool")
+    throttle.release("tool")
+    assert started == ["second"]
+    throttle.release("tool")
+    assert started == ["second", "third"]
+    assert throttle.stats()["tool"]["queued"] == 0
+
+
+def test_rate_limited_release_pauses_the_tool():
+    throttle = _throttle()
+    assert throttle.try_acquire("tool")
+    throttle.release("tool", RateLimited(retry_after=0.2))
+    assert not throttle.try_acquire("tool")
+    ready = threading.Event()
+    queued_at = time.monotonic()
+    throttle.acquire_or_wait("tool", ready.set)
+    assert ready.wait(2)
+    assert time.monotonic() - queued_at >= 0.15
+    assert throttle.stats()["tool"]["rate_limited"] == 1
+
+
+def test_async_wait_for_slot():
+    throttle = _throttle(max_concurrency=1)
+
+    async def main():
+        assert throttle.try_acquire("tool")
+        waiter = asyncio.ensure_future(throttle.wait_for_slot("tool"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        throttle.release("tool")
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(main())
+    assert throttle.stats()["tool"]["active"] == 1
+
+
+def test_rate_limited_task_is_requeued_after_retry_after():
+    # The scheduler's wiring: the throttle gates dispatch, and a 429 puts the
+    # task back into the throttle queue instead of failing it
+    throttle = _throttle()
+    starts = []
+
+    def run_task(task):
+        starts.append(time.monotonic())
+        rate_limited = RateLimited(retry_after=0.2) if len(starts) == 1 else None
+        throttle.release("tool", rate_limited)
+        if rate_limited is not None:
+            raise TaskRequeued() from rate_limited
+
+    with ThreadPoolExecutor(2) as pool:
+        dag = DAGExecutor(pool, run_task, admit=lambda task, on_ready: throttle.acquire_or_wait("tool", on_ready))
+        dag.submit({"idx": 1, "tool": "tool", "args": {}, "dependencies": [], "thought": None})
+        # A requeued task still counts as running
+        dag.join()
+    assert len(starts) == 2
+    assert starts[1] - starts[0] >= 0.15
+    assert throttle.stats()["tool"]["calls"] == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0.0
+
+
+def test_as_rate_limited_recognizes_http_429():
+    class Response:
+        status_code = 429
+        headers = {"Retry-After": "2"}
+
+    error = Exception("Too Many Requests")
+    error.response = Response()
+    assert as_rate_limited(error).retry_after == 2.0
+    assert as_rate_limited(ValueError("boom")) is None